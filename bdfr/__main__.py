@@ -35,17 +35,21 @@ _common_options = [
 ]
 
 _downloader_options = [
+    click.option('--engine', type=click.Choice(('thread', 'asyncio')), default=None),
     click.option('--file-scheme', default=None, type=str),
     click.option('--folder-scheme', default=None, type=str),
     click.option('--make-hard-links', is_flag=True, default=None),
     click.option('--max-wait-time', type=int, default=None),
     click.option('--no-dupes', is_flag=True, default=None),
     click.option('--search-existing', is_flag=True, default=None),
+    click.option('--skip-existing-ids', is_flag=True, default=None),
     click.option('--exclude-id', default=None, multiple=True),
     click.option('--exclude-id-file', default=None, multiple=True),
     click.option('--skip', default=None, multiple=True),
     click.option('--skip-domain', default=None, multiple=True),
     click.option('--skip-subreddit', default=None, multiple=True),
+    click.option('--state-db', default=None, type=str),
+    click.option('--workers', default=None, type=click.IntRange(min=1)),
 ]
 
 _archiver_options = [
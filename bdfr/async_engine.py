@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+# coding=utf-8
+
+import asyncio
+import concurrent.futures
+import logging
+import threading
+from functools import partial
+from pathlib import Path
+from typing import Coroutine, Optional
+
+import _hashlib
+
+from bdfr.exceptions import BulkDownloaderException, RetryableError
+from bdfr.resource import PartialDownload, Resource
+from bdfr.retry_policy import RetryPolicy, check_retryable_status
+from bdfr.session_manager import SessionManager
+from bdfr.video_resource import VideoResource
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncDownloadEngine:
+    """Downloads resources on an asyncio event loop running in a background thread
+
+    The site downloaders remain synchronous and are run by the caller's threads, which hand the resulting resources
+    over to the engine. This allows a single process to keep hundreds of requests in flight without a thread each.
+    """
+
+    def __init__(self, max_connections: int = 100):
+        if aiohttp is None:
+            raise BulkDownloaderException('The asyncio engine requires the aiohttp package to be installed')
+        self.max_connections = max_connections
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self._thread.start()
+        self.session: Optional[aiohttp.ClientSession] = self.submit(self._create_session()).result()
+
+    async def _create_session(self) -> 'aiohttp.ClientSession':
+        connector = aiohttp.TCPConnector(limit=self.max_connections)
+        timeout = aiohttp.ClientTimeout(total=None, sock_connect=30, sock_read=300)
+        headers = {'User-Agent': user_agent} if (user_agent := SessionManager.get_user_agent()) else None
+        return aiohttp.ClientSession(connector=connector, timeout=timeout, headers=headers)
+
+    def submit(self, coroutine: Coroutine) -> concurrent.futures.Future:
+        """Schedule a coroutine on the engine's event loop from any thread"""
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop)
+
+    def close(self):
+        if self.session:
+            self.submit(self.session.close()).result()
+            self.session = None
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join()
+        self.loop.close()
+
+    async def download(self, resource: Resource, max_wait_time: int):
+        """Asynchronous counterpart to Resource.download"""
+        if not resource.content:
+            resource.content = await self.retry_download(resource.url, max_wait_time)
+        if not resource.hash and resource.content:
+            resource.create_hash()
+
+    async def retry_download(self, url: str, max_wait_time: int) -> bytes:
+        return await RetryPolicy(deadline=max_wait_time).call_async(partial(self._fetch_content, url), url)
+
+    async def _fetch_content(self, url: str) -> bytes:
+        try:
+            async with self.session.get(url) as response:
+                content = await response.read()
+                if 200 <= response.status < 300 and content:
+                    return content
+                check_retryable_status(response.status, response.headers, url)
+                raise BulkDownloaderException(f'Unrecoverable error requesting resource: HTTP Code {response.status}')
+        except (aiohttp.ClientConnectionError, aiohttp.ClientPayloadError, asyncio.TimeoutError) as e:
+            raise RetryableError(f'Could not download resource: {e}')
+
+    async def download_to_file(self, resource: Resource, file_path: Path, max_wait_time: int):
+        """Asynchronous counterpart to Resource.download_to_file"""
+        if isinstance(resource, VideoResource):
+            # Videos are downloaded by youtube-dl rather than the engine's session
+            await asyncio.to_thread(resource.download_to_file, file_path, max_wait_time)
+            return
+        resource.download_path = file_path
+        resource.hash = await self.retry_download_to_file(resource.url, file_path, max_wait_time)
+
+    async def retry_download_to_file(self, url: str, file_path: Path, max_wait_time: int) -> _hashlib.HASH:
+        return await RetryPolicy(deadline=max_wait_time).call_async(
+            partial(self._fetch_to_file, url, file_path), url)
+
+    async def _fetch_to_file(self, url: str, file_path: Path) -> _hashlib.HASH:
+        partial_download = PartialDownload(file_path, url)
+        # File operations are run in threads so that slow disks do not stall the event loop
+        headers = await asyncio.to_thread(partial_download.request_headers)
+        try:
+            async with self.session.get(url, headers=headers) as response:
+                if 200 <= response.status < 300:
+                    file, file_hash = await asyncio.to_thread(partial_download.open, response.status, response.headers)
+                    try:
+                        async for chunk in response.content.iter_chunked(Resource.chunk_size):
+                            file_hash.update(chunk)
+                            await asyncio.to_thread(file.write, chunk)
+                        length = file.tell()
+                    finally:
+                        await asyncio.to_thread(file.close)
+                    await asyncio.to_thread(partial_download.complete, length)
+                    if length > 0:
+                        return file_hash
+                elif response.status == 416:
+                    await asyncio.to_thread(partial_download.discard)
+                    raise RetryableError(f'Could not resume download of {url}', 0)
+                check_retryable_status(response.status, response.headers, url)
+                raise BulkDownloaderException(f'Unrecoverable error requesting resource: HTTP Code {response.status}')
+        except (aiohttp.ClientConnectionError, aiohttp.ClientPayloadError, asyncio.TimeoutError) as e:
+            raise RetryableError(f'Could not download resource: {e}')
@@ -3,6 +3,8 @@
 
 import logging
 
+import praw.models
+
 from bdfr.archiver import Archiver
 from bdfr.configuration import Configuration
 from bdfr.downloader import RedditDownloader
@@ -15,7 +17,16 @@ class RedditCloner(RedditDownloader, Archiver):
         super(RedditCloner, self).__init__(args)
 
     def download(self):
-        for generator in self.reddit_lists:
-            for submission in generator:
-                self._download_submission(submission)
-                self.write_entry(submission)
+        try:
+            if self.args.workers > 1 or self.args.engine == 'asyncio':
+                self._download_concurrently(self.write_entry)
+            else:
+                for generator in self.reddit_lists:
+                    for submission in generator:
+                        self._clone_submission(submission)
+        finally:
+            self._close_shared_objects()
+
+    def _clone_submission(self, submission: praw.models.Submission):
+        self._download_submission(submission)
+        self.write_entry(submission)
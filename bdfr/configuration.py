@@ -14,6 +14,7 @@ class Configuration(Namespace):
         self.config = None
         self.directory: str = '.'
         self.disable_module: list[str] = []
+        self.engine: str = 'thread'
         self.exclude_id = []
         self.exclude_id_file = []
         self.file_scheme: str = '{REDDITOR}_{TITLE}_{POSTID}'
@@ -28,10 +29,12 @@ class Configuration(Namespace):
         self.saved: bool = False
         self.search: Optional[str] = None
         self.search_existing: bool = False
+        self.skip_existing_ids: bool = False
         self.skip: list[str] = []
         self.skip_domain: list[str] = []
         self.skip_subreddit: list[str] = []
         self.sort: str = 'hot'
+        self.state_db: Optional[str] = None
         self.submitted: bool = False
         self.subreddit: list[str] = []
         self.time: str = 'all'
@@ -39,6 +42,16 @@ class Configuration(Namespace):
         self.upvoted: bool = False
         self.user: list[str] = []
         self.verbose: int = 0
+        self.workers: int = 1
+
+        # Pipeline options, read from the configuration file
+        self.resolve_workers: Optional[int] = None
+        self.fetch_workers: Optional[int] = None
+        self.write_workers: Optional[int] = None
+        self.queue_size: Optional[int] = None
+        self.hash_algorithm: Optional[str] = None
+        self.hash_workers: Optional[int] = None
+        self.video_workers: Optional[int] = None
 
         # Archiver-specific options
         self.all_comments = False
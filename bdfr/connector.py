@@ -23,8 +23,14 @@ import prawcore
 from bdfr import exceptions as errors
 from bdfr.configuration import Configuration
 from bdfr.download_filter import DownloadFilter
+from bdfr.duplicate_finder import DEFAULT_HASH_WORKERS
 from bdfr.file_name_formatter import FileNameFormatter
+from bdfr.file_system_index import FileSystemIndex
+from bdfr.hashing import get_hash_function
+from bdfr.host_scheduler import HostScheduler
 from bdfr.oauth2 import OAuth2Authenticator, OAuth2TokenManager
+from bdfr.resource import Resource
+from bdfr.session_manager import SessionManager
 from bdfr.site_authenticator import SiteAuthenticator
 
 logger = logging.getLogger(__name__)
@@ -64,6 +70,13 @@ class RedditConnector(metaclass=ABCMeta):
 
         self.read_config()
 
+        self.session_manager = self.create_session_manager()
+        SessionManager.install(self.session_manager)
+        logger.log(9, 'Created HTTP session manager')
+        self.host_scheduler = self.create_host_scheduler()
+        HostScheduler.install(self.host_scheduler)
+        logger.log(9, 'Created host scheduler')
+
         self.parse_disabled_modules()
 
         self.download_filter = self.create_download_filter()
@@ -81,6 +94,7 @@ class RedditConnector(metaclass=ABCMeta):
         self.excluded_submission_ids = self.read_excluded_ids()
 
         self.master_hash_list = {}
+        self.file_system_index = FileSystemIndex()
         self.authenticator = self.create_authenticator()
         logger.log(9, 'Created site authenticator')
 
@@ -98,8 +112,25 @@ class RedditConnector(metaclass=ABCMeta):
                 option = 'ISO'
             logger.debug(f'Setting datetime format string to {option}')
             self.args.time_format = option
+        for option, fallback in (
+                ('resolve_workers', self.args.workers),
+                ('fetch_workers', 100 if self.args.engine == 'asyncio' else self.args.workers),
+                ('write_workers', 1),
+                ('queue_size', self.args.workers * 4),
+                ('hash_workers', DEFAULT_HASH_WORKERS),
+                ('video_workers', 2),
+        ):
+            if vars(self.args).get(option) is None:
+                vars(self.args)[option] = self.cfg_parser.getint('DEFAULT', option, fallback=fallback)
+                logger.log(9, f'Setting {option} to {vars(self.args)[option]}')
         if not self.args.disable_module:
             self.args.disable_module = [self.cfg_parser.get('DEFAULT', 'disabled_modules', fallback='')]
+        if self.args.hash_algorithm is None:
+            self.args.hash_algorithm = self.cfg_parser.get('DEFAULT', 'hash_algorithm', fallback='md5').strip().lower()
+            logger.log(9, f'Setting hash algorithm to {self.args.hash_algorithm}')
+        # Fail before any work is done if the algorithm cannot be used
+        get_hash_function(self.args.hash_algorithm)
+        Resource.hash_algorithm = self.args.hash_algorithm
         # Update config on disk
         with open(self.config_location, 'w') as file:
             self.cfg_parser.write(file)
@@ -385,6 +416,23 @@ class RedditConnector(metaclass=ABCMeta):
     def create_download_filter(self) -> DownloadFilter:
         return DownloadFilter(self.args.skip, self.args.skip_domain)
 
+    def create_session_manager(self) -> SessionManager:
+        pool_size = max(10, self.args.fetch_workers or 1, self.args.resolve_workers or 1)
+        user_agent = self.cfg_parser.get('DEFAULT', 'user_agent', fallback='')
+        blocked_cookie_domains = self.cfg_parser.get('DEFAULT', 'blocked_cookie_domains', fallback='')
+        blocked_cookie_domains = tuple(filter(None, re.split(r'[,;]\s*', blocked_cookie_domains)))
+        return SessionManager(
+            pool_connections=self.cfg_parser.getint('DEFAULT', 'pool_connections', fallback=20),
+            pool_maxsize=self.cfg_parser.getint('DEFAULT', 'pool_maxsize', fallback=pool_size),
+            user_agent=user_agent.strip() or None,
+            blocked_cookie_domains=blocked_cookie_domains,
+        )
+
+    def create_host_scheduler(self) -> HostScheduler:
+        limits, default_limit = HostScheduler.parse_limits(
+            self.cfg_parser.get('DEFAULT', 'host_limits', fallback=''))
+        return HostScheduler(limits, default_limit)
+
     def create_authenticator(self) -> SiteAuthenticator:
         return SiteAuthenticator(self.cfg_parser)
 
@@ -0,0 +1,347 @@
+#!/usr/bin/env python3
+# coding=utf-8
+
+import collections
+import heapq
+import itertools
+import logging
+import math
+import queue
+import threading
+import time
+from enum import Enum, auto
+from functools import partial
+from pathlib import Path
+from typing import Callable, Coroutine, Iterable, Optional, Union
+
+import praw.models
+
+from bdfr.async_engine import AsyncDownloadEngine
+from bdfr.exceptions import RetryDeferred
+from bdfr.host_scheduler import HostScheduler
+from bdfr.resource import Resource
+from bdfr.video_resource import VideoResource
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class WriteResult(Enum):
+    """What happened to a resource in the write stage
+
+    A resource skipped or hard linked as a duplicate has been dealt with as the user asked, so it does not make the
+    submission fail.
+    """
+    WRITTEN = auto()
+    DUPLICATE = auto()
+    FAILED = auto()
+
+
+class _SubmissionTask:
+    def __init__(self, submission: praw.models.Submission, downloader_name: str, resource_count: int):
+        self.submission = submission
+        self.downloader_name = downloader_name
+        self.remaining = resource_count
+        self.failed = False
+        self.lock = threading.Lock()
+
+    def finish_resource(self) -> bool:
+        """Mark one resource as done and return whether the whole submission is finished"""
+        with self.lock:
+            self.remaining -= 1
+            return self.remaining == 0
+
+
+class _ResourceJob:
+    def __init__(self, task: _SubmissionTask, destination: Path, resource: Resource):
+        self.task = task
+        self.destination = destination
+        self.resource = resource
+        self.host: Optional[str] = None
+
+
+class _HostQueue:
+    """A bounded queue of resource jobs that hands out jobs from hosts in turn
+
+    A job is only given out once a slot for its host has been reserved with the scheduler, so workers move on to other
+    hosts rather than waiting for a host that is at its limit. The slot must be released once the job is fetched.
+    Jobs waiting to be retried are held aside until they are due, and are not counted against the size of the queue.
+    """
+
+    def __init__(self, scheduler: HostScheduler, maxsize: int):
+        self.scheduler = scheduler
+        self.maxsize = maxsize
+        self.condition = scheduler.condition
+        self.hosts: collections.OrderedDict[str, collections.deque[_ResourceJob]] = collections.OrderedDict()
+        self.size = 0
+        self.stops = 0
+        self.delayed: list[tuple[float, int, _ResourceJob]] = []
+        self._delayed_order = itertools.count()
+
+    def put(self, job: Union[_ResourceJob, object]):
+        with self.condition:
+            if job is _STOP:
+                self.stops += 1
+            else:
+                while self.size >= self.maxsize:
+                    self.condition.wait()
+                job.host = self.scheduler.host_key(job.resource.url)
+                self._add(job)
+            self.condition.notify_all()
+
+    def put_later(self, job: _ResourceJob, delay: float):
+        with self.condition:
+            heapq.heappush(self.delayed, (time.monotonic() + delay, next(self._delayed_order), job))
+            self.condition.notify_all()
+
+    def _add(self, job: _ResourceJob):
+        self.hosts.setdefault(job.host, collections.deque()).append(job)
+        self.size += 1
+
+    def get(self) -> Union[_ResourceJob, object]:
+        with self.condition:
+            while True:
+                while self.delayed and self.delayed[0][0] <= time.monotonic():
+                    self._add(heapq.heappop(self.delayed)[2])
+                shortest_delay = self.delayed[0][0] - time.monotonic() if self.delayed else math.inf
+                for host, jobs in self.hosts.items():
+                    delay = self.scheduler.try_reserve(host)
+                    if not delay:
+                        job = jobs.popleft()
+                        # The host goes to the back of the line so that the next job comes from another host
+                        del self.hosts[host]
+                        if jobs:
+                            self.hosts[host] = jobs
+                        self.size -= 1
+                        self.condition.notify_all()
+                        return job
+                    shortest_delay = min(shortest_delay, delay)
+                if not self.hosts and not self.delayed and self.stops:
+                    self.stops -= 1
+                    return _STOP
+                self.condition.wait(None if shortest_delay == math.inf else shortest_delay)
+
+
+class DownloadPipeline:
+    """Runs the download as four stages connected by bounded queues
+
+    Listings are read on the calling thread and fed to the resolver stage, which selects a site downloader and finds
+    the resources. Resources are then fetched and finally written to disk. Each stage has its own pool of threads and
+    blocks when the queue to the next stage is full, so a slow stage throttles the ones before it.
+
+    Fetches are limited per host by a HostScheduler. Resources are taken from each host in turn, and only when the host
+    has a free slot, so that a slow or heavily limited host does not hold up the fetch workers. A fetch function may
+    raise RetryDeferred to have the resource fetched again once the delay has passed, without holding up a worker.
+
+    If an AsyncDownloadEngine is given, the fetch function must be a coroutine function. Fetches are then run on the
+    engine's event loop and the fetch worker count is the number of resources that may be in flight at once.
+
+    If a video fetch function is given, videos found by youtube-dl are fetched by it in a separate lane with its own
+    workers, so that a few long videos cannot take up every fetch worker. It is always a plain function.
+    """
+
+    def __init__(
+            self,
+            check_function: Callable[[praw.models.Submission], bool],
+            resolve_function: Callable[[praw.models.Submission], Optional[tuple[str, list[tuple[Path, Resource]]]]],
+            fetch_function: Callable[[praw.models.Submission, str, Path, Resource], Union[bool, Coroutine]],
+            write_function: Callable[[praw.models.Submission, Path, Resource], WriteResult],
+            resolve_workers: int = 1,
+            fetch_workers: int = 1,
+            write_workers: int = 1,
+            queue_size: int = 10,
+            submission_hook: Optional[Callable[[praw.models.Submission], None]] = None,
+            fetch_engine: Optional[AsyncDownloadEngine] = None,
+            host_scheduler: Optional[HostScheduler] = None,
+            completion_hook: Optional[Callable[[praw.models.Submission, Optional[str], bool], None]] = None,
+            video_fetch_function: Optional[Callable[[praw.models.Submission, str, Path, Resource], bool]] = None,
+            video_workers: int = 1,
+    ):
+        self.check_function = check_function
+        self.resolve_function = resolve_function
+        self.fetch_function = fetch_function
+        self.write_function = write_function
+        self.resolve_workers = resolve_workers
+        self.fetch_workers = fetch_workers
+        self.write_workers = write_workers
+        self.submission_hook = submission_hook
+        self.completion_hook = completion_hook
+        self.fetch_engine = fetch_engine
+        self.video_fetch_function = video_fetch_function
+        self.video_workers = video_workers
+        self.host_scheduler = host_scheduler if host_scheduler else HostScheduler.get_scheduler()
+
+        self.resolve_queue = queue.Queue(maxsize=queue_size)
+        self.fetch_queue = _HostQueue(self.host_scheduler, queue_size)
+        self.video_queue = _HostQueue(self.host_scheduler, queue_size) if video_fetch_function else None
+        self.write_queue = queue.Queue(maxsize=queue_size)
+
+    def run(self, listings: Iterable[Iterable[praw.models.Submission]]):
+        logger.debug(
+            f'Starting download pipeline with {self.resolve_workers} resolver, {self.fetch_workers} fetch, '
+            f'and {self.write_workers} writer workers')
+        resolvers = self._start_stage(self._resolve_stage, self.resolve_workers)
+        if self.fetch_engine:
+            fetchers = self._start_stage(self._async_fetch_stage, 1)
+        else:
+            fetchers = self._start_stage(partial(self._fetch_stage, self.fetch_queue, self.fetch_function),
+                                         self.fetch_workers)
+        if self.video_queue:
+            video_fetchers = self._start_stage(
+                partial(self._fetch_stage, self.video_queue, self.video_fetch_function), self.video_workers)
+        writers = self._start_stage(self._write_stage, self.write_workers)
+
+        try:
+            self._listing_stage(listings)
+        finally:
+            self._stop_stage(self.resolve_queue, resolvers)
+            self._stop_stage(self.fetch_queue, fetchers)
+            if self.video_queue:
+                self._stop_stage(self.video_queue, video_fetchers)
+            self._stop_stage(self.write_queue, writers)
+
+    @staticmethod
+    def _start_stage(target: Callable[[], None], worker_count: int) -> list[threading.Thread]:
+        threads = [threading.Thread(target=target, daemon=True) for _ in range(worker_count)]
+        for thread in threads:
+            thread.start()
+        return threads
+
+    @staticmethod
+    def _stop_stage(stage_queue: Union[queue.Queue, _HostQueue], threads: list[threading.Thread]):
+        for _ in threads:
+            stage_queue.put(_STOP)
+        for thread in threads:
+            thread.join()
+
+    def _listing_stage(self, listings: Iterable[Iterable[praw.models.Submission]]):
+        seen_ids = set()
+        for generator in listings:
+            for submission in generator:
+                if submission.id in seen_ids:
+                    logger.debug(f'Submission {submission.id} already queued, skipping')
+                    continue
+                seen_ids.add(submission.id)
+                self.resolve_queue.put(submission)
+
+    def _resolve_stage(self):
+        while (submission := self.resolve_queue.get()) is not _STOP:
+            try:
+                self._resolve_submission(submission)
+            except Exception:
+                logger.exception(f'Unexpected error resolving submission {submission.id}')
+
+    def _resolve_submission(self, submission: praw.models.Submission):
+        if self.submission_hook:
+            self.submission_hook(submission)
+        if not self.check_function(submission):
+            return
+        resolved = self.resolve_function(submission)
+        if resolved is None:
+            if self.completion_hook:
+                self.completion_hook(submission, None, False)
+            return
+        downloader_name, resources = resolved
+        task = _SubmissionTask(submission, downloader_name, len(resources))
+        if not resources:
+            self._complete(task)
+        for destination, res in resources:
+            if self.video_queue and isinstance(res, VideoResource):
+                self.video_queue.put(_ResourceJob(task, destination, res))
+            else:
+                self.fetch_queue.put(_ResourceJob(task, destination, res))
+
+    def _fetch_stage(
+            self,
+            fetch_queue: _HostQueue,
+            fetch_function: Callable[[praw.models.Submission, str, Path, Resource], bool],
+    ):
+        while (job := fetch_queue.get()) is not _STOP:
+            if job.task.failed:
+                self.host_scheduler.release(job.host)
+                self._finish_job(job)
+                continue
+            try:
+                with self.host_scheduler.held(job.host):
+                    success = fetch_function(
+                        job.task.submission, job.task.downloader_name, job.destination, job.resource)
+            except RetryDeferred as e:
+                logger.debug(e)
+                fetch_queue.put_later(job, e.delay)
+                continue
+            except Exception:
+                logger.exception(f'Unexpected error fetching resource {job.resource.url}')
+                success = False
+            self._handle_fetch_result(job, success)
+
+    def _async_fetch_stage(self):
+        in_flight = threading.BoundedSemaphore(self.fetch_workers)
+        completed = queue.Queue()
+        forwarder = threading.Thread(target=self._async_forward_stage, args=(completed, in_flight), daemon=True)
+        forwarder.start()
+        while (job := self.fetch_queue.get()) is not _STOP:
+            if job.task.failed:
+                self.host_scheduler.release(job.host)
+                self._finish_job(job)
+                continue
+            in_flight.acquire()
+            try:
+                future = self.fetch_engine.submit(
+                    self.fetch_function(job.task.submission, job.task.downloader_name, job.destination, job.resource))
+            except Exception:
+                logger.exception(f'Unexpected error fetching resource {job.resource.url}')
+                self.host_scheduler.release(job.host)
+                self._handle_fetch_result(job, False)
+                in_flight.release()
+                continue
+            # Callbacks run on the event loop, so they must not block on the bounded write queue
+            future.add_done_callback(lambda f, j=job: completed.put((j, f)))
+        for _ in range(self.fetch_workers):
+            in_flight.acquire()
+        completed.put(_STOP)
+        forwarder.join()
+
+    def _async_forward_stage(self, completed: queue.Queue, in_flight: threading.BoundedSemaphore):
+        while (item := completed.get()) is not _STOP:
+            job, future = item
+            self.host_scheduler.release(job.host)
+            try:
+                success = future.result()
+            except Exception:
+                logger.exception(f'Unexpected error fetching resource {job.resource.url}')
+                success = False
+            self._handle_fetch_result(job, success)
+            in_flight.release()
+
+    def _handle_fetch_result(self, job: _ResourceJob, success: bool):
+        if success:
+            self.write_queue.put(job)
+        else:
+            job.task.failed = True
+            job.resource.discard_download()
+            self._finish_job(job)
+
+    def _write_stage(self):
+        while (job := self.write_queue.get()) is not _STOP:
+            if not job.task.failed:
+                try:
+                    result = self.write_function(job.task.submission, job.destination, job.resource)
+                except Exception:
+                    logger.exception(f'Unexpected error writing resource {job.resource.url} to {job.destination}')
+                    result = WriteResult.FAILED
+                if result is WriteResult.FAILED:
+                    job.task.failed = True
+            # Release the downloaded data as soon as it has been written, or discarded if the submission failed
+            job.resource.discard_download()
+            self._finish_job(job)
+
+    def _finish_job(self, job: _ResourceJob):
+        if job.task.finish_resource():
+            self._complete(job.task)
+
+    def _complete(self, task: _SubmissionTask):
+        if not task.failed:
+            logger.info(f'Downloaded submission {task.submission.id} from {task.submission.subreddit.display_name}')
+        if self.completion_hook:
+            self.completion_hook(task.submission, task.downloader_name, not task.failed)
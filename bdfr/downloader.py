@@ -1,63 +1,244 @@
 #!/usr/bin/env python3
 # coding=utf-8
 
-import hashlib
+import asyncio
+import itertools
 import logging.handlers
 import os
+import shutil
+import sqlite3
+import threading
 import time
+import weakref
 from datetime import datetime
-from multiprocessing import Pool
+from functools import partial
 from pathlib import Path
+from typing import Callable, Optional
 
 import praw
 import praw.exceptions
 import praw.models
 
 from bdfr import exceptions as errors
+from bdfr.async_engine import AsyncDownloadEngine
 from bdfr.configuration import Configuration
 from bdfr.connector import RedditConnector
+from bdfr.download_pipeline import DownloadPipeline, WriteResult
+from bdfr.duplicate_finder import DuplicateFinder
+from bdfr.file_system_index import UNINDEXED_SUFFIXES
+from bdfr.hash_cache import HashCache
+from bdfr.hashing import FinishedHash
+from bdfr.metadata_cache import MetadataCache
+from bdfr.resource import Resource
 from bdfr.site_downloaders.download_factory import DownloadFactory
+from bdfr.state_database import StateDatabase
+from bdfr.video_pool import VideoWorkerPool
 
 logger = logging.getLogger(__name__)
 
 
-def _calc_hash(existing_file: Path):
-    chunk_size = 1024 * 1024
-    md5_hash = hashlib.md5()
-    with open(existing_file, 'rb') as file:
-        chunk = file.read(chunk_size)
-        while chunk:
-            md5_hash.update(chunk)
-            chunk = file.read(chunk_size)
-    file_hash = md5_hash.hexdigest()
-    return existing_file, file_hash
-
-
 class RedditDownloader(RedditConnector):
     def __init__(self, args: Configuration):
         super(RedditDownloader, self).__init__(args)
+        self.hash_cache = self.create_hash_cache()
+        self.duplicate_finder = None
         if self.args.search_existing:
-            self.master_hash_list = self.scan_existing_files(self.download_directory)
+            self.duplicate_finder = DuplicateFinder(
+                self.args.hash_algorithm,
+                self.hash_cache,
+                workers=self.args.hash_workers,
+            )
+            self.master_hash_list = self.duplicate_finder.scan(self.download_directory)
+        self.hash_lock = threading.Lock()
+        self.pending_hashes: dict[str, threading.Event] = {}
+        self.pending_destinations: set[Path] = set()
+        self.partial_files: weakref.WeakValueDictionary[Path, Resource] = weakref.WeakValueDictionary()
+        self.state_database = self.create_state_database()
+        self.downloaded_post_ids = self.scan_downloaded_post_ids()
+        self.metadata_cache = self.create_metadata_cache()
+        MetadataCache.install(self.metadata_cache)
+        self.video_pool = self.create_video_pool()
+        VideoWorkerPool.install(self.video_pool)
+
+    def create_state_database(self) -> Optional[StateDatabase]:
+        if not self.args.state_db:
+            return None
+        return StateDatabase(Path(self.args.state_db).expanduser().resolve())
+
+    def scan_downloaded_post_ids(self) -> set[str]:
+        """Find the submissions that already have files in the download directory, from the names of the files
+
+        This is only done with --skip-existing-ids, and only when the file scheme includes the ID of the submission.
+        """
+        if not self.args.skip_existing_ids:
+            return set()
+        if not self.file_name_formatter.includes_post_id:
+            logger.warning('--skip-existing-ids has no effect as the file scheme does not include {POSTID}')
+            return set()
+        post_ids = set()
+        for _, _, file_names in os.walk(self.download_directory):
+            for file_name in file_names:
+                if file_name.endswith(UNINDEXED_SUFFIXES):
+                    continue
+                if post_id := self.file_name_formatter.find_post_id(file_name):
+                    post_ids.add(post_id)
+        logger.debug(f'Found files for {len(post_ids)} submissions in {self.download_directory}')
+        return post_ids
+
+    def create_hash_cache(self) -> Optional[HashCache]:
+        if not self.args.search_existing:
+            return None
+        return HashCache(Path(self.config_directories.user_cache_dir, 'hash_cache.sqlite'))
+
+    def create_metadata_cache(self) -> MetadataCache:
+        return MetadataCache(Path(self.config_directories.user_cache_dir, 'metadata_cache.sqlite'))
+
+    def create_video_pool(self) -> Optional[VideoWorkerPool]:
+        if not self.args.video_workers:
+            return None
+        return VideoWorkerPool(self.args.video_workers)
 
     def download(self):
-        for generator in self.reddit_lists:
-            for submission in generator:
-                self._download_submission(submission)
+        try:
+            if self.args.workers > 1 or self.args.engine == 'asyncio':
+                self._download_concurrently()
+            else:
+                for generator in self.reddit_lists:
+                    for submission in generator:
+                        self._download_submission(submission)
+        finally:
+            self._close_shared_objects()
+
+    def _close_shared_objects(self):
+        if self.state_database:
+            self.state_database.close()
+        if self.hash_cache:
+            self.hash_cache.close()
+        MetadataCache.install(None)
+        self.metadata_cache.close()
+        if self.video_pool:
+            VideoWorkerPool.install(None)
+            self.video_pool.close()
+
+    def _download_concurrently(self, submission_hook: Optional[Callable[[praw.models.Submission], None]] = None):
+        if self.args.engine == 'asyncio':
+            self.download_engine = AsyncDownloadEngine(self.args.fetch_workers)
+            fetch_function = self._fetch_resource_async
+        else:
+            self.download_engine = None
+            # Failed downloads are requeued by the pipeline rather than holding a worker while waiting to retry
+            fetch_function = partial(self._fetch_resource, defer_retries=True)
+        pipeline = DownloadPipeline(
+            self._check_submission,
+            self._resolve_submission,
+            fetch_function,
+            self._write_resource,
+            resolve_workers=self.args.resolve_workers,
+            fetch_workers=self.args.fetch_workers,
+            write_workers=self.args.write_workers,
+            queue_size=self.args.queue_size,
+            submission_hook=submission_hook,
+            fetch_engine=self.download_engine,
+            completion_hook=self._record_submission,
+            # Videos wait on the video worker processes in their own lane, so they do not hold up other downloads
+            video_fetch_function=partial(self._fetch_resource, defer_retries=True) if self.video_pool else None,
+            video_workers=self.args.video_workers,
+        )
+        try:
+            pipeline.run(self.reddit_lists)
+        finally:
+            if self.download_engine:
+                self.download_engine.close()
 
     def _download_submission(self, submission: praw.models.Submission):
+        if not self._check_submission(submission):
+            return
+        resolved = self._resolve_submission(submission)
+        if resolved is None:
+            self._record_submission(submission, None, False)
+            return
+        downloader_name, resources = resolved
+        for destination, res in resources:
+            if not self._fetch_resource(submission, downloader_name, destination, res) or \
+                    self._write_resource(submission, destination, res) is WriteResult.FAILED:
+                self._record_submission(submission, downloader_name, False)
+                return
+        logger.info(f'Downloaded submission {submission.id} from {submission.subreddit.display_name}')
+        self._record_submission(submission, downloader_name, True)
+
+    def _record_submission(self, submission: praw.models.Submission, downloader_name: Optional[str], success: bool):
+        if not self.state_database:
+            return
+        try:
+            self.state_database.record_submission(submission.id, 'downloaded' if success else 'failed', downloader_name)
+        except sqlite3.Error as e:
+            logger.error(f'Failed to record submission {submission.id} in state database: {e}')
+
+    def _record_resource(self, submission: praw.models.Submission, res: Resource, destination: Optional[Path]):
+        if not self.state_database:
+            return
+        try:
+            self.state_database.record_resource(submission.id, res.url, res.hash.hexdigest(), destination)
+            if destination and res.url:
+                # Later downloads of the same URL can reuse this file rather than downloading it again
+                self.state_database.record_file(
+                    res.url, res.hash.hexdigest(), self.args.hash_algorithm, destination, destination.stat().st_size)
+        except (OSError, sqlite3.Error) as e:
+            logger.error(f'Failed to record resource {res.url} in state database: {e}')
+
+    def _reuse_stored_file(self, destination: Path, res: Resource) -> bool:
+        """Take a resource from a file already downloaded from the same URL, instead of downloading it again
+
+        The stored file is only used if it still has the size it was written with. With --no-dupes or
+        --make-hard-links, the write stage then skips the resource or links to the stored file, and otherwise the
+        stored file is copied. Returns True if the resource does not need to be downloaded.
+        """
+        if not self.state_database or not res.url:
+            return False
+        try:
+            stored_file = self.state_database.find_file(res.url, self.args.hash_algorithm)
+            if not stored_file or stored_file.path.stat().st_size != stored_file.size:
+                return False
+        except (OSError, sqlite3.Error) as e:
+            logger.debug(f'Could not use stored file for {res.url}: {e}')
+            return False
+        if self.args.no_dupes or self.args.make_hard_links:
+            with self.hash_lock:
+                self.master_hash_list.setdefault(stored_file.hash, stored_file.path)
+        else:
+            partial_file = self._get_partial_file(destination, res)
+            shutil.copyfile(stored_file.path, partial_file)
+        res.hash = FinishedHash(self.args.hash_algorithm, bytes.fromhex(stored_file.hash))
+        logger.debug(f'Resource {res.url} already downloaded to {stored_file.path}, not downloading again')
+        return True
+
+    def _check_submission(self, submission: praw.models.Submission) -> bool:
         if submission.id in self.excluded_submission_ids:
             logger.debug(f'Object {submission.id} in exclusion list, skipping')
-            return
+            return False
         elif submission.subreddit.display_name.lower() in self.args.skip_subreddit:
             logger.debug(f'Submission {submission.id} in {submission.subreddit.display_name} in skip list')
-            return
+            return False
         elif not isinstance(submission, praw.models.Submission):
             logger.warning(f'{submission.id} is not a submission')
-            return
+            return False
         elif not self.download_filter.check_url(submission.url):
             logger.debug(f'Submission {submission.id} filtered due to URL {submission.url}')
-            return
+            return False
+        elif self.state_database and self.state_database.is_complete(submission.id):
+            logger.debug(f'Submission {submission.id} already downloaded according to state database, skipping')
+            return False
+        elif submission.id in self.downloaded_post_ids and \
+                not (self.state_database and self.state_database.is_recorded(submission.id)):
+            # The state database knows better than the file names whether a submission was downloaded completely
+            logger.debug(f'Submission {submission.id} already has files in the download directory, skipping')
+            return False
+        return True
 
+    def _resolve_submission(
+            self,
+            submission: praw.models.Submission,
+    ) -> Optional[tuple[str, list[tuple[Path, Resource]]]]:
         logger.debug(f'Attempting to download submission {submission.id}')
         try:
             downloader_class = DownloadFactory.pull_lever(submission.url)
@@ -65,65 +246,185 @@ class RedditDownloader(RedditConnector):
             logger.debug(f'Using {downloader_class.__name__} with url {submission.url}')
         except errors.NotADownloadableLinkError as e:
             logger.error(f'Could not download submission {submission.id}: {e}')
-            return
+            return None
         if downloader_class.__name__.lower() in self.args.disable_module:
             logger.debug(f'Submission {submission.id} skipped due to disabled module {downloader_class.__name__}')
-            return
+            return None
         try:
             content = downloader.find_resources(self.authenticator)
         except errors.SiteDownloaderError as e:
             logger.error(f'Site {downloader_class.__name__} failed to download submission {submission.id}: {e}')
-            return
+            return None
+        out = []
         for destination, res in self.file_name_formatter.format_resource_paths(content, self.download_directory):
-            if destination.exists():
+            if self.file_system_index.exists(destination):
                 logger.debug(f'File {destination} from submission {submission.id} already exists, continuing')
                 continue
             elif not self.download_filter.check_resource(res):
                 logger.debug(f'Download filter removed {submission.id} file with URL {submission.url}')
                 continue
-            try:
-                res.download(self.args.max_wait_time)
-            except errors.BulkDownloaderException as e:
-                logger.error(f'Failed to download resource {res.url} in submission {submission.id} '
-                             f'with downloader {downloader_class.__name__}: {e}')
-                return
-            resource_hash = res.hash.hexdigest()
-            destination.parent.mkdir(parents=True, exist_ok=True)
-            if resource_hash in self.master_hash_list:
-                if self.args.no_dupes:
-                    logger.info(
-                        f'Resource hash {resource_hash} from submission {submission.id} downloaded elsewhere')
-                    return
-                elif self.args.make_hard_links:
-                    self.master_hash_list[resource_hash].link_to(destination)
-                    logger.info(
-                        f'Hard link made linking {destination} to {self.master_hash_list[resource_hash]}'
-                        f' in submission {submission.id}')
-                    return
-            try:
+            out.append((destination, res))
+        return downloader_class.__name__, out
+
+    def _fetch_resource(
+            self,
+            submission: praw.models.Submission,
+            downloader_name: str,
+            destination: Path,
+            res: Resource,
+            defer_retries: bool = False,
+    ) -> bool:
+        try:
+            if res.content:
+                res.download(self.args.max_wait_time, defer_retries)
+            elif not self._reuse_stored_file(destination, res):
+                partial_file = self._get_partial_file(destination, res)
+                res.download_to_file(partial_file, self.args.max_wait_time, defer_retries)
+        except errors.RetryDeferred:
+            raise
+        except errors.RetryableError as e:
+            logger.error(f'Failed to download resource {res.url} in submission {submission.id} '
+                         f'with downloader {downloader_name}: {e}')
+            # What was downloaded is kept so that the next run can resume from it
+            res.discard_download(keep_partial=True)
+            return False
+        except errors.BulkDownloaderException as e:
+            logger.error(f'Failed to download resource {res.url} in submission {submission.id} '
+                         f'with downloader {downloader_name}: {e}')
+            res.discard_download()
+            return False
+        except OSError as e:
+            logger.error(f'Failed to write resource {res.url} in submission {submission.id} to disk: {e}')
+            res.discard_download()
+            return False
+        return True
+
+    async def _fetch_resource_async(
+            self,
+            submission: praw.models.Submission,
+            downloader_name: str,
+            destination: Path,
+            res: Resource,
+    ) -> bool:
+        try:
+            if res.content:
+                await self.download_engine.download(res, self.args.max_wait_time)
+            elif not await asyncio.to_thread(self._reuse_stored_file, destination, res):
+                partial_file = await asyncio.to_thread(self._get_partial_file, destination, res)
+                await self.download_engine.download_to_file(res, partial_file, self.args.max_wait_time)
+        except errors.RetryableError as e:
+            logger.error(f'Failed to download resource {res.url} in submission {submission.id} '
+                         f'with downloader {downloader_name}: {e}')
+            await asyncio.to_thread(res.discard_download, keep_partial=True)
+            return False
+        except errors.BulkDownloaderException as e:
+            logger.error(f'Failed to download resource {res.url} in submission {submission.id} '
+                         f'with downloader {downloader_name}: {e}')
+            await asyncio.to_thread(res.discard_download)
+            return False
+        except OSError as e:
+            logger.error(f'Failed to write resource {res.url} in submission {submission.id} to disk: {e}')
+            await asyncio.to_thread(res.discard_download)
+            return False
+        return True
+
+    def _get_partial_file(self, destination: Path, res: Resource) -> Path:
+        """Reserve a partial file for the resource next to its destination
+
+        Partial files are kept next to the destination so that they can be renamed into place once complete, and are
+        named after it so that an interrupted download can be resumed. A partial file stays reserved while the
+        resource it was given to is still downloading into it, and another resource with the same destination is
+        given a numbered one instead.
+        """
+        self.file_system_index.make_directory(destination.parent)
+        with self.hash_lock:
+            for i in itertools.count():
+                partial_file = destination.with_name(destination.name + (f'.{i}.part' if i else '.part'))
+                owner = self.partial_files.get(partial_file)
+                if owner is None or owner is res or owner.download_path != partial_file:
+                    self.partial_files[partial_file] = res
+                    # Set here rather than by the download, so that the file is reserved from this point on
+                    res.download_path = partial_file
+                    return partial_file
+
+    def _write_resource(self, submission: praw.models.Submission, destination: Path, res: Resource) -> WriteResult:
+        resource_hash = res.hash.hexdigest()
+        self.file_system_index.make_directory(destination.parent)
+        if self.duplicate_finder and resource_hash not in self.master_hash_list:
+            self._find_existing_duplicate(res, resource_hash)
+        # The hash and destination are checked and reserved under the lock; the write itself happens outside it
+        while True:
+            with self.hash_lock:
+                in_progress = self.pending_hashes.get(resource_hash)
+                if in_progress is None:
+                    if resource_hash in self.master_hash_list:
+                        if self.args.no_dupes:
+                            logger.info(
+                                f'Resource hash {resource_hash} from submission {submission.id} downloaded elsewhere')
+                            self._record_resource(submission, res, None)
+                            res.discard_download()
+                            return WriteResult.DUPLICATE
+                        elif self.args.make_hard_links:
+                            self.master_hash_list[resource_hash].link_to(destination)
+                            self.file_system_index.add(destination)
+                            logger.info(
+                                f'Hard link made linking {destination} to {self.master_hash_list[resource_hash]}'
+                                f' in submission {submission.id}')
+                            self._record_resource(submission, res, destination)
+                            res.discard_download()
+                            return WriteResult.DUPLICATE
+                    if self.file_system_index.exists(destination) or destination in self.pending_destinations:
+                        logger.debug(
+                            f'File {destination} from submission {submission.id} written by another worker')
+                        self._record_resource(submission, res, destination)
+                        res.discard_download()
+                        return WriteResult.WRITTEN
+                    self.pending_hashes[resource_hash] = threading.Event()
+                    self.pending_destinations.add(destination)
+                    break
+            # Another worker is writing a file with the same hash, which decides whether this one is a duplicate
+            in_progress.wait()
+
+        success = True
+        try:
+            if res.download_path:
+                os.replace(res.download_path, destination)
+                res.download_path = None
+            else:
                 with open(destination, 'wb') as file:
                     file.write(res.content)
-                logger.debug(f'Written file to {destination}')
-            except OSError as e:
-                logger.exception(e)
-                logger.error(f'Failed to write file in submission {submission.id} to {destination}: {e}')
-                return
-            creation_time = time.mktime(datetime.fromtimestamp(submission.created_utc).timetuple())
-            os.utime(destination, (creation_time, creation_time))
-            self.master_hash_list[resource_hash] = destination
-            logger.debug(f'Hash added to master list: {resource_hash}')
-        logger.info(f'Downloaded submission {submission.id} from {submission.subreddit.display_name}')
+            self.file_system_index.add(destination)
+            logger.debug(f'Written file to {destination}')
+        except OSError as e:
+            logger.exception(e)
+            logger.error(f'Failed to write file in submission {submission.id} to {destination}: {e}')
+            res.discard_download()
+            success = False
+        with self.hash_lock:
+            if success:
+                self.master_hash_list[resource_hash] = destination
+            self.pending_destinations.discard(destination)
+            self.pending_hashes.pop(resource_hash).set()
+        if not success:
+            return WriteResult.FAILED
+        creation_time = time.mktime(datetime.fromtimestamp(submission.created_utc).timetuple())
+        os.utime(destination, (creation_time, creation_time))
+        logger.debug(f'Hash added to master list: {resource_hash}')
+        self._record_resource(submission, res, destination)
+        if self.hash_cache:
+            self._cache_hash(destination, resource_hash)
+        return WriteResult.WRITTEN
 
-    @staticmethod
-    def scan_existing_files(directory: Path) -> dict[str, Path]:
-        files = []
-        for (dirpath, dirnames, filenames) in os.walk(directory):
-            files.extend([Path(dirpath, file) for file in filenames])
-        logger.info(f'Calculating hashes for {len(files)} files')
+    def _find_existing_duplicate(self, res: Resource, resource_hash: str):
+        # Files already on disk are only hashed when a download of the same size arrives, outside the hash lock
+        size = res.download_path.stat().st_size if res.download_path else len(res.content)
+        existing_file = self.duplicate_finder.find(size, resource_hash, res.download_path)
+        if existing_file:
+            with self.hash_lock:
+                self.master_hash_list.setdefault(resource_hash, existing_file)
 
-        pool = Pool(15)
-        results = pool.map(_calc_hash, files)
-        pool.close()
-
-        hash_list = {res[1]: res[0] for res in results}
-        return hash_list
+    def _cache_hash(self, destination: Path, resource_hash: str):
+        try:
+            self.hash_cache.store([(destination, destination.stat(), resource_hash)], self.args.hash_algorithm)
+        except (OSError, sqlite3.Error) as e:
+            logger.debug(f'Could not cache hash for {destination}: {e}')
@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+# coding=utf-8
+
+import itertools
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+from functools import partial
+from multiprocessing.pool import AsyncResult, ThreadPool
+from pathlib import Path
+from typing import Iterator, Optional
+
+from bdfr.file_system_index import UNINDEXED_SUFFIXES
+from bdfr.hash_cache import HashCache
+from bdfr.hashing import CHUNK_SIZE, fingerprint_file, hash_file
+
+logger = logging.getLogger(__name__)
+
+# Hashing is mostly spent waiting on disk or network storage with the GIL released, so more threads than cores help
+DEFAULT_HASH_WORKERS = min(32, (os.cpu_count() or 1) + 4)
+
+
+def _hash_file(file_path: Path, algorithm: str) -> tuple[Path, Optional[str]]:
+    try:
+        return file_path, hash_file(file_path, algorithm)
+    except OSError as e:
+        logger.warning(f'Could not hash {file_path}: {e}')
+        return file_path, None
+
+
+def _fingerprint_file(file_path: Path, algorithm: str, edge_size: int) -> tuple[Path, Optional[str]]:
+    try:
+        return file_path, fingerprint_file(file_path, algorithm, edge_size)
+    except OSError as e:
+        logger.warning(f'Could not read {file_path}: {e}')
+        return file_path, None
+
+
+class _ProgressCounter:
+    interval = 5
+
+    def __init__(self, action: str, total: Optional[int] = None):
+        self.action = action
+        self.total = total
+        self.count = 0
+        self._last_report = time.monotonic()
+
+    def increment(self):
+        self.count += 1
+        now = time.monotonic()
+        if now - self._last_report >= self.interval:
+            self._last_report = now
+            logger.info(f'{self.action} {self._describe()} files')
+
+    def _describe(self) -> str:
+        return f'{self.count} of {self.total}' if self.total is not None else str(self.count)
+
+    def finish(self):
+        logger.debug(f'Finished {self.action.lower()} {self._describe()} files')
+
+
+class DuplicateFinder:
+    """Finds the files in a directory that a new download duplicates, while reading as little of them as possible
+
+    Only files of the same size can be duplicates, so files are grouped by size as the directory is listed. As soon as
+    a second file of a size is found, the files of that size start being read while the listing continues: small files
+    are hashed in full, and larger ones have their first and last megabyte hashed. Once the listing is finished, only
+    larger files that still match are hashed in full. The remaining files are only hashed if a new download of the
+    same size arrives.
+    """
+
+    def __init__(
+            self,
+            algorithm: str = 'md5',
+            hash_cache: Optional[HashCache] = None,
+            edge_size: int = CHUNK_SIZE,
+            workers: Optional[int] = None,
+    ):
+        self.algorithm = algorithm
+        self.hash_cache = hash_cache
+        self.edge_size = edge_size
+        self.workers = workers or DEFAULT_HASH_WORKERS
+        self._lock = threading.Lock()
+        self._files_by_size: dict[int, list[tuple[Path, os.stat_result]]] = defaultdict(list)
+        self._hashes: dict[str, Path] = {}
+        self._hashed: set[Path] = set()
+        self._fingerprints: dict[Path, Optional[str]] = {}
+
+    def scan(self, directory: Path) -> dict[str, Path]:
+        """Index the files in the directory and return the hashes of every file that had to be hashed"""
+        # Cached paths are absolute, so the directory must be too for them to be found
+        directory = directory.resolve()
+        cached = self.hash_cache.load(directory) if self.hash_cache else {}
+        hash_list = {}
+        unknown_by_size = defaultdict(list)
+        progress = _ProgressCounter('Scanned')
+        with ThreadPool(self.workers) as pool:
+            started: dict[Path, AsyncResult] = {}
+            for file, file_stat in self._iterate_files(directory):
+                progress.increment()
+                size_group = self._files_by_size[file_stat.st_size]
+                size_group.append((file, file_stat))
+                entry = cached.pop(str(file), None)
+                if entry and (file_hash := HashCache.get_valid_hash(entry, file_stat, self.algorithm)):
+                    hash_list[file_hash] = file
+                    self._hashes[file_hash] = file
+                    self._hashed.add(file)
+                    unknown = False
+                else:
+                    unknown_by_size[file_stat.st_size].append((file, file_stat))
+                    unknown = True
+                # The files of a size are read by the pool from the moment a second one is found, during the listing
+                if len(size_group) == 2:
+                    to_start = unknown_by_size[file_stat.st_size]
+                elif len(size_group) > 2 and unknown:
+                    to_start = [(file, file_stat)]
+                else:
+                    to_start = []
+                if len(unknown_by_size[file_stat.st_size]) < len(size_group) and file_stat.st_size > self.edge_size:
+                    # Files of the same size as one with a cached hash are hashed in full later, not fingerprinted
+                    to_start = []
+                for unknown_file, _ in to_start:
+                    started[unknown_file] = self._start_reading(unknown_file, file_stat.st_size, pool)
+            progress.finish()
+            if self.hash_cache:
+                # Anything left in the cache for this directory was not found on disk
+                self.hash_cache.prune(cached.keys())
+
+            to_hash = self._find_possible_duplicates(unknown_by_size, started)
+            logger.info(f'Calculating hashes for {len(to_hash)} of {progress.count} files')
+            hash_list.update(self._hash_files(to_hash, pool, started))
+        return hash_list
+
+    def _start_reading(self, file_path: Path, size: int, pool: ThreadPool) -> AsyncResult:
+        # Small files are read whole by a fingerprint anyway, so they are hashed in full straight away
+        if size <= self.edge_size:
+            return pool.apply_async(_hash_file, (file_path, self.algorithm))
+        return pool.apply_async(_fingerprint_file, (file_path, self.algorithm, self.edge_size))
+
+    def find(self, size: int, file_hash: str, file_path: Optional[Path] = None) -> Optional[Path]:
+        """Return an existing file with the given size and hash, hashing the files of that size if needed
+
+        If the path of the new file is given, it is used to rule out most existing files before hashing them.
+        """
+        with self._lock:
+            if file_hash in self._hashes:
+                return self._hashes[file_hash]
+            candidates = [(f, s) for f, s in self._files_by_size.get(size, ()) if f not in self._hashed]
+        if not candidates:
+            return None
+        if file_path is not None and size > self.edge_size:
+            _, new_fingerprint = _fingerprint_file(file_path, self.algorithm, self.edge_size)
+            candidates = [(f, s) for f, s in candidates if self._get_fingerprint(f) == new_fingerprint]
+        self._hash_files(candidates)
+        with self._lock:
+            return self._hashes.get(file_hash)
+
+    def _get_fingerprint(self, file_path: Path) -> Optional[str]:
+        with self._lock:
+            if file_path in self._fingerprints:
+                return self._fingerprints[file_path]
+        fingerprint = _fingerprint_file(file_path, self.algorithm, self.edge_size)[1]
+        with self._lock:
+            self._fingerprints[file_path] = fingerprint
+        return fingerprint
+
+    @staticmethod
+    def _iterate_files(directory: Path) -> Iterator[tuple[Path, os.stat_result]]:
+        # Entries are yielded as each directory is read, so no list of every file in the tree is built first
+        directories = [directory]
+        while directories:
+            current = directories.pop()
+            try:
+                with os.scandir(current) as entries:
+                    for entry in entries:
+                        try:
+                            if entry.is_dir(follow_symlinks=False):
+                                directories.append(entry.path)
+                            elif entry.is_file() and not entry.name.endswith(UNINDEXED_SUFFIXES):
+                                yield Path(entry.path), entry.stat()
+                        except OSError as e:
+                            logger.warning(f'Could not read {entry.path}: {e}')
+            except OSError as e:
+                logger.warning(f'Could not read directory {current}: {e}')
+
+    def _find_possible_duplicates(
+            self,
+            unknown_by_size: dict[int, list[tuple[Path, os.stat_result]]],
+            started: dict[Path, AsyncResult],
+    ) -> list[tuple[Path, os.stat_result]]:
+        to_hash = []
+        by_fingerprint = defaultdict(list)
+        progress = _ProgressCounter('Fingerprinted')
+        for size, unknown in unknown_by_size.items():
+            if len(self._files_by_size[size]) < 2:
+                continue
+            if len(unknown) < len(self._files_by_size[size]) or size <= self.edge_size:
+                # A file with a cached hash can only be compared by hash, and small files are already being hashed
+                to_hash.extend(unknown)
+                continue
+            for file, file_stat in unknown:
+                fingerprint = started[file].get()[1]
+                progress.increment()
+                self._fingerprints[file] = fingerprint
+                if fingerprint is not None:
+                    by_fingerprint[(size, fingerprint)].append((file, file_stat))
+        progress.finish()
+        for group in by_fingerprint.values():
+            if len(group) > 1:
+                to_hash.extend(group)
+        return to_hash
+
+    def _hash_files(
+            self,
+            files: list[tuple[Path, os.stat_result]],
+            pool: Optional[ThreadPool] = None,
+            started: Optional[dict[Path, AsyncResult]] = None,
+    ) -> dict[str, Path]:
+        if not files:
+            return {}
+        hash_function = partial(_hash_file, algorithm=self.algorithm)
+        stats = dict(files)
+        # Small files started during the listing are already being hashed in full, so they are not read again
+        started = {
+            file: result for file, result in (started or {}).items()
+            if file in stats and stats[file].st_size <= self.edge_size
+        }
+        remaining = [file for file in stats.keys() if file not in started]
+        if pool:
+            results = pool.imap_unordered(hash_function, remaining, chunksize=4)
+        else:
+            results = map(hash_function, remaining)
+        results = itertools.chain((result.get() for result in started.values()), results)
+        progress = _ProgressCounter('Hashed', len(stats))
+        hashed = []
+        for file, file_hash in results:
+            progress.increment()
+            if file_hash is not None:
+                hashed.append((file, stats[file], file_hash))
+        progress.finish()
+        with self._lock:
+            for file, _, file_hash in hashed:
+                self._hashed.add(file)
+                self._hashes.setdefault(file_hash, file)
+        if self.hash_cache:
+            self.hash_cache.store(hashed, self.algorithm)
+        return {file_hash: file for file, _, file_hash in hashed}
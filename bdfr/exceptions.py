@@ -1,5 +1,8 @@
 #!/usr/bin/env
 
+from typing import Optional
+
+
 class BulkDownloaderException(Exception):
     pass
 
@@ -26,3 +29,15 @@ class NotADownloadableLinkError(SiteDownloaderError):
 
 class ResourceNotFound(SiteDownloaderError):
     pass
+
+
+class RetryableError(BulkDownloaderException):
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class RetryDeferred(BulkDownloaderException):
+    def __init__(self, message: str, delay: float):
+        super().__init__(message)
+        self.delay = delay
@@ -1,10 +1,11 @@
 #!/usr/bin/env python3
 # coding=utf-8
 import datetime
+import functools
 import logging
+import os
 import platform
 import re
-import subprocess
 from pathlib import Path
 from typing import Optional
 
@@ -17,6 +18,11 @@ logger = logging.getLogger(__name__)
 
 
 class FileNameFormatter:
+    """Names files and folders from the file and folder schemes
+
+    The schemes are compiled once into plans that alternate literal text with the keys to fill in, and the values for
+    a submission are worked out once and shared by all of its resources.
+    """
     key_terms = (
         'date',
         'flair',
@@ -26,6 +32,10 @@ class FileNameFormatter:
         'title',
         'upvotes',
     )
+    _key_regex = re.compile(r'(?i){(' + '|'.join(key_terms) + r')}')
+    _unicode_escape_regex = re.compile(r'(\\u\d{4})')
+    # The limit on the length of paths for each device, which is looked up once for each file system
+    _max_path_lengths: dict[Optional[int], int] = {}
 
     def __init__(self, file_format_string: str, directory_format_string: str, time_format_string: str):
         if not self.validate_string(file_format_string):
@@ -33,33 +43,78 @@ class FileNameFormatter:
         self.file_format_string = file_format_string
         self.directory_format_string: list[str] = directory_format_string.split('/')
         self.time_format_string = time_format_string
+        self._file_plan = self._compile_scheme(self.file_format_string)
+        self._directory_plans = [self._compile_scheme(part) for part in self.directory_format_string]
+        self._post_id_pattern = self._compile_post_id_pattern(self._file_plan)
+
+    @staticmethod
+    @functools.lru_cache(maxsize=128)
+    def _compile_scheme(format_string: str) -> tuple[str, ...]:
+        """Split a scheme into literal text at even positions and lowercase key names at odd positions"""
+        parts = FileNameFormatter._key_regex.split(format_string)
+        parts[1::2] = [key.lower() for key in parts[1::2]]
+        return tuple(parts)
+
+    @staticmethod
+    def _compile_post_id_pattern(plan: tuple[str, ...]) -> Optional[re.Pattern]:
+        """Build a pattern that reads the submission ID back out of a file name made with the plan
+
+        Names shortened to fit the length limit still match as long as the ID is kept, which it is when it comes last
+        in the scheme. Returns None if the scheme does not include the ID.
+        """
+        if 'postid' not in plan[1::2]:
+            return None
+        pattern = []
+        for i, part in enumerate(plan):
+            if i % 2 == 0:
+                part = part.replace('/', '')
+                if platform.system() == 'Windows':
+                    part = FileNameFormatter._format_for_windows(part)
+                pattern.append(re.escape(part))
+            elif part != 'postid':
+                pattern.append('.*?')
+            elif r'(?P<postid>' in ''.join(pattern):
+                pattern.append('(?P=postid)')
+            else:
+                pattern.append(r'(?P<postid>[0-9a-z]+)')
+        # Resources from a gallery are numbered before the extension
+        pattern.append(r'(?:_\d+)?\.\w+')
+        return re.compile(''.join(pattern))
+
+    @property
+    def includes_post_id(self) -> bool:
+        return self._post_id_pattern is not None
+
+    def find_post_id(self, file_name: str) -> Optional[str]:
+        """Return the ID of the submission a file was named for, if the name matches the file scheme"""
+        if self._post_id_pattern and (match := self._post_id_pattern.fullmatch(file_name)):
+            return match.group('postid')
+        return None
+
+    @staticmethod
+    def _render(plan: tuple[str, ...], attributes: dict[str, str]) -> str:
+        parts = list(plan)
+        parts[1::2] = [attributes[key] for key in plan[1::2]]
+        result = ''.join(parts).replace('/', '')
+        if platform.system() == 'Windows':
+            result = FileNameFormatter._format_for_windows(result)
+        return result
 
     def _format_name(self, submission: (Comment, Submission), format_string: str) -> str:
+        return self._render(self._compile_scheme(format_string), self._get_name_attributes(submission))
+
+    def _get_name_attributes(self, submission: (Comment, Submission)) -> dict[str, str]:
         if isinstance(submission, Submission):
             attributes = self._generate_name_dict_from_submission(submission)
         elif isinstance(submission, Comment):
             attributes = self._generate_name_dict_from_comment(submission)
         else:
             raise BulkDownloaderException(f'Cannot name object {type(submission).__name__}')
-        result = format_string
-        for key in attributes.keys():
-            if re.search(fr'(?i).*{{{key}}}.*', result):
-                key_value = str(attributes.get(key, 'unknown'))
-                key_value = FileNameFormatter._convert_unicode_escapes(key_value)
-                key_value = key_value.replace('\\', '\\\\')
-                result = re.sub(fr'(?i){{{key}}}', key_value, result)
-
-        result = result.replace('/', '')
-
-        if platform.system() == 'Windows':
-            result = FileNameFormatter._format_for_windows(result)
-
-        return result
+        return {key: self._convert_unicode_escapes(str(value)) for key, value in attributes.items()}
 
     @staticmethod
     def _convert_unicode_escapes(in_string: str) -> str:
-        pattern = re.compile(r'(\\u\d{4})')
-        matches = re.search(pattern, in_string)
+        matches = FileNameFormatter._unicode_escape_regex.search(in_string)
         if matches:
             for match in matches.groups():
                 converted_match = bytes(match, 'utf-8').decode('unicode-escape')
@@ -103,16 +158,28 @@ class FileNameFormatter:
             destination_directory: Path,
             index: Optional[int] = None,
     ) -> Path:
-        subfolder = Path(
-            destination_directory,
-            *[self._format_name(resource.source_submission, part) for part in self.directory_format_string],
+        attributes = self._get_name_attributes(resource.source_submission)
+        return self._format_path_from_names(
+            resource,
+            self._format_subfolder(attributes, destination_directory),
+            self._render(self._file_plan, attributes),
+            index,
         )
+
+    def _format_subfolder(self, attributes: dict[str, str], destination_directory: Path) -> Path:
+        return Path(destination_directory, *[self._render(plan, attributes) for plan in self._directory_plans])
+
+    def _format_path_from_names(
+            self,
+            resource: Resource,
+            subfolder: Path,
+            file_name: str,
+            index: Optional[int],
+    ) -> Path:
         index = f'_{str(index)}' if index else ''
         if not resource.extension:
             raise BulkDownloaderException(f'Resource from {resource.url} has no extension')
         ending = index + resource.extension
-        file_name = str(self._format_name(resource.source_submission, self.file_format_string))
-
         try:
             file_path = self._limit_file_name_length(file_name, ending, subfolder)
         except TypeError:
@@ -126,25 +193,42 @@ class FileNameFormatter:
         if possible_id:
             ending = possible_id.group(1) + ending
             filename = filename[:possible_id.start()]
-        max_path = FileNameFormatter.find_max_path_length()
-        max_length_chars = 255 - len(ending)
-        max_length_bytes = 255 - len(ending.encode('utf-8'))
-        max_path_length = max_path - len(ending) - len(str(root)) - 1
-        while len(filename) > max_length_chars or \
-                len(filename.encode('utf-8')) > max_length_bytes or \
-                len(filename) > max_path_length:
-            filename = filename[:-1]
+        max_path = FileNameFormatter.find_max_path_length(root)
+        # File systems count the length of names and paths in bytes rather than characters
+        ending_length = len(ending.encode('utf-8'))
+        max_length = min(255 - ending_length, max_path - len(str(root).encode('utf-8')) - ending_length - 1)
+        encoded_name = filename.encode('utf-8')
+        if len(encoded_name) > max_length:
+            # A character cut in half by the limit is dropped whole rather than left as invalid UTF-8
+            filename = encoded_name[:max(max_length, 0)].decode('utf-8', errors='ignore')
         return Path(root, filename + ending)
 
     @staticmethod
-    def find_max_path_length() -> int:
-        try:
-            return int(subprocess.check_output(['getconf', 'PATH_MAX', '/']))
-        except (ValueError, subprocess.CalledProcessError, OSError):
-            if platform.system() == 'Windows':
-                return 260
-            else:
-                return 4096
+    def find_max_path_length(directory: Optional[Path] = None) -> int:
+        """Return the longest path allowed on the file system that holds the directory"""
+        if platform.system() == 'Windows':
+            return 260
+        device, existing_directory = FileNameFormatter._find_device(str(directory or Path('/').resolve()))
+        if device not in FileNameFormatter._max_path_lengths:
+            try:
+                max_path = os.pathconf(existing_directory, 'PC_PATH_MAX')
+            except (ValueError, OSError):
+                max_path = -1
+            # A file system with no fixed limit reports -1, and the usual limit for Linux is used instead
+            FileNameFormatter._max_path_lengths[device] = max_path if max_path > 0 else 4096
+        return FileNameFormatter._max_path_lengths[device]
+
+    @staticmethod
+    @functools.lru_cache(maxsize=1024)
+    def _find_device(directory: str) -> tuple[Optional[int], str]:
+        # The directory may not have been made yet, in which case it will be on the same device as its nearest parent
+        path = Path(directory)
+        for existing_directory in (path, *path.parents):
+            try:
+                return existing_directory.stat().st_dev, str(existing_directory)
+            except OSError:
+                continue
+        return None, directory
 
     def format_resource_paths(
             self,
@@ -152,20 +236,23 @@ class FileNameFormatter:
             destination_directory: Path,
     ) -> list[tuple[Path, Resource]]:
         out = []
-        if len(resources) == 1:
+        # The resources found by a downloader all come from the same submission, so it is only named once
+        names: dict[int, tuple[Path, str]] = {}
+        for i, res in enumerate(resources, start=1):
+            index = i if len(resources) > 1 else None
+            logger.log(9, f'Formatting filename with index {index}')
             try:
-                out.append((self.format_path(resources[0], destination_directory, None), resources[0]))
+                submission_key = id(res.source_submission)
+                if submission_key not in names:
+                    attributes = self._get_name_attributes(res.source_submission)
+                    names[submission_key] = (
+                        self._format_subfolder(attributes, destination_directory),
+                        self._render(self._file_plan, attributes),
+                    )
+                out.append((self._format_path_from_names(res, *names[submission_key], index), res))
             except BulkDownloaderException as e:
-                logger.error(f'Could not generate file path for resource {resources[0].url}: {e}')
+                logger.error(f'Could not generate file path for resource {res.url}: {e}')
                 logger.exception('Could not generate file path')
-        else:
-            for i, res in enumerate(resources, start=1):
-                logger.log(9, f'Formatting filename with index {i}')
-                try:
-                    out.append((self.format_path(res, destination_directory, i), res))
-                except BulkDownloaderException as e:
-                    logger.error(f'Could not generate file path for resource {res.url}: {e}')
-                    logger.exception('Could not generate file path')
         return out
 
     @staticmethod
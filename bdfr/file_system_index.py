@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+# coding=utf-8
+
+import logging
+import os
+import threading
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+# Unfinished downloads, youtube-dl work files, and archived entries are named like downloaded files but are not media
+UNINDEXED_SUFFIXES = ('.part', '.ytdl', '.json', '.xml', '.yaml')
+
+
+class FileSystemIndex:
+    """Remembers which files exist and which folders have been made during a run
+
+    A folder is listed the first time a file in it is looked up, and files written by the BDFR are added as they are
+    written, so that checking for a file or making a folder does not need a request to the file system each time. This
+    matters most on network file systems. Files created or deleted by other programs during the run are not seen.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._listings: dict[Path, set[str]] = {}
+        self._made_directories: set[Path] = set()
+
+    def exists(self, path: Path) -> bool:
+        listing = self._get_listing(path.parent)
+        with self._lock:
+            return path.name in listing
+
+    def add(self, path: Path):
+        """Record a file that has been written"""
+        with self._lock:
+            # A folder that has not been listed yet will include the file when it is
+            if (listing := self._listings.get(path.parent)) is not None:
+                listing.add(path.name)
+
+    def make_directory(self, directory: Path):
+        with self._lock:
+            if directory in self._made_directories:
+                return
+        directory.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            self._made_directories.update((directory, *directory.parents))
+
+    def _get_listing(self, directory: Path) -> set[str]:
+        with self._lock:
+            listing = self._listings.get(directory)
+        if listing is None:
+            try:
+                listing = set(os.listdir(directory))
+            except (FileNotFoundError, NotADirectoryError):
+                listing = set()
+            except OSError as e:
+                logger.debug(f'Could not list {directory}: {e}')
+                listing = set()
+            with self._lock:
+                # Another thread may have listed the folder in the meantime, and added to it since
+                listing = self._listings.setdefault(directory, listing)
+        return listing
+
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+# coding=utf-8
+
+import logging
+import os
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Iterable, Optional
+
+from bdfr.exceptions import BulkDownloaderException
+
+logger = logging.getLogger(__name__)
+
+
+class HashCache:
+    """Stores the hashes of files on disk so that unchanged files do not need to be read again
+
+    A cached hash is only used while the size, modification time, and inode of the file match those recorded with it,
+    and if it was made with the hash algorithm in use.
+    """
+    _schema_version = 1
+
+    def __init__(self, database_path: Path):
+        self.database_path = database_path
+        self._lock = threading.Lock()
+        try:
+            database_path.parent.mkdir(parents=True, exist_ok=True)
+            self._connection = sqlite3.connect(database_path, check_same_thread=False)
+            self._connection.execute('PRAGMA journal_mode=WAL')
+            # The cache can always be rebuilt, so an older layout is simply replaced
+            if self._connection.execute('PRAGMA user_version').fetchone()[0] != self._schema_version:
+                self._connection.execute('DROP TABLE IF EXISTS files')
+                self._connection.execute(f'PRAGMA user_version = {self._schema_version}')
+            self._connection.execute(
+                '''CREATE TABLE IF NOT EXISTS files (
+                    path TEXT PRIMARY KEY,
+                    size INTEGER NOT NULL,
+                    mtime_ns INTEGER NOT NULL,
+                    inode INTEGER NOT NULL,
+                    algorithm TEXT NOT NULL,
+                    hash TEXT NOT NULL
+                )''')
+            self._connection.commit()
+        except sqlite3.Error as e:
+            raise BulkDownloaderException(f'Could not open hash cache at {database_path}: {e}')
+
+    @staticmethod
+    def _key(file_stat: os.stat_result) -> tuple[int, int, int]:
+        return file_stat.st_size, file_stat.st_mtime_ns, file_stat.st_ino
+
+    def load(self, directory: Path) -> dict[str, tuple[tuple[int, int, int], str, str]]:
+        """Return the cached entries for every file below the directory, keyed by path"""
+        prefix = str(directory).rstrip(os.sep) + os.sep
+        # Paths below the directory sort between the prefix and the prefix with its last character incremented
+        upper_bound = prefix[:-1] + chr(ord(os.sep) + 1)
+        with self._lock:
+            rows = self._connection.execute(
+                'SELECT path, size, mtime_ns, inode, algorithm, hash FROM files WHERE path >= ? AND path < ?',
+                (prefix, upper_bound),
+            ).fetchall()
+        return {row[0]: ((row[1], row[2], row[3]), row[4], row[5]) for row in rows}
+
+    @staticmethod
+    def get_valid_hash(
+            entry: tuple[tuple[int, int, int], str, str],
+            file_stat: os.stat_result,
+            algorithm: str,
+    ) -> Optional[str]:
+        key, entry_algorithm, file_hash = entry
+        return file_hash if key == HashCache._key(file_stat) and entry_algorithm == algorithm else None
+
+    def store(self, entries: Iterable[tuple[Path, os.stat_result, str]], algorithm: str):
+        with self._lock:
+            self._connection.executemany(
+                'INSERT OR REPLACE INTO files (path, size, mtime_ns, inode, algorithm, hash) VALUES (?, ?, ?, ?, ?, ?)',
+                ((str(path), *self._key(file_stat), algorithm, file_hash) for path, file_stat, file_hash in entries),
+            )
+            self._connection.commit()
+
+    def prune(self, paths: Iterable[str]):
+        """Remove the entries for files that no longer exist"""
+        with self._lock:
+            self._connection.executemany('DELETE FROM files WHERE path = ?', ((path,) for path in paths))
+            self._connection.commit()
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
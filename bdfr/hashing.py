@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+# coding=utf-8
+
+import hashlib
+import os
+from pathlib import Path
+from typing import Callable, NamedTuple
+
+from bdfr.exceptions import BulkDownloaderException
+
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
+
+CHUNK_SIZE = 1024 * 1024
+
+_HASH_FUNCTIONS: dict[str, Callable] = {
+    'md5': hashlib.md5,
+    'sha1': hashlib.sha1,
+    'sha256': hashlib.sha256,
+    'blake2b': hashlib.blake2b,
+}
+if xxhash is not None:
+    _HASH_FUNCTIONS['xxhash'] = xxhash.xxh3_128
+
+HASH_ALGORITHMS = tuple(_HASH_FUNCTIONS.keys())
+
+
+class FinishedHash(NamedTuple):
+    """The result of a hash calculated elsewhere, such as in another process, which cannot be sent as a hash object"""
+    name: str
+    value: bytes
+
+    @classmethod
+    def from_hash(cls, file_hash) -> 'FinishedHash':
+        return cls(file_hash.name, file_hash.digest())
+
+    def digest(self) -> bytes:
+        return self.value
+
+    def hexdigest(self) -> str:
+        return self.value.hex()
+
+
+def get_hash_function(algorithm: str) -> Callable:
+    try:
+        return _HASH_FUNCTIONS[algorithm]
+    except KeyError:
+        if algorithm == 'xxhash':
+            raise BulkDownloaderException('The xxhash algorithm requires the xxhash package to be installed')
+        raise BulkDownloaderException(
+            f'Unknown hash algorithm {algorithm}, must be one of {", ".join(HASH_ALGORITHMS)}')
+
+
+def hash_file(file_path: Path, algorithm: str = 'md5') -> str:
+    file_hash = get_hash_function(algorithm)()
+    with open(file_path, 'rb') as file:
+        while chunk := file.read(CHUNK_SIZE):
+            file_hash.update(chunk)
+    return file_hash.hexdigest()
+
+
+def fingerprint_file(file_path: Path, algorithm: str = 'md5', edge_size: int = CHUNK_SIZE) -> str:
+    """Hash the first and last part of a file, which is enough to tell most files of the same size apart"""
+    file_hash = get_hash_function(algorithm)()
+    with open(file_path, 'rb') as file:
+        file_hash.update(file.read(edge_size))
+        size = os.fstat(file.fileno()).st_size
+        if size > edge_size:
+            file.seek(max(edge_size, size - edge_size))
+            file_hash.update(file.read(edge_size))
+    return file_hash.hexdigest()
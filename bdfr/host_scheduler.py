@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+# coding=utf-8
+
+import contextlib
+import logging
+import math
+import threading
+import time
+import urllib.parse
+from typing import Iterator, Optional
+
+from bdfr.exceptions import BulkDownloaderException
+
+logger = logging.getLogger(__name__)
+
+
+class HostLimit:
+    def __init__(self, max_connections: int, rate: float = 0, burst: Optional[int] = None):
+        if max_connections < 1 or rate < 0:
+            raise BulkDownloaderException(f'Invalid host limit of {max_connections} connections at {rate} per second')
+        self.max_connections = max_connections
+        # Requests per second allowed to the host, with zero meaning no limit
+        self.rate = rate
+        self.burst = burst if burst else max(1, math.ceil(rate))
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, HostLimit):
+            return NotImplemented
+        return (self.max_connections, self.rate, self.burst) == (other.max_connections, other.rate, other.burst)
+
+    def __repr__(self) -> str:
+        return f'HostLimit({self.max_connections}, {self.rate}, {self.burst})'
+
+
+DEFAULT_HOST_LIMITS = {
+    'erome.com': HostLimit(2, 1),
+    'gfycat.com': HostLimit(4, 2),
+    'gifdeliverynetwork.com': HostLimit(2, 1),
+    'imgur.com': HostLimit(4, 2),
+    'redd.it': HostLimit(8),
+    'reddit.com': HostLimit(4, 1),
+    'redgifs.com': HostLimit(2, 1),
+}
+DEFAULT_LIMIT = HostLimit(4)
+
+
+class _HostState:
+    def __init__(self, limit: HostLimit):
+        self.limit = limit
+        self.active = 0
+        self.tokens = float(limit.burst)
+        self.last_refill = time.monotonic()
+
+    def try_reserve(self) -> float:
+        if self.active >= self.limit.max_connections:
+            return math.inf
+        if self.limit.rate:
+            now = time.monotonic()
+            self.tokens = min(self.limit.burst, self.tokens + (now - self.last_refill) * self.limit.rate)
+            self.last_refill = now
+            if self.tokens < 1:
+                return (1 - self.tokens) / self.limit.rate
+            self.tokens -= 1
+        self.active += 1
+        return 0
+
+
+class HostScheduler:
+    """Limits the concurrent connections and the request rate to each remote host
+
+    Limits are set per domain and apply to all of its subdomains, so the limit for imgur.com also covers i.imgur.com.
+    Hosts that have no limit of their own share the default limit, though each host is counted separately.
+    """
+    _installed: Optional['HostScheduler'] = None
+    _install_lock = threading.Lock()
+
+    def __init__(self, limits: Optional[dict[str, HostLimit]] = None, default_limit: HostLimit = DEFAULT_LIMIT):
+        self.limits = DEFAULT_HOST_LIMITS if limits is None else limits
+        self.default_limit = default_limit
+        # Waiting threads are woken whenever a slot is released, so this is shared with the pipeline's fetch queue
+        self.condition = threading.Condition()
+        self._hosts: dict[str, _HostState] = {}
+        self._host_keys: dict[str, str] = {}
+        self._held = threading.local()
+
+    @classmethod
+    def install(cls, scheduler: 'HostScheduler'):
+        with cls._install_lock:
+            cls._installed = scheduler
+
+    @classmethod
+    def get_scheduler(cls) -> 'HostScheduler':
+        with cls._install_lock:
+            if cls._installed is None:
+                cls._installed = HostScheduler()
+            return cls._installed
+
+    def host_key(self, url: str) -> str:
+        """Find the name that the host of the URL is limited under"""
+        host = (urllib.parse.urlsplit(url).hostname or '').removeprefix('www.')
+        with self.condition:
+            if host not in self._host_keys:
+                parts = host.split('.')
+                candidates = ['.'.join(parts[i:]) for i in range(len(parts))]
+                self._host_keys[host] = next((c for c in candidates if c in self.limits), host)
+            return self._host_keys[host]
+
+    def try_reserve(self, key: str) -> float:
+        """Take a slot for the host if possible, otherwise return the seconds until one may become free"""
+        with self.condition:
+            if key not in self._hosts:
+                self._hosts[key] = _HostState(self.limits.get(key, self.default_limit))
+            return self._hosts[key].try_reserve()
+
+    def release(self, key: str):
+        with self.condition:
+            self._hosts[key].active -= 1
+            self.condition.notify_all()
+
+    @contextlib.contextmanager
+    def held(self, key: str) -> Iterator[None]:
+        """Mark a slot reserved with try_reserve as belonging to this thread, and release it afterwards"""
+        held = self._held_keys()
+        held[key] = held.get(key, 0) + 1
+        try:
+            yield
+        finally:
+            held[key] -= 1
+            self.release(key)
+
+    @contextlib.contextmanager
+    def slot(self, url: str) -> Iterator[None]:
+        """Wait for a slot for the host of the URL and hold it until the block exits
+
+        A thread that already holds a slot for the host, such as a pipeline fetch worker, continues without waiting.
+        """
+        key = self.host_key(url)
+        if self._held_keys().get(key):
+            yield
+            return
+        with self.condition:
+            while delay := self.try_reserve(key):
+                self.condition.wait(None if delay == math.inf else delay)
+        with self.held(key):
+            yield
+
+    def _held_keys(self) -> dict[str, int]:
+        if not hasattr(self._held, 'keys'):
+            self._held.keys = {}
+        return self._held.keys
+
+    @staticmethod
+    def parse_limits(limit_string: str) -> tuple[dict[str, HostLimit], HostLimit]:
+        """Parse limits written as domain:connections:rate, with the domain * setting the default limit"""
+        limits = dict(DEFAULT_HOST_LIMITS)
+        default_limit = DEFAULT_LIMIT
+        for entry in filter(None, (e.strip() for e in limit_string.split(','))):
+            try:
+                domain, connections, *rate = entry.split(':')
+                limit = HostLimit(int(connections), float(rate[0]) if rate else 0)
+            except ValueError:
+                raise BulkDownloaderException(f'Could not parse host limit {entry}')
+            domain = domain.strip().lower().removeprefix('www.')
+            if domain == '*':
+                default_limit = limit
+            else:
+                limits[domain] = limit
+        return limits, default_limit
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+# coding=utf-8
+
+from html.parser import HTMLParser
+from typing import NamedTuple, Optional, Union
+
+
+class HTMLTag(NamedTuple):
+    name: str
+    attrs: dict[str, Optional[str]]
+    text: Optional[str]
+
+
+class _StopParsing(Exception):
+    pass
+
+
+class _TagExtractor(HTMLParser):
+    """Collects the tags that match as the page is read, without building a tree of the whole page"""
+
+    def __init__(self, names: tuple[str, ...], attrs: dict[str, str], text: bool, limit: Optional[int]):
+        super().__init__(convert_charrefs=True)
+        self.names = names
+        self.attrs = attrs
+        self.text = text
+        self.limit = limit
+        self.found: list[HTMLTag] = []
+        self._open_tag: Optional[tuple[str, dict]] = None
+        self._text_parts: list[str] = []
+
+    def _matches(self, tag_attrs: dict[str, Optional[str]]) -> bool:
+        for key, value in self.attrs.items():
+            if key == 'class':
+                # As in CSS selectors, a class matches if it is any one of the classes of the tag
+                if value not in (tag_attrs.get('class') or '').split():
+                    return False
+            elif tag_attrs.get(key) != value:
+                return False
+        return True
+
+    def handle_starttag(self, tag: str, attrs: list[tuple[str, Optional[str]]]):
+        if tag not in self.names:
+            return
+        tag_attrs = dict(attrs)
+        if not self._matches(tag_attrs):
+            return
+        if self.text:
+            self._open_tag = (tag, tag_attrs)
+            self._text_parts = []
+        else:
+            self._add(HTMLTag(tag, tag_attrs, None))
+
+    def handle_startendtag(self, tag: str, attrs: list[tuple[str, Optional[str]]]):
+        self.handle_starttag(tag, attrs)
+        if self._open_tag is not None and self._open_tag[0] == tag:
+            self.handle_endtag(tag)
+
+    def handle_data(self, data: str):
+        if self._open_tag is not None:
+            self._text_parts.append(data)
+
+    def handle_endtag(self, tag: str):
+        if self._open_tag is not None and self._open_tag[0] == tag:
+            name, tag_attrs = self._open_tag
+            self._open_tag = None
+            self._add(HTMLTag(name, tag_attrs, ''.join(self._text_parts)))
+
+    def _add(self, tag: HTMLTag):
+        self.found.append(tag)
+        if self.limit is not None and len(self.found) >= self.limit:
+            raise _StopParsing
+
+
+def find_tags(
+        html: str,
+        names: Union[str, tuple[str, ...]],
+        attrs: Optional[dict[str, str]] = None,
+        text: bool = False,
+        limit: Optional[int] = None,
+) -> list[HTMLTag]:
+    """Return the tags with one of the names and all of the attributes given, in the order they appear
+
+    If text is true, the text inside each tag is included, which is how the contents of a script are read. Reading
+    stops once limit tags have been found.
+    """
+    if isinstance(names, str):
+        names = (names,)
+    extractor = _TagExtractor(tuple(name.lower() for name in names), attrs or {}, text, limit)
+    try:
+        extractor.feed(html)
+        extractor.close()
+    except _StopParsing:
+        pass
+    return extractor.found
+
+
+def find_tag(
+        html: str,
+        names: Union[str, tuple[str, ...]],
+        attrs: Optional[dict[str, str]] = None,
+        text: bool = False,
+) -> Optional[HTMLTag]:
+    """Return the first tag that matches, reading no further into the page than needed"""
+    found = find_tags(html, names, attrs, text, limit=1)
+    return found[0] if found else None
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+# coding=utf-8
+
+import json
+import logging
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+from bdfr.exceptions import BulkDownloaderException
+
+logger = logging.getLogger(__name__)
+
+
+class MetadataCache:
+    """Stores what remote sites returned about a link so that later runs and crossposts need not ask again
+
+    Entries are kept under the name of the site and a key that identifies the item on that site, and are used until
+    they are older than the maximum age.
+    """
+    _installed: Optional['MetadataCache'] = None
+    _install_lock = threading.Lock()
+
+    def __init__(self, database_path: Path, max_age: float = 30 * 24 * 60 * 60):
+        self.database_path = database_path
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        try:
+            database_path.parent.mkdir(parents=True, exist_ok=True)
+            self._connection = sqlite3.connect(database_path, check_same_thread=False)
+            self._connection.execute('PRAGMA journal_mode=WAL')
+            self._connection.execute(
+                '''CREATE TABLE IF NOT EXISTS metadata (
+                    site TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    data TEXT NOT NULL,
+                    fetched REAL NOT NULL,
+                    PRIMARY KEY (site, key)
+                )''')
+            self._connection.commit()
+        except sqlite3.Error as e:
+            raise BulkDownloaderException(f'Could not open metadata cache at {database_path}: {e}')
+
+    @classmethod
+    def install(cls, cache: Optional['MetadataCache']):
+        with cls._install_lock:
+            cls._installed = cache
+
+    @classmethod
+    def get_cache(cls) -> Optional['MetadataCache']:
+        with cls._install_lock:
+            return cls._installed
+
+    def get(self, site: str, key: str) -> Optional[dict]:
+        try:
+            with self._lock:
+                row = self._connection.execute(
+                    'SELECT data, fetched FROM metadata WHERE site = ? AND key = ?', (site, key)).fetchone()
+        except sqlite3.Error as e:
+            logger.debug(f'Could not read {site} metadata for {key} from cache: {e}')
+            return None
+        if row is None or time.time() - row[1] > self.max_age:
+            return None
+        return json.loads(row[0])
+
+    def store(self, site: str, key: str, data: dict):
+        try:
+            with self._lock:
+                self._connection.execute(
+                    'INSERT OR REPLACE INTO metadata (site, key, data, fetched) VALUES (?, ?, ?, ?)',
+                    (site, key, json.dumps(data), time.time()),
+                )
+                self._connection.commit()
+        except sqlite3.Error as e:
+            logger.debug(f'Could not store {site} metadata for {key} in cache: {e}')
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
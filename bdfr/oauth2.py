@@ -9,9 +9,9 @@ import socket
 from pathlib import Path
 
 import praw
-import requests
 
 from bdfr.exceptions import BulkDownloaderException, RedditAuthenticationError
+from bdfr.session_manager import SessionManager
 
 logger = logging.getLogger(__name__)
 
@@ -26,8 +26,10 @@ class OAuth2Authenticator:
 
     @staticmethod
     def _check_scopes(wanted_scopes: set[str]):
-        response = requests.get('https://www.reddit.com/api/v1/scopes.json',
-                                headers={'User-Agent': 'fetch-scopes test'})
+        response = SessionManager.get_session().get(
+            'https://www.reddit.com/api/v1/scopes.json',
+            headers={'User-Agent': 'fetch-scopes test'},
+        )
         known_scopes = [scope for scope, data in response.json().items()]
         known_scopes.append('*')
         for scope in wanted_scopes:
@@ -1,68 +1,233 @@
 #!/usr/bin/env python3
 # coding=utf-8
 
-import hashlib
+import json
 import logging
 import re
-import time
 import urllib.parse
-from typing import Optional
+from functools import partial
+from pathlib import Path
+from typing import BinaryIO, Callable, Mapping, Optional, TypeVar
 
 import _hashlib
 import requests
 from praw.models import Submission
 
-from bdfr.exceptions import BulkDownloaderException
+from bdfr.exceptions import BulkDownloaderException, RetryableError
+from bdfr.hashing import get_hash_function
+from bdfr.host_scheduler import HostScheduler
+from bdfr.retry_policy import RetryPolicy, RetryState, check_retryable_status
+from bdfr.session_manager import SessionManager
 
 logger = logging.getLogger(__name__)
 
+T = TypeVar('T')
+
+
+class PartialDownload:
+    """A download written to a .part file, which can be resumed with a Range request if it is interrupted
+
+    The validators needed to resume are kept in a small JSON file next to the .part file. A download is only resumed if
+    the server accepts byte ranges and the file has not changed since, as shown by its ETag, Last-Modified date, or
+    length, and if the response is not compressed, as the offset must count the bytes as the server sends them.
+    """
+
+    def __init__(self, path: Path, url: str):
+        self.path = path
+        self.url = url
+        self.metadata_path = self.get_metadata_path(path)
+        self.offset = 0
+        self.expected_length: Optional[int] = None
+        self._validator: Optional[str] = None
+
+    @staticmethod
+    def get_metadata_path(path: Path) -> Path:
+        return path.with_name(path.name + '.json')
+
+    def request_headers(self) -> dict[str, str]:
+        """Return the headers needed to continue the download from where the file ends"""
+        self.offset = 0
+        metadata = self._read_metadata()
+        if metadata is None or metadata.get('url') != self.url:
+            return {'Accept-Encoding': 'identity'}
+        try:
+            self.offset = self.path.stat().st_size
+        except FileNotFoundError:
+            pass
+        if not self.offset:
+            return {'Accept-Encoding': 'identity'}
+        self.expected_length = metadata.get('length')
+        self._validator = metadata.get('etag') or metadata.get('last_modified')
+        headers = {'Accept-Encoding': 'identity', 'Range': f'bytes={self.offset}-'}
+        if self._validator:
+            # The server sends the whole file instead of the range if it has changed
+            headers['If-Range'] = self._validator
+        return headers
+
+    def open(self, status_code: int, headers: Mapping[str, str]) -> tuple[BinaryIO, _hashlib.HASH]:
+        """Open the file for a successful response, either appending to it or starting again"""
+        if status_code == 206:
+            if not self.offset or not self._range_matches(headers.get('Content-Range', '')):
+                self.discard()
+                raise RetryableError(f'Server sent an unexpected range for {self.url}', 0)
+            file = open(self.path, 'r+b')
+            file_hash = Resource.new_hash()
+            while chunk := file.read(Resource.chunk_size):
+                file_hash.update(chunk)
+            logger.debug(f'Resuming download of {self.url} from byte {self.offset}')
+            return file, file_hash
+        self.offset = 0
+        self._write_metadata(headers)
+        return open(self.path, 'wb'), Resource.new_hash()
+
+    def complete(self, length: int):
+        if self.expected_length is not None and length != self.expected_length:
+            raise RetryableError(f'Received {length} of {self.expected_length} bytes from {self.url}')
+        self.metadata_path.unlink(missing_ok=True)
+
+    def discard(self):
+        self.path.unlink(missing_ok=True)
+        self.metadata_path.unlink(missing_ok=True)
+
+    def _range_matches(self, content_range: str) -> bool:
+        match = re.match(r'bytes (\d+)-\d+/(\d+|\*)', content_range)
+        if not match or int(match.group(1)) != self.offset:
+            return False
+        return self.expected_length is None or match.group(2) == str(self.expected_length)
+
+    def _read_metadata(self) -> Optional[dict]:
+        try:
+            with open(self.metadata_path) as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return None
+
+    def _write_metadata(self, headers: Mapping[str, str]):
+        encoding = headers.get('Content-Encoding', 'identity')
+        length = headers.get('Content-Length')
+        self.expected_length = int(length) if length and length.isdigit() and encoding == 'identity' else None
+        metadata = {
+            'url': self.url,
+            'etag': headers.get('ETag'),
+            'last_modified': headers.get('Last-Modified'),
+            'length': self.expected_length,
+        }
+        resumable = 'bytes' in headers.get('Accept-Ranges', '') and encoding == 'identity'
+        if resumable and (metadata['etag'] or metadata['last_modified'] or metadata['length']):
+            with open(self.metadata_path, 'w') as file:
+                json.dump(metadata, file)
+        else:
+            self.metadata_path.unlink(missing_ok=True)
+
 
 class Resource:
+    chunk_size = 1024 * 1024
+    hash_algorithm = 'md5'
+
     def __init__(self, source_submission: Submission, url: str, extension: str = None):
         self.source_submission = source_submission
         self.content: Optional[bytes] = None
+        self.download_path: Optional[Path] = None
         self.url = url
         self.hash: Optional[_hashlib.HASH] = None
+        self.retry_state: Optional[RetryState] = None
         self.extension = extension
         if not self.extension:
             self.extension = self._determine_extension()
 
     @staticmethod
-    def retry_download(url: str, max_wait_time: int, current_wait_time: int = 60) -> Optional[bytes]:
+    def _fetch_content(url: str) -> bytes:
+        try:
+            with HostScheduler.get_scheduler().slot(url):
+                response = SessionManager.get_session().get(url)
+        except (requests.exceptions.ConnectionError,
+                requests.exceptions.ChunkedEncodingError,
+                requests.exceptions.Timeout) as e:
+            raise RetryableError(f'Could not download resource: {e}')
+        if re.match(r'^2\d{2}', str(response.status_code)) and response.content:
+            return response.content
+        check_retryable_status(response.status_code, response.headers, url)
+        raise BulkDownloaderException(f'Unrecoverable error requesting resource: HTTP Code {response.status_code}')
+
+    @staticmethod
+    def _fetch_to_file(url: str, file_path: Path) -> _hashlib.HASH:
+        partial_download = PartialDownload(file_path, url)
+        headers = partial_download.request_headers()
         try:
-            response = requests.get(url)
-            if re.match(r'^2\d{2}', str(response.status_code)) and response.content:
-                return response.content
-            elif response.status_code in (408, 429):
-                raise requests.exceptions.ConnectionError(f'Response code {response.status_code}')
-            else:
+            with HostScheduler.get_scheduler().slot(url), \
+                    SessionManager.get_session().get(url, stream=True, headers=headers) as response:
+                if re.match(r'^2\d{2}', str(response.status_code)):
+                    file, file_hash = partial_download.open(response.status_code, response.headers)
+                    with file:
+                        for chunk in response.iter_content(Resource.chunk_size):
+                            file_hash.update(chunk)
+                            file.write(chunk)
+                        length = file.tell()
+                    partial_download.complete(length)
+                    if length > 0:
+                        return file_hash
+                elif response.status_code == 416:
+                    # The stored range no longer fits the file on the server, so start again from the beginning
+                    partial_download.discard()
+                    raise RetryableError(f'Could not resume download of {url}', 0)
+                check_retryable_status(response.status_code, response.headers, url)
                 raise BulkDownloaderException(
                     f'Unrecoverable error requesting resource: HTTP Code {response.status_code}')
-        except (requests.exceptions.ConnectionError, requests.exceptions.ChunkedEncodingError) as e:
-            logger.warning(f'Error occured downloading from {url}, waiting {current_wait_time} seconds: {e}')
-            time.sleep(current_wait_time)
-            if current_wait_time < max_wait_time:
-                current_wait_time += 60
-                return Resource.retry_download(url, max_wait_time, current_wait_time)
-            else:
-                logger.error(f'Max wait time exceeded for resource at url {url}')
-                raise
-
-    def download(self, max_wait_time: int):
+        except (requests.exceptions.ConnectionError,
+                requests.exceptions.ChunkedEncodingError,
+                requests.exceptions.Timeout) as e:
+            raise RetryableError(f'Could not download resource: {e}')
+
+    @staticmethod
+    def retry_download(url: str, max_wait_time: int) -> bytes:
+        return RetryPolicy(deadline=max_wait_time).call(partial(Resource._fetch_content, url), url)
+
+    @staticmethod
+    def retry_download_to_file(url: str, file_path: Path, max_wait_time: int) -> _hashlib.HASH:
+        return RetryPolicy(deadline=max_wait_time).call(partial(Resource._fetch_to_file, url, file_path), url)
+
+    def _retry(self, function: Callable[[], T], max_wait_time: int, defer: bool) -> T:
+        # The state is kept on the resource so that the deadline covers attempts deferred by the caller
+        if self.retry_state is None:
+            self.retry_state = RetryPolicy(deadline=max_wait_time).start()
+        return self.retry_state.call(function, self.url, defer)
+
+    def download(self, max_wait_time: int, defer: bool = False):
+        """Download the resource into memory
+
+        If defer is set, a RetryDeferred exception is raised rather than waiting to retry a failed download.
+        """
         if not self.content:
-            try:
-                content = self.retry_download(self.url, max_wait_time)
-            except requests.exceptions.ConnectionError as e:
-                raise BulkDownloaderException(f'Could not download resource: {e}')
-            except BulkDownloaderException:
-                raise
-            if content:
-                self.content = content
+            self.content = self._retry(partial(self._fetch_content, self.url), max_wait_time, defer)
         if not self.hash and self.content:
             self.create_hash()
 
+    def download_to_file(self, file_path: Path, max_wait_time: int, defer: bool = False):
+        """Stream the resource into a file, calculating the hash as it is written, instead of holding it in memory"""
+        # Recorded before downloading so that discard_download can remove partial files after a failure
+        self.download_path = file_path
+        self.hash = self._retry(partial(self._fetch_to_file, self.url, file_path), max_wait_time, defer)
+
+    def discard_download(self, keep_partial: bool = False):
+        """Release any downloaded data, in memory or on disk
+
+        If keep_partial is set, a partly downloaded file that can be resumed is left on disk for a later attempt.
+        """
+        self.content = None
+        if self.download_path:
+            metadata_path = PartialDownload.get_metadata_path(self.download_path)
+            if not (keep_partial and metadata_path.exists()):
+                self.download_path.unlink(missing_ok=True)
+                metadata_path.unlink(missing_ok=True)
+            self.download_path = None
+
     def create_hash(self):
-        self.hash = hashlib.md5(self.content)
+        self.hash = self.new_hash()
+        self.hash.update(self.content)
+
+    @staticmethod
+    def new_hash() -> _hashlib.HASH:
+        return get_hash_function(Resource.hash_algorithm)()
 
     def _determine_extension(self) -> Optional[str]:
         extension_pattern = re.compile(r'.*(\..{3,5})$')
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+# coding=utf-8
+
+import asyncio
+import email.utils
+import logging
+import random
+import time
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Mapping, Optional, TypeVar
+
+from bdfr.exceptions import RetryableError, RetryDeferred
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar('T')
+
+RETRYABLE_STATUS_CODES = (408, 429, 500, 502, 503, 504)
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Read a Retry-After header, which is either a number of seconds or an HTTP date"""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        retry_time = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_time.tzinfo is None:
+        retry_time = retry_time.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_time - datetime.now(timezone.utc)).total_seconds())
+
+
+def check_retryable_status(status_code: int, headers: Mapping[str, str], url: str):
+    if status_code in RETRYABLE_STATUS_CODES:
+        retry_after = parse_retry_after(headers.get('Retry-After'))
+        raise RetryableError(f'Response code {status_code} from {url}', retry_after)
+
+
+class RetryPolicy:
+    """Exponential backoff with full jitter, capped at a maximum delay and bounded by a deadline
+
+    The deadline is the total time in seconds that may be spent on a single item, including the time spent waiting.
+    A Retry-After header from the server is used as the delay in place of the backoff.
+    """
+
+    def __init__(self, base_delay: float = 1, max_delay: float = 60, deadline: Optional[float] = 120):
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.deadline = deadline
+
+    def backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def start(self) -> 'RetryState':
+        return RetryState(self)
+
+    def call(self, function: Callable[[], T], description: str) -> T:
+        return self.start().call(function, description)
+
+    async def call_async(self, function: Callable[[], Awaitable[T]], description: str) -> T:
+        return await self.start().call_async(function, description)
+
+
+class RetryState:
+    """The attempts made on a single item under a retry policy"""
+
+    def __init__(self, policy: RetryPolicy):
+        self.policy = policy
+        self.attempt = 0
+        self.started = time.monotonic()
+
+    def next_delay(self, retry_after: Optional[float] = None) -> Optional[float]:
+        """Return the time to wait before the next attempt, or None if the deadline would be passed"""
+        delay = retry_after if retry_after is not None else self.policy.backoff(self.attempt)
+        if self.policy.deadline is not None and time.monotonic() + delay - self.started > self.policy.deadline:
+            return None
+        self.attempt += 1
+        return delay
+
+    def _handle_error(self, error: RetryableError, description: str) -> float:
+        delay = self.next_delay(error.retry_after)
+        if delay is None:
+            logger.error(f'Max wait time exceeded for {description}')
+            raise error
+        logger.warning(f'Error occured downloading from {description}, waiting {delay:.1f} seconds: {error}')
+        return delay
+
+    def call(self, function: Callable[[], T], description: str, defer: bool = False) -> T:
+        """Call the function until it succeeds, sleeping between attempts
+
+        If defer is set, a RetryDeferred exception is raised instead of sleeping, so that the caller can make the
+        next attempt itself once the delay has passed.
+        """
+        while True:
+            try:
+                return function()
+            except RetryableError as e:
+                delay = self._handle_error(e, description)
+            if defer:
+                raise RetryDeferred(f'Retrying {description} in {delay:.1f} seconds', delay)
+            time.sleep(delay)
+
+    async def call_async(self, function: Callable[[], Awaitable[T]], description: str) -> T:
+        while True:
+            try:
+                return await function()
+            except RetryableError as e:
+                delay = self._handle_error(e, description)
+            await asyncio.sleep(delay)
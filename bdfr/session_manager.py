@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+# coding=utf-8
+
+import logging
+import threading
+from http.cookiejar import DefaultCookiePolicy
+from typing import Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+
+class SessionManager:
+    """Holds the HTTP session shared by every site downloader and resource in the process
+
+    Connections are kept alive in a pool for each host, so repeated requests to the same site do not need a new TCP
+    and TLS handshake each time.
+    """
+    _installed: Optional['SessionManager'] = None
+    _install_lock = threading.Lock()
+
+    def __init__(
+            self,
+            pool_connections: int = 10,
+            pool_maxsize: int = 10,
+            user_agent: Optional[str] = None,
+            blocked_cookie_domains: tuple[str, ...] = (),
+    ):
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.user_agent = user_agent
+        self.session = requests.Session()
+        # pool_connections is the number of hosts to keep pools for, pool_maxsize the connections kept per host
+        adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        if user_agent:
+            self.session.headers['User-Agent'] = user_agent
+        self.session.cookies.set_policy(DefaultCookiePolicy(blocked_domains=blocked_cookie_domains))
+
+    @classmethod
+    def install(cls, manager: 'SessionManager'):
+        with cls._install_lock:
+            if cls._installed:
+                cls._installed.close()
+            cls._installed = manager
+        logger.log(9, f'Installed HTTP session with {manager.pool_maxsize} connections per host')
+
+    @classmethod
+    def get_session(cls) -> requests.Session:
+        with cls._install_lock:
+            if cls._installed is None:
+                cls._installed = SessionManager()
+            return cls._installed.session
+
+    @classmethod
+    def get_user_agent(cls) -> Optional[str]:
+        return cls._installed.user_agent if cls._installed else None
+
+    def close(self):
+        self.session.close()
@@ -6,4 +6,4 @@ import configparser
 
 class SiteAuthenticator:
     def __init__(self, cfg: configparser.ConfigParser):
-        self.imgur_authentication = None
+        self.imgur_authentication = cfg.get('DEFAULT', 'imgur_client_id', fallback='').strip() or None
@@ -2,20 +2,53 @@
 # coding=utf-8
 
 import logging
+import re
 from abc import ABC, abstractmethod
-from typing import Optional
+from typing import Optional, Type
 
 import requests
 from praw.models import Submission
 
-from bdfr.exceptions import ResourceNotFound, SiteDownloaderError
+from bdfr.exceptions import ResourceNotFound, RetryableError, SiteDownloaderError
+from bdfr.host_scheduler import HostScheduler
 from bdfr.resource import Resource
+from bdfr.retry_policy import RetryPolicy, check_retryable_status
+from bdfr.session_manager import SessionManager
 from bdfr.site_authenticator import SiteAuthenticator
 
 logger = logging.getLogger(__name__)
 
 
+class UrlRule:
+    """Selects a downloader for links to any of the hosts, or to any host at all if none are given
+
+    A host also covers its subdomains. If a pattern is given, the path of the link, without the host, leading slash,
+    or query, must match it. Rules with a higher priority are tried first.
+    """
+
+    def __init__(self, hosts: tuple[str, ...] = (), pattern: Optional[str] = None, priority: int = 0):
+        self.hosts = tuple(host.lower() for host in hosts)
+        self.pattern = re.compile(pattern) if pattern else None
+        self.priority = priority
+
+    def matches(self, path: str) -> bool:
+        return self.pattern is None or bool(self.pattern.match(path))
+
+    def __repr__(self) -> str:
+        return f'UrlRule({self.hosts}, {self.pattern.pattern if self.pattern else None}, {self.priority})'
+
+
 class BaseDownloader(ABC):
+    retry_policy = RetryPolicy(max_delay=30, deadline=120)
+    # The links a downloader handles are declared here, and are only read from the class that declares them
+    url_rules: tuple[UrlRule, ...] = ()
+    registry: list[Type['BaseDownloader']] = []
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        # Every downloader is registered, so that any module defining one is used by the factory once imported
+        BaseDownloader.registry.append(cls)
+
     def __init__(self, post: Submission, typical_extension: Optional[str] = None):
         self.post = post
         self.typical_extension = typical_extension
@@ -27,11 +60,21 @@ class BaseDownloader(ABC):
 
     @staticmethod
     def retrieve_url(url: str, cookies: dict = None, headers: dict = None) -> requests.Response:
+        def attempt() -> requests.Response:
+            try:
+                with HostScheduler.get_scheduler().slot(url):
+                    res = SessionManager.get_session().get(url, cookies=cookies, headers=headers)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                raise RetryableError(f'Failed to get page {url}: {e}')
+            except requests.exceptions.RequestException as e:
+                logger.exception(e)
+                raise SiteDownloaderError(f'Failed to get page {url}')
+            if res.status_code != 200:
+                check_retryable_status(res.status_code, res.headers, url)
+                raise ResourceNotFound(f'Server responded with {res.status_code} to {url}')
+            return res
+
         try:
-            res = requests.get(url, cookies=cookies, headers=headers)
-        except requests.exceptions.RequestException as e:
-            logger.exception(e)
-            raise SiteDownloaderError(f'Failed to get page {url}')
-        if res.status_code != 200:
-            raise ResourceNotFound(f'Server responded with {res.status_code} to {url}')
-        return res
+            return BaseDownloader.retry_policy.call(attempt, url)
+        except RetryableError as e:
+            raise SiteDownloaderError(str(e))
@@ -6,10 +6,19 @@ from praw.models import Submission
 
 from bdfr.site_authenticator import SiteAuthenticator
 from bdfr.resource import Resource
-from bdfr.site_downloaders.base_downloader import BaseDownloader
+from bdfr.site_downloaders.base_downloader import BaseDownloader, UrlRule
+
+# Links with these extensions are to web pages rather than to media files
+WEB_EXTENSIONS = ('asp', 'aspx', 'cfm', 'cfml', 'css', 'htm', 'html', 'js', 'php', 'php3', 'xhtml')
 
 
 class Direct(BaseDownloader):
+    url_rules = (
+        # Any link to a file with an extension is downloaded directly, unless a site needs to handle it first
+        UrlRule(pattern=rf'(?!.*\.(?i:{"|".join(WEB_EXTENSIONS)})$).*\.\w{{3,4}}$', priority=1),
+        UrlRule(('i.redd.it',)),
+    )
+
     def __init__(self, post: Submission):
         super().__init__(post)
 
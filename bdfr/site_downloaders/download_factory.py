@@ -1,81 +1,103 @@
 #!/usr/bin/env python3
 # coding=utf-8
 
+import functools
+import inspect
 import re
+import threading
 import urllib.parse
-from typing import Type
+from typing import Optional, Type
 
 from bdfr.exceptions import NotADownloadableLinkError
-from bdfr.site_downloaders.base_downloader import BaseDownloader
-from bdfr.site_downloaders.direct import Direct
-from bdfr.site_downloaders.erome import Erome
-from bdfr.site_downloaders.fallback_downloaders.youtubedl_fallback import YoutubeDlFallback
-from bdfr.site_downloaders.gallery import Gallery
-from bdfr.site_downloaders.gfycat import Gfycat
-from bdfr.site_downloaders.imgur import Imgur
-from bdfr.site_downloaders.pornhub import PornHub
-from bdfr.site_downloaders.redgifs import Redgifs
-from bdfr.site_downloaders.self_post import SelfPost
-from bdfr.site_downloaders.youtube import Youtube
+from bdfr.site_downloaders.base_downloader import BaseDownloader, UrlRule
+from bdfr.site_downloaders.direct import WEB_EXTENSIONS
+from bdfr.site_downloaders.fallback_downloaders.fallback_downloader import BaseFallbackDownloader
+
+# The built-in downloaders register themselves with their URL rules when their modules are imported
+from bdfr.site_downloaders import erome, gallery, gfycat, imgur, pornhub, redgifs, self_post, youtube  # noqa: F401
+from bdfr.site_downloaders.fallback_downloaders import youtubedl_fallback  # noqa: F401
+
+_beginning_regex = re.compile(r'^\s*(www\.?)?')
+_web_resource_regex = re.compile(rf'(?i).*/.*\.({"|".join(WEB_EXTENSIONS)})$')
 
 
 class DownloadFactory:
+    """Chooses the downloader for a link from the URL rules that the downloaders declare
+
+    Rules are indexed by host, so a link is only checked against the rules for its own host and the rules that apply
+    to every host. Downloaders are picked up as they are defined, including those from other modules.
+    """
+    _index_lock = threading.Lock()
+    _indexed_count = -1
+    _host_rules: dict[str, list[tuple[UrlRule, int, Type[BaseDownloader]]]] = {}
+    _general_rules: list[tuple[UrlRule, int, Type[BaseDownloader]]] = []
+    _fallbacks: list[Type[BaseFallbackDownloader]] = []
+
     @staticmethod
     def pull_lever(url: str) -> Type[BaseDownloader]:
         sanitised_url = DownloadFactory.sanitise_url(url)
-        if re.match(r'(i\.)?imgur.*\.gifv$', sanitised_url):
-            return Imgur
-        elif re.match(r'.*/.*\.\w{3,4}(\?[\w;&=]*)?$', sanitised_url) and \
-                not DownloadFactory.is_web_resource(sanitised_url):
-            return Direct
-        elif re.match(r'erome\.com.*', sanitised_url):
-            return Erome
-        elif re.match(r'reddit\.com/gallery/.*', sanitised_url):
-            return Gallery
-        elif re.match(r'gfycat\.', sanitised_url):
-            return Gfycat
-        elif re.match(r'(m\.)?imgur.*', sanitised_url):
-            return Imgur
-        elif re.match(r'(redgifs|gifdeliverynetwork)', sanitised_url):
-            return Redgifs
-        elif re.match(r'reddit\.com/r/', sanitised_url):
-            return SelfPost
-        elif re.match(r'(m\.)?youtu\.?be', sanitised_url):
-            return Youtube
-        elif re.match(r'i\.redd\.it.*', sanitised_url):
-            return Direct
-        elif re.match(r'pornhub\.com.*', sanitised_url):
-            return PornHub
-        elif YoutubeDlFallback.can_handle_link(sanitised_url):
-            return YoutubeDlFallback
-        else:
-            raise NotADownloadableLinkError(
-                f'No downloader module exists for url {url}')
+        DownloadFactory._update_index()
+        if downloader := DownloadFactory._match_rules(sanitised_url):
+            return downloader
+        for fallback in DownloadFactory._fallbacks:
+            if fallback.can_handle_link(url):
+                return fallback
+        raise NotADownloadableLinkError(f'No downloader module exists for url {url}')
 
     @staticmethod
+    @functools.lru_cache(maxsize=4096)
     def sanitise_url(url: str) -> str:
-        beginning_regex = re.compile(r'\s*(www\.?)?')
         split_url = urllib.parse.urlsplit(url)
         split_url = split_url.netloc + split_url.path
-        split_url = re.sub(beginning_regex, '', split_url)
+        split_url = _beginning_regex.sub('', split_url, count=1)
         return split_url
 
     @staticmethod
     def is_web_resource(url: str) -> bool:
-        web_extensions = (
-            'asp',
-            'aspx',
-            'cfm',
-            'cfml',
-            'css',
-            'htm',
-            'html',
-            'js',
-            'php',
-            'php3',
-            'xhtml',
-        )
-        if re.match(rf'(?i).*/.*\.({"|".join(web_extensions)})$', url):
-            return True
-        else:
-            return False
+        return bool(_web_resource_regex.match(url))
+
+    @staticmethod
+    def _update_index():
+        # Rebuilt whenever a downloader has been defined since the last time, which is rare after start-up
+        if DownloadFactory._indexed_count == len(BaseDownloader.registry):
+            return
+        with DownloadFactory._index_lock:
+            downloaders = list(BaseDownloader.registry)
+            host_rules = {}
+            general_rules = []
+            for order, downloader in enumerate(downloaders):
+                for rule in downloader.__dict__.get('url_rules', ()):
+                    for host in rule.hosts:
+                        host_rules.setdefault(host, []).append((rule, order, downloader))
+                    if not rule.hosts:
+                        general_rules.append((rule, order, downloader))
+            DownloadFactory._host_rules = host_rules
+            DownloadFactory._general_rules = general_rules
+            DownloadFactory._fallbacks = [
+                downloader for downloader in downloaders
+                if issubclass(downloader, BaseFallbackDownloader) and not inspect.isabstract(downloader)
+            ]
+            DownloadFactory._rules_for_host.cache_clear()
+            DownloadFactory._match_rules.cache_clear()
+            DownloadFactory._indexed_count = len(downloaders)
+
+    @staticmethod
+    @functools.lru_cache(maxsize=1024)
+    def _rules_for_host(host: str) -> tuple[tuple[UrlRule, Type[BaseDownloader]], ...]:
+        # The rules for every parent domain apply as well, so that a rule for a site covers its subdomains
+        labels = host.split('.')
+        rules = list(DownloadFactory._general_rules)
+        for i in range(len(labels)):
+            rules.extend(DownloadFactory._host_rules.get('.'.join(labels[i:]), ()))
+        rules.sort(key=lambda entry: (-entry[0].priority, entry[1]))
+        return tuple((rule, downloader) for rule, _, downloader in rules)
+
+    @staticmethod
+    @functools.lru_cache(maxsize=4096)
+    def _match_rules(sanitised_url: str) -> Optional[Type[BaseDownloader]]:
+        host, _, path = sanitised_url.partition('/')
+        host = host.rsplit('@', 1)[-1].split(':', 1)[0].lower()
+        for rule, downloader in DownloadFactory._rules_for_host(host):
+            if rule.matches(path):
+                return downloader
+        return None
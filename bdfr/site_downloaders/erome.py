@@ -4,18 +4,20 @@ import logging
 import re
 from typing import Optional
 
-import bs4
 from praw.models import Submission
 
 from bdfr.exceptions import SiteDownloaderError
+from bdfr.html_extractor import find_tags
 from bdfr.resource import Resource
 from bdfr.site_authenticator import SiteAuthenticator
-from bdfr.site_downloaders.base_downloader import BaseDownloader
+from bdfr.site_downloaders.base_downloader import BaseDownloader, UrlRule
 
 logger = logging.getLogger(__name__)
 
 
 class Erome(BaseDownloader):
+    url_rules = (UrlRule(('erome.com',)),)
+
     def __init__(self, post: Submission):
         super().__init__(post)
 
@@ -35,11 +37,12 @@ class Erome(BaseDownloader):
     @staticmethod
     def _get_links(url: str) -> set[str]:
         page = Erome.retrieve_url(url)
-        soup = bs4.BeautifulSoup(page.text, 'html.parser')
-        front_images = soup.find_all('img', attrs={'class': 'lasyload'})
-        out = [im.get('data-src') for im in front_images]
-
-        videos = soup.find_all('source')
-        out.extend([vid.get('src') for vid in videos])
+        # Images and videos are found in a single pass over the page
+        out = []
+        for tag in find_tags(page.text, ('img', 'source')):
+            if tag.name == 'source':
+                out.append(tag.attrs.get('src'))
+            elif 'lasyload' in (tag.attrs.get('class') or '').split():
+                out.append(tag.attrs.get('data-src'))
 
         return set(out)
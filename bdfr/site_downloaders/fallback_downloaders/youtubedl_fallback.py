@@ -1,12 +1,15 @@
 #!/usr/bin/env python3
 # coding=utf-8
 
+import functools
 import logging
+import threading
 from typing import Optional
 
-import youtube_dl
 from praw.models import Submission
+from youtube_dl.extractor import gen_extractor_classes
 
+from bdfr.exceptions import NotADownloadableLinkError
 from bdfr.resource import Resource
 from bdfr.site_authenticator import SiteAuthenticator
 from bdfr.site_downloaders.fallback_downloaders.fallback_downloader import BaseFallbackDownloader
@@ -16,25 +19,43 @@ logger = logging.getLogger(__name__)
 
 
 class YoutubeDlFallback(BaseFallbackDownloader, Youtube):
+    _extractors: Optional[list[type]] = None
+    _extractors_lock = threading.Lock()
+
     def __init__(self, post: Submission):
         super(YoutubeDlFallback, self).__init__(post)
 
     def find_resources(self, authenticator: Optional[SiteAuthenticator] = None) -> list[Resource]:
-        out = super()._download_video({})
+        extractor = self.find_extractor(self.post.url)
+        if extractor is None:
+            raise NotADownloadableLinkError(f'No youtube-dl extractor supports the URL {self.post.url}')
+        out = super()._extract_video({}, extractor.ie_key())
         return [out]
 
     @staticmethod
     def can_handle_link(url: str) -> bool:
-        yt_logger = logging.getLogger('youtube-dl')
-        yt_logger.setLevel(logging.CRITICAL)
-        with youtube_dl.YoutubeDL({
-            'logger': yt_logger,
-        }) as ydl:
+        return YoutubeDlFallback.find_extractor(url) is not None
+
+    @staticmethod
+    @functools.lru_cache(maxsize=4096)
+    def find_extractor(url: str) -> Optional[type]:
+        """Return the youtube-dl extractor that would be used for the URL, found from its URL patterns alone
+
+        The generic extractor, which accepts any URL and can only tell whether it has media by downloading the page,
+        is left out.
+        """
+        for extractor in YoutubeDlFallback._get_extractors():
             try:
-                result = ydl.extract_info(url, download=False)
-                if result:
-                    return True
+                if extractor.suitable(url):
+                    return extractor
             except Exception as e:
-                logger.exception(e)
-                return False
-        return False
+                logger.debug(f'youtube-dl extractor {extractor.ie_key()} failed to check {url}: {e}')
+        return None
+
+    @staticmethod
+    def _get_extractors() -> list[type]:
+        with YoutubeDlFallback._extractors_lock:
+            if YoutubeDlFallback._extractors is None:
+                YoutubeDlFallback._extractors = [
+                    extractor for extractor in gen_extractor_classes() if extractor.ie_key() != 'Generic']
+            return YoutubeDlFallback._extractors
@@ -1,48 +1,84 @@
 #!/usr/bin/env python3
 
 import logging
+from multiprocessing.pool import ThreadPool
 from typing import Optional
 
 import requests
 from praw.models import Submission
 
 from bdfr.exceptions import SiteDownloaderError
+from bdfr.host_scheduler import HostScheduler
 from bdfr.resource import Resource
+from bdfr.session_manager import SessionManager
 from bdfr.site_authenticator import SiteAuthenticator
-from bdfr.site_downloaders.base_downloader import BaseDownloader
+from bdfr.site_downloaders.base_downloader import BaseDownloader, UrlRule
 
 logger = logging.getLogger(__name__)
 
 
 class Gallery(BaseDownloader):
+    url_rules = (UrlRule(('reddit.com',), r'gallery/'),)
+    probe_workers = 8
+
     def __init__(self, post: Submission):
         super().__init__(post)
 
     def find_resources(self, authenticator: Optional[SiteAuthenticator] = None) -> list[Resource]:
         try:
-            image_urls = self._get_links(self.post.gallery_data['items'])
+            items = self.post.gallery_data['items']
+            media_metadata = getattr(self.post, 'media_metadata', None)
         except AttributeError:
             try:
-                image_urls = self._get_links(self.post.crosspost_parent_list[0]['gallery_data']['items'])
-            except (AttributeError, IndexError, TypeError):
+                parent = self.post.crosspost_parent_list[0]
+                items = parent['gallery_data']['items']
+                media_metadata = parent.get('media_metadata')
+            except (AttributeError, IndexError, KeyError, TypeError):
                 logger.error(f'Could not find gallery data in submission {self.post.id}')
                 logger.exception('Gallery image find failure')
                 raise SiteDownloaderError('No images found in Reddit gallery')
 
+        image_urls = self._get_links(items, media_metadata)
         if not image_urls:
             raise SiteDownloaderError('No images found in Reddit gallery')
         return [Resource(self.post, url) for url in image_urls]
 
-    @ staticmethod
-    def _get_links(id_dict: list[dict]) -> list[str]:
-        out = []
-        for item in id_dict:
-            image_id = item['media_id']
-            possible_extensions = ('.jpg', '.png', '.gif', '.gifv', '.jpeg')
-            for extension in possible_extensions:
-                test_url = f'https://i.redd.it/{image_id}{extension}'
-                response = requests.head(test_url)
-                if response.status_code == 200:
-                    out.append(test_url)
-                    break
-        return out
+    @staticmethod
+    def _get_links(id_dict: list[dict], media_metadata: Optional[dict] = None) -> list[str]:
+        media_ids = [item['media_id'] for item in id_dict]
+        media_metadata = media_metadata or {}
+        urls = [Gallery._get_metadata_link(media_id, media_metadata.get(media_id)) for media_id in media_ids]
+        # The extension of an image without usable metadata can only be found by trying each one on the server
+        unresolved = [i for i, url in enumerate(urls) if url is None]
+        if unresolved:
+            logger.debug(f'Probing extensions of {len(unresolved)} gallery images without metadata')
+            with ThreadPool(min(len(unresolved), Gallery.probe_workers)) as pool:
+                probed = pool.map(Gallery._probe_link, [media_ids[i] for i in unresolved])
+            for i, url in zip(unresolved, probed):
+                urls[i] = url
+        return [url for url in urls if url is not None]
+
+    @staticmethod
+    def _get_metadata_link(media_id: str, metadata: Optional[dict]) -> Optional[str]:
+        if not isinstance(metadata, dict) or metadata.get('status') != 'valid':
+            return None
+        mime_type = metadata.get('m')
+        if not mime_type or '/' not in mime_type:
+            return None
+        return f'https://i.redd.it/{media_id}.{mime_type.split("/")[-1]}'
+
+    @staticmethod
+    def _probe_link(media_id: str) -> Optional[str]:
+        possible_extensions = ('.jpg', '.png', '.gif', '.gifv', '.jpeg')
+        for extension in possible_extensions:
+            test_url = f'https://i.redd.it/{media_id}{extension}'
+            try:
+                with HostScheduler.get_scheduler().slot(test_url):
+                    response = SessionManager.get_session().head(test_url)
+            except requests.exceptions.RequestException as e:
+                logger.debug(f'Failed to probe {test_url}: {e}')
+                continue
+            if response.status_code == 200:
+                return test_url
+        logger.warning(f'Could not find the extension of gallery image {media_id}')
+        return None
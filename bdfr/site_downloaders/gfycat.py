@@ -4,16 +4,19 @@ import json
 import re
 from typing import Optional
 
-from bs4 import BeautifulSoup
 from praw.models import Submission
 
 from bdfr.exceptions import SiteDownloaderError
+from bdfr.html_extractor import find_tag
 from bdfr.resource import Resource
 from bdfr.site_authenticator import SiteAuthenticator
+from bdfr.site_downloaders.base_downloader import UrlRule
 from bdfr.site_downloaders.redgifs import Redgifs
 
 
 class Gfycat(Redgifs):
+    url_rules = (UrlRule(('gfycat.com',)),)
+
     def __init__(self, post: Submission):
         super().__init__(post)
 
@@ -30,11 +33,11 @@ class Gfycat(Redgifs):
             url = url.lower()  # Fixes error with old gfycat/redgifs links
             return Redgifs._get_link(url)
 
-        soup = BeautifulSoup(response.text, 'html.parser')
-        content = soup.find('script', attrs={'data-react-helmet': 'true', 'type': 'application/ld+json'})
+        content = find_tag(
+            response.text, 'script', {'data-react-helmet': 'true', 'type': 'application/ld+json'}, text=True)
 
         try:
-            out = json.loads(content.contents[0])['video']['contentUrl']
+            out = json.loads(content.text)['video']['contentUrl']
         except (IndexError, KeyError, AttributeError) as e:
             raise SiteDownloaderError(f'Failed to download Gfycat link {url}: {e}')
         except json.JSONDecodeError as e:
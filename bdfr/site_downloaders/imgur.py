@@ -1,25 +1,56 @@
 #!/usr/bin/env python3
 
 import json
+import logging
 import re
+import urllib.parse
 from typing import Optional
 
-import bs4
+import requests
 from praw.models import Submission
 
 from bdfr.exceptions import SiteDownloaderError
+from bdfr.host_scheduler import HostScheduler
+from bdfr.html_extractor import find_tags
+from bdfr.metadata_cache import MetadataCache
 from bdfr.resource import Resource
+from bdfr.session_manager import SessionManager
 from bdfr.site_authenticator import SiteAuthenticator
-from bdfr.site_downloaders.base_downloader import BaseDownloader
+from bdfr.site_downloaders.base_downloader import BaseDownloader, UrlRule
+
+logger = logging.getLogger(__name__)
 
 
 class Imgur(BaseDownloader):
+    url_rules = (
+        # GIFV links are pages rather than files, so they come before direct links
+        UrlRule(('imgur.com',), r'(?i).*\.gifv$', priority=2),
+        UrlRule(('imgur.com',)),
+    )
+    api_url = 'https://api.imgur.com/3'
+    # Animated images are served as MP4 as well as GIF, and the MP4 is much smaller
+    _content_type_extensions = {
+        'image/jpeg': '.jpg',
+        'image/png': '.png',
+        'image/gif': '.mp4',
+        'video/mp4': '.mp4',
+    }
+    _link_regex = re.compile(r'(?i)^(?:https?://)?(?:www\.|[im]\.)?imgur\.com/(?:(a|gallery|t/[^/]+|r/[^/]+)/)?([^/?#.]+)')
 
     def __init__(self, post: Submission):
         super().__init__(post)
         self.raw_data = {}
 
     def find_resources(self, authenticator: Optional[SiteAuthenticator] = None) -> list[Resource]:
+        if direct_link := self._get_direct_link(self.post.url):
+            return [Resource(self.post, direct_link)]
+
+        client_id = authenticator.imgur_authentication if authenticator else None
+        if client_id:
+            images = self._get_api_images(self.post.url, client_id)
+            return [Resource(self.post, self._get_api_image_url(image)) for image in images]
+
+        # Without a client ID the API cannot be used, so the links are read from the page instead
         self.raw_data = self._get_data(self.post.url)
 
         out = []
@@ -35,6 +66,94 @@ class Imgur(BaseDownloader):
         image_url = 'https://i.imgur.com/' + image['hash'] + self._validate_extension(image['ext'])
         return Resource(self.post, image_url)
 
+    @staticmethod
+    def _parse_link(link: str) -> tuple[str, str]:
+        match = Imgur._link_regex.match(link)
+        if not match:
+            raise SiteDownloaderError(f'Could not find an Imgur ID in {link}')
+        category, image_id = match.groups()
+        # Newer album links put the title before the ID, separated by a hyphen
+        image_id = image_id.rsplit('-', 1)[-1]
+        if category is None or category.lower().startswith('r/'):
+            return 'image', image_id
+        elif category.lower() == 'a':
+            return 'album', image_id
+        return 'gallery', image_id
+
+    @staticmethod
+    def _get_direct_link(link: str) -> Optional[str]:
+        """Find the media URL of a single image from its link alone, where that is possible"""
+        try:
+            category, image_id = Imgur._parse_link(link)
+        except SiteDownloaderError:
+            return None
+        if category != 'image':
+            return None
+        extension = re.search(r'(?i)\.(\w{3,4})$', urllib.parse.urlsplit(link).path)
+        extension = f'.{extension.group(1).lower()}' if extension else None
+        if extension == '.gifv':
+            return f'https://i.imgur.com/{image_id}.mp4'
+        elif extension in ('.jpg', '.jpeg', '.png', '.gif', '.mp4'):
+            return f'https://i.imgur.com/{image_id}{extension}'
+        return Imgur._probe_direct_link(image_id)
+
+    @staticmethod
+    def _probe_direct_link(image_id: str) -> Optional[str]:
+        cache = MetadataCache.get_cache()
+        if cache and (cached := cache.get('imgur', f'direct/{image_id}')) is not None:
+            return cached['link']
+        # Imgur serves an image at any extension with its real content type, so one request finds the right one
+        test_url = f'https://i.imgur.com/{image_id}.jpg'
+        try:
+            with HostScheduler.get_scheduler().slot(test_url):
+                response = SessionManager.get_session().head(test_url, allow_redirects=False)
+        except requests.exceptions.RequestException as e:
+            logger.debug(f'Failed to find type of Imgur image {image_id}: {e}')
+            return None
+        content_type = response.headers.get('Content-Type', '').split(';')[0].strip().lower()
+        if response.status_code != 200 or content_type not in Imgur._content_type_extensions:
+            # Removed images redirect to a placeholder, which the page or API will report properly
+            logger.debug(f'Could not find type of Imgur image {image_id} from response {response.status_code}')
+            return None
+        direct_link = f'https://i.imgur.com/{image_id}{Imgur._content_type_extensions[content_type]}'
+        if cache:
+            cache.store('imgur', f'direct/{image_id}', {'link': direct_link})
+        return direct_link
+
+    @staticmethod
+    def _get_api_images(link: str, client_id: str) -> list[dict]:
+        category, image_id = Imgur._parse_link(link)
+        cache = MetadataCache.get_cache()
+        cache_key = f'{category}/{image_id}'
+        if cache and (cached := cache.get('imgur', cache_key)) is not None:
+            return cached['images']
+
+        res = Imgur.retrieve_url(
+            f'{Imgur.api_url}/{category}/{image_id}',
+            headers={'Authorization': f'Client-ID {client_id}'},
+        )
+        try:
+            data = res.json()['data']
+            # Albums, and gallery posts that are albums, list their images; anything else is a single image
+            images = data['images'] if 'images' in data else [data]
+            images = [{key: image.get(key) for key in ('id', 'link', 'mp4', 'animated')} for image in images]
+        except (ValueError, KeyError, TypeError, AttributeError) as e:
+            raise SiteDownloaderError(f'Could not read Imgur API response for {link}: {e}')
+        if not images:
+            raise SiteDownloaderError(f'No images found in Imgur album {link}')
+        if cache:
+            cache.store('imgur', cache_key, {'images': images})
+        return images
+
+    @staticmethod
+    def _get_api_image_url(image: dict) -> str:
+        # Animated images are also available as MP4, which is much smaller than the GIF
+        if image.get('animated') and image.get('mp4'):
+            return image['mp4']
+        elif image.get('link'):
+            return image['link']
+        raise SiteDownloaderError(f'Imgur image {image.get("id")} has no link')
+
     @staticmethod
     def _get_data(link: str) -> dict:
         link = link.rstrip('?')
@@ -44,9 +163,8 @@ class Imgur(BaseDownloader):
 
         res = Imgur.retrieve_url(link, cookies={'over18': '1', 'postpagebeta': '0'})
 
-        soup = bs4.BeautifulSoup(res.text, 'html.parser')
-        scripts = soup.find_all('script', attrs={'type': 'text/javascript'})
-        scripts = [script.string.replace('\n', '') for script in scripts if script.string]
+        scripts = find_tags(res.text, 'script', {'type': 'text/javascript'}, text=True)
+        scripts = [script.text.replace('\n', '') for script in scripts if script.text]
 
         script_regex = re.compile(r'\s*\(function\(widgetFactory\)\s*{\s*widgetFactory\.mergeConfig\(\'gallery\'')
         chosen_script = list(filter(lambda s: re.search(script_regex, s), scripts))
@@ -9,10 +9,12 @@ from praw.models import Submission
 from bdfr.exceptions import SiteDownloaderError
 from bdfr.resource import Resource
 from bdfr.site_authenticator import SiteAuthenticator
-from bdfr.site_downloaders.base_downloader import BaseDownloader
+from bdfr.site_downloaders.base_downloader import BaseDownloader, UrlRule
 
 
 class Redgifs(BaseDownloader):
+    url_rules = (UrlRule(('redgifs.com', 'gifdeliverynetwork.com')),)
+
     def __init__(self, post: Submission):
         super().__init__(post)
 
@@ -7,12 +7,14 @@ from praw.models import Submission
 
 from bdfr.resource import Resource
 from bdfr.site_authenticator import SiteAuthenticator
-from bdfr.site_downloaders.base_downloader import BaseDownloader
+from bdfr.site_downloaders.base_downloader import BaseDownloader, UrlRule
 
 logger = logging.getLogger(__name__)
 
 
 class SelfPost(BaseDownloader):
+    url_rules = (UrlRule(('reddit.com',), r'r/'),)
+
     def __init__(self, post: Submission):
         super().__init__(post)
 
@@ -1,22 +1,21 @@
 #!/usr/bin/env python3
 
 import logging
-import tempfile
-from pathlib import Path
 from typing import Optional
 
-import youtube_dl
 from praw.models import Submission
 
-from bdfr.exceptions import (NotADownloadableLinkError, SiteDownloaderError)
 from bdfr.resource import Resource
 from bdfr.site_authenticator import SiteAuthenticator
-from bdfr.site_downloaders.base_downloader import BaseDownloader
+from bdfr.site_downloaders.base_downloader import BaseDownloader, UrlRule
+from bdfr.video_resource import VideoResource
 
 logger = logging.getLogger(__name__)
 
 
 class Youtube(BaseDownloader):
+    url_rules = (UrlRule(('youtube.com', 'youtu.be')),)
+
     def __init__(self, post: Submission):
         super().__init__(post)
 
@@ -24,34 +23,11 @@ class Youtube(BaseDownloader):
         ytdl_options = {
             'format': 'best',
             'playlistend': 1,
-            'nooverwrites': True,
         }
-        out = self._download_video(ytdl_options)
+        out = self._extract_video(ytdl_options)
         return [out]
 
-    def _download_video(self, ytdl_options: dict) -> Resource:
-        yt_logger = logging.getLogger('youtube-dl')
-        yt_logger.setLevel(logging.CRITICAL)
-        ytdl_options['quiet'] = True
-        ytdl_options['logger'] = yt_logger
-        with tempfile.TemporaryDirectory() as temp_dir:
-            download_path = Path(temp_dir).resolve()
-            ytdl_options['outtmpl'] = str(download_path) + '/' + 'test.%(ext)s'
-            try:
-                with youtube_dl.YoutubeDL(ytdl_options) as ydl:
-                    ydl.download([self.post.url])
-            except youtube_dl.DownloadError as e:
-                raise SiteDownloaderError(f'Youtube download failed: {e}')
-
-            downloaded_files = list(download_path.iterdir())
-            if len(downloaded_files) > 0:
-                downloaded_file = downloaded_files[0]
-            else:
-                raise NotADownloadableLinkError(f"No media exists in the URL {self.post.url}")
-            extension = downloaded_file.suffix
-            with open(downloaded_file, 'rb') as file:
-                content = file.read()
-        out = Resource(self.post, self.post.url, extension)
-        out.content = content
-        out.create_hash()
-        return out
+    def _extract_video(self, ytdl_options: dict, ie_key: Optional[str] = None) -> VideoResource:
+        """Find the video in the link, leaving it to be downloaded next to its destination later"""
+        info = VideoResource.extract(self.post.url, ytdl_options, ie_key)
+        return VideoResource(self.post, info, ytdl_options)
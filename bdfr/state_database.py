@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+# coding=utf-8
+
+import logging
+import sqlite3
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import NamedTuple, Optional
+
+from bdfr.exceptions import BulkDownloaderException
+
+logger = logging.getLogger(__name__)
+
+
+class StoredFile(NamedTuple):
+    """A file downloaded from a URL, as it was when it was written"""
+    hash: str
+    path: Path
+    size: int
+
+
+class StateDatabase:
+    """Records the outcome of each submission and the resources downloaded for it, so that later runs can skip them
+
+    A submission is only treated as complete if every file recorded for it still exists, so deleting a file causes the
+    submission to be downloaded again on the next run.
+    """
+    _schema = (
+        '''CREATE TABLE IF NOT EXISTS submissions (
+            id TEXT PRIMARY KEY,
+            outcome TEXT NOT NULL,
+            downloader TEXT,
+            updated TEXT NOT NULL
+        )''',
+        '''CREATE TABLE IF NOT EXISTS resources (
+            submission_id TEXT NOT NULL,
+            url TEXT NOT NULL,
+            hash TEXT,
+            path TEXT,
+            PRIMARY KEY (submission_id, url)
+        )''',
+        '''CREATE TABLE IF NOT EXISTS files (
+            url TEXT PRIMARY KEY,
+            hash TEXT NOT NULL,
+            algorithm TEXT NOT NULL,
+            path TEXT NOT NULL,
+            size INTEGER NOT NULL
+        )''',
+    )
+
+    def __init__(self, database_path: Path):
+        self.database_path = database_path
+        self._lock = threading.Lock()
+        try:
+            database_path.parent.mkdir(parents=True, exist_ok=True)
+            # The connection is shared between the pipeline's threads, with the lock serialising access to it
+            self._connection = sqlite3.connect(database_path, check_same_thread=False, isolation_level=None)
+            self._connection.execute('PRAGMA journal_mode=WAL')
+            for statement in self._schema:
+                self._connection.execute(statement)
+        except sqlite3.Error as e:
+            raise BulkDownloaderException(f'Could not open state database at {database_path}: {e}')
+        logger.debug(f'Opened state database at {database_path}')
+
+    def is_complete(self, submission_id: str) -> bool:
+        with self._lock:
+            outcome = self._connection.execute(
+                'SELECT outcome FROM submissions WHERE id = ?', (submission_id,)).fetchone()
+            if not outcome or outcome[0] != 'downloaded':
+                return False
+            paths = self._connection.execute(
+                'SELECT path FROM resources WHERE submission_id = ? AND path IS NOT NULL', (submission_id,)).fetchall()
+        return all(Path(path).exists() for (path,) in paths)
+
+    def is_recorded(self, submission_id: str) -> bool:
+        with self._lock:
+            return self._connection.execute(
+                'SELECT 1 FROM submissions WHERE id = ?', (submission_id,)).fetchone() is not None
+
+    def record_submission(self, submission_id: str, outcome: str, downloader_name: Optional[str] = None):
+        with self._lock:
+            self._connection.execute(
+                'INSERT OR REPLACE INTO submissions (id, outcome, downloader, updated) VALUES (?, ?, ?, ?)',
+                (submission_id, outcome, downloader_name, datetime.now().isoformat()),
+            )
+
+    def record_resource(self, submission_id: str, url: str, resource_hash: Optional[str], path: Optional[Path]):
+        with self._lock:
+            self._connection.execute(
+                'INSERT OR REPLACE INTO resources (submission_id, url, hash, path) VALUES (?, ?, ?, ?)',
+                (submission_id, url, resource_hash, str(path) if path else None),
+            )
+
+    def find_file(self, url: str, algorithm: str) -> Optional[StoredFile]:
+        """Return the file last downloaded from the URL, if it was hashed with the same algorithm"""
+        with self._lock:
+            row = self._connection.execute(
+                'SELECT hash, path, size FROM files WHERE url = ? AND algorithm = ?', (url, algorithm)).fetchone()
+        if not row:
+            return None
+        return StoredFile(row[0], Path(row[1]), row[2])
+
+    def record_file(self, url: str, resource_hash: str, algorithm: str, path: Path, size: int):
+        with self._lock:
+            self._connection.execute(
+                'INSERT OR REPLACE INTO files (url, hash, algorithm, path, size) VALUES (?, ?, ?, ?, ?)',
+                (url, resource_hash, algorithm, str(path), size),
+            )
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+# coding=utf-8
+
+import json
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import BinaryIO, Callable, Optional, TypeVar
+
+import _hashlib
+import youtube_dl
+from youtube_dl.postprocessor.common import PostProcessor
+
+from bdfr.exceptions import NotADownloadableLinkError, SiteDownloaderError
+from bdfr.hashing import FinishedHash
+from bdfr.resource import Resource
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar('T')
+
+
+class _StreamingHasher:
+    """Hashes a file as youtube-dl writes it, reading back each block while it is still in the page cache
+
+    If youtube-dl starts writing the file again from the beginning, such as when retrying against a server that cannot
+    resume, the file shrinks or fewer bytes are reported as downloaded, and the file is hashed again from the start.
+    """
+
+    def __init__(self):
+        self.path: Optional[str] = None
+        self.hash: Optional[_hashlib.HASH] = None
+        self._file: Optional[BinaryIO] = None
+        self._downloaded_bytes = 0
+
+    def progress_hook(self, status: dict):
+        path = status.get('tmpfilename') or status.get('filename')
+        if path is None:
+            return
+        downloaded_bytes = status.get('downloaded_bytes') or 0
+        if path != self.path or downloaded_bytes < self._downloaded_bytes:
+            self._start(path)
+        self._downloaded_bytes = downloaded_bytes
+        self._update()
+
+    def finish(self, path: Path) -> _hashlib.HASH:
+        # Files that were merged or converted after downloading are hashed again from the start
+        if str(path) != self.path:
+            self._start(str(path))
+        try:
+            self._update()
+            return self.hash
+        finally:
+            self.close()
+
+    def close(self):
+        if self._file:
+            self._file.close()
+            self._file = None
+
+    def _start(self, path: str):
+        self.close()
+        self.path = path
+        self.hash = Resource.new_hash()
+        self._downloaded_bytes = 0
+
+    def _update(self):
+        if self._file is None:
+            try:
+                self._file = open(self.path, 'rb')
+            except FileNotFoundError:
+                return
+        elif os.fstat(self._file.fileno()).st_size < self._file.tell():
+            # The file was truncated and is being written again, so what was read of it no longer counts
+            self._file.seek(0)
+            self.hash = Resource.new_hash()
+        while chunk := self._file.read(Resource.chunk_size):
+            self.hash.update(chunk)
+
+
+class _FilePathRecorder(PostProcessor):
+    """Records where the video ends up, which changes if youtube-dl merges separate video and audio streams"""
+
+    def __init__(self):
+        super().__init__()
+        self.file_path: Optional[str] = None
+
+    def run(self, information: dict) -> tuple[list, dict]:
+        self.file_path = information['filepath']
+        return [], information
+
+
+class VideoDownloader:
+    """Runs youtube-dl with one set of options, reusing the same YoutubeDL for every video
+
+    A YoutubeDL is not safe to use from more than one thread at a time, so each thread or process needs its own.
+    """
+
+    def __init__(self, ytdl_options: dict):
+        self._hasher: Optional[_StreamingHasher] = None
+        self._recorder = _FilePathRecorder()
+        yt_logger = logging.getLogger('youtube-dl')
+        yt_logger.setLevel(logging.CRITICAL)
+        self.ydl = youtube_dl.YoutubeDL({
+            **ytdl_options,
+            'quiet': True,
+            'logger': yt_logger,
+            'nopart': True,
+            'continuedl': False,
+            'nooverwrites': False,
+            'progress_hooks': [self._progress_hook],
+        })
+        self.ydl.add_post_processor(self._recorder)
+
+    def extract(self, url: str, ie_key: Optional[str] = None) -> dict:
+        try:
+            # The page is read once, and only by the extractor already chosen for the link if there is one
+            info = self.ydl.extract_info(url, download=False, ie_key=ie_key)
+        except youtube_dl.DownloadError as e:
+            raise SiteDownloaderError(f'Youtube download failed: {e}')
+        if not info:
+            raise NotADownloadableLinkError(f'No media exists in the URL {url}')
+        return info
+
+    def download(self, info: dict, file_path: Path) -> _hashlib.HASH:
+        """Download the video to the file, which is hashed as it is written"""
+        # youtube-dl renames a file ending in .part to the name without it, which would be the destination itself
+        work_path = file_path.with_name(file_path.name + '.ytdl')
+        self._hasher = _StreamingHasher()
+        self._recorder.file_path = None
+        self.ydl.params['outtmpl'] = str(work_path).replace('%', '%%')
+        try:
+            self.ydl.process_ie_result(dict(info), download=True)
+            downloaded_path = Path(self._recorder.file_path) if self._recorder.file_path else work_path
+            if not downloaded_path.exists():
+                raise NotADownloadableLinkError(f'No media exists in the URL {info.get("webpage_url")}')
+            file_hash = self._hasher.finish(downloaded_path)
+            downloaded_path.replace(file_path)
+            return file_hash
+        except youtube_dl.DownloadError as e:
+            work_path.unlink(missing_ok=True)
+            raise SiteDownloaderError(f'Youtube download failed: {e}')
+        finally:
+            self._hasher.close()
+            self._hasher = None
+
+    def _progress_hook(self, status: dict):
+        if self._hasher:
+            self._hasher.progress_hook(status)
+
+
+# The downloaders kept by each worker process, one for each set of options
+_worker_downloaders: dict[str, VideoDownloader] = {}
+
+
+def _get_worker_downloader(ytdl_options: dict) -> VideoDownloader:
+    key = json.dumps(ytdl_options, sort_keys=True)
+    if key not in _worker_downloaders:
+        _worker_downloaders[key] = VideoDownloader(ytdl_options)
+    return _worker_downloaders[key]
+
+
+def _initialise_worker(hash_algorithm: str):
+    # The configured algorithm is set on the class in the main process, which a new process does not inherit
+    Resource.hash_algorithm = hash_algorithm
+
+
+def _extract_in_worker(url: str, ytdl_options: dict, ie_key: Optional[str]) -> dict:
+    return _get_worker_downloader(ytdl_options).extract(url, ie_key)
+
+
+def _download_in_worker(info: dict, ytdl_options: dict, file_path: Path) -> FinishedHash:
+    # Hash objects cannot be sent between processes, so only the result is returned
+    return FinishedHash.from_hash(_get_worker_downloader(ytdl_options).download(info, file_path))
+
+
+class VideoWorkerPool:
+    """Runs youtube-dl in a pool of long-lived processes, separate from the rest of the download
+
+    Each process keeps its YoutubeDL instances between videos. The number of processes limits how many videos are
+    found or downloaded at once. Without an installed pool, youtube-dl is run in the calling thread.
+    """
+    _installed: Optional['VideoWorkerPool'] = None
+    _install_lock = threading.Lock()
+
+    def __init__(self, workers: int):
+        self.workers = workers
+        self._executor_lock = threading.Lock()
+        self._executor = self._create_executor()
+
+    def _create_executor(self) -> ProcessPoolExecutor:
+        # Processes are started fresh rather than forked, as forking a process with running threads is unsafe
+        return ProcessPoolExecutor(
+            self.workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_initialise_worker,
+            initargs=(Resource.hash_algorithm,),
+        )
+
+    @classmethod
+    def install(cls, pool: Optional['VideoWorkerPool']):
+        with cls._install_lock:
+            cls._installed = pool
+
+    @classmethod
+    def get_pool(cls) -> Optional['VideoWorkerPool']:
+        return cls._installed
+
+    def extract(self, url: str, ytdl_options: dict, ie_key: Optional[str] = None) -> dict:
+        return self._run(_extract_in_worker, url, ytdl_options, ie_key)
+
+    def download(self, info: dict, ytdl_options: dict, file_path: Path) -> FinishedHash:
+        return self._run(_download_in_worker, info, ytdl_options, file_path)
+
+    def _run(self, function: Callable[..., T], *args) -> T:
+        with self._executor_lock:
+            executor = self._executor
+        try:
+            return executor.submit(function, *args).result()
+        except BrokenProcessPool as e:
+            # A process that dies takes the whole pool with it, so a new one is started for the videos that follow
+            with self._executor_lock:
+                if self._executor is executor:
+                    self._executor = self._create_executor()
+            raise SiteDownloaderError(f'Video worker process failed: {e}')
+
+    def close(self):
+        with self._executor_lock:
+            self._executor.shutdown(cancel_futures=True)
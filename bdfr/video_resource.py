@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+# coding=utf-8
+
+import logging
+import tempfile
+from pathlib import Path
+
+from praw.models import Submission
+
+from bdfr.exceptions import NotADownloadableLinkError
+from bdfr.resource import Resource
+from bdfr.video_pool import VideoDownloader, VideoWorkerPool
+
+logger = logging.getLogger(__name__)
+
+
+class VideoResource(Resource):
+    """A video that youtube-dl has found but not yet downloaded
+
+    The information youtube-dl extracted from the page is kept, so the page is not read again when the video is
+    downloaded. The video is written straight to the file it is given, next to its destination, and hashed as it
+    arrives, so that it can be renamed into place once complete.
+    """
+
+    def __init__(self, source_submission: Submission, info: dict, ytdl_options: dict):
+        # Only the first video of a playlist is downloaded
+        if info.get('entries'):
+            info = info['entries'][0]
+        if not info.get('ext'):
+            raise NotADownloadableLinkError(f'No media exists in the URL {source_submission.url}')
+        super().__init__(source_submission, source_submission.url, '.' + info['ext'])
+        self.info = info
+        self.ytdl_options = ytdl_options
+
+    @staticmethod
+    def extract(url: str, ytdl_options: dict, ie_key: str = None) -> dict:
+        """Find the video in a link, in the video worker processes if there are any"""
+        if pool := VideoWorkerPool.get_pool():
+            return pool.extract(url, ytdl_options, ie_key)
+        return VideoDownloader(ytdl_options).extract(url, ie_key)
+
+    def download(self, max_wait_time: int, defer: bool = False):
+        """Download the video into memory, which should only be used for small videos"""
+        if not self.content:
+            with tempfile.TemporaryDirectory() as temp_dir:
+                self.download_to_file(Path(temp_dir, 'video.part'), max_wait_time, defer)
+                self.content = self.download_path.read_bytes()
+                self.download_path = None
+
+    def download_to_file(self, file_path: Path, max_wait_time: int, defer: bool = False):
+        # youtube-dl retries failed requests itself, so the wait time and deferral do not apply
+        self.download_path = file_path
+        if pool := VideoWorkerPool.get_pool():
+            self.hash = pool.download(self.info, self.ytdl_options, file_path)
+        else:
+            self.hash = VideoDownloader(self.ytdl_options).download(self.info, file_path)
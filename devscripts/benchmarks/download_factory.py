@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+# coding=utf-8
+
+"""Compare the time taken by DownloadFactory to choose downloaders with the chain of regexes it used to run
+
+The links are read from a file with one link per line, by default the links to real submissions and media collected
+from the tests in submission_urls.txt. Links that no rule matches would be passed to youtube-dl, which needs the
+network, so only the rules are timed. Run it from the root of the repository with:
+
+    python -m devscripts.benchmarks.download_factory
+"""
+
+import argparse
+import re
+import timeit
+import urllib.parse
+from pathlib import Path
+from typing import Optional
+
+from bdfr.site_downloaders.direct import Direct
+from bdfr.site_downloaders.download_factory import DownloadFactory
+from bdfr.site_downloaders.erome import Erome
+from bdfr.site_downloaders.gallery import Gallery
+from bdfr.site_downloaders.gfycat import Gfycat
+from bdfr.site_downloaders.imgur import Imgur
+from bdfr.site_downloaders.pornhub import PornHub
+from bdfr.site_downloaders.redgifs import Redgifs
+from bdfr.site_downloaders.self_post import SelfPost
+from bdfr.site_downloaders.youtube import Youtube
+
+
+def _legacy_sanitise_url(url: str) -> str:
+    beginning_regex = re.compile(r'\s*(www\.?)?')
+    split_url = urllib.parse.urlsplit(url)
+    split_url = split_url.netloc + split_url.path
+    split_url = re.sub(beginning_regex, '', split_url)
+    return split_url
+
+
+def _legacy_is_web_resource(url: str) -> bool:
+    web_extensions = ('asp', 'aspx', 'cfm', 'cfml', 'css', 'htm', 'html', 'js', 'php', 'php3', 'xhtml')
+    return bool(re.match(rf'(?i).*/.*\.({"|".join(web_extensions)})$', url))
+
+
+def _legacy_pull_lever(url: str) -> Optional[type]:
+    sanitised_url = _legacy_sanitise_url(url)
+    if re.match(r'(i\.)?imgur.*\.gifv$', sanitised_url):
+        return Imgur
+    elif re.match(r'.*/.*\.\w{3,4}(\?[\w;&=]*)?$', sanitised_url) and not _legacy_is_web_resource(sanitised_url):
+        return Direct
+    elif re.match(r'erome\.com.*', sanitised_url):
+        return Erome
+    elif re.match(r'reddit\.com/gallery/.*', sanitised_url):
+        return Gallery
+    elif re.match(r'gfycat\.', sanitised_url):
+        return Gfycat
+    elif re.match(r'(m\.)?imgur.*', sanitised_url):
+        return Imgur
+    elif re.match(r'(redgifs|gifdeliverynetwork)', sanitised_url):
+        return Redgifs
+    elif re.match(r'reddit\.com/r/', sanitised_url):
+        return SelfPost
+    elif re.match(r'(m\.)?youtu\.?be', sanitised_url):
+        return Youtube
+    elif re.match(r'i\.redd\.it.*', sanitised_url):
+        return Direct
+    elif re.match(r'pornhub\.com.*', sanitised_url):
+        return PornHub
+    return None
+
+
+def _indexed_pull_lever(url: str) -> Optional[type]:
+    return DownloadFactory._match_rules(DownloadFactory.sanitise_url(url))
+
+
+def _clear_link_caches():
+    # The rules for each host stay cached, as hosts repeat far more often than links do in a run
+    DownloadFactory.sanitise_url.cache_clear()
+    DownloadFactory._match_rules.cache_clear()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--urls', type=Path, default=Path(Path(__file__).parent, 'submission_urls.txt'))
+    parser.add_argument('--number', type=int, default=200, help='times to choose a downloader for every link')
+    args = parser.parse_args()
+
+    urls = [line.strip() for line in args.urls.read_text().splitlines() if line.strip()]
+    DownloadFactory._update_index()
+
+    differences = [url for url in urls if _legacy_pull_lever(url) is not _indexed_pull_lever(url)]
+    for url in differences:
+        print(f'Chosen differently: {url} ({_legacy_pull_lever(url)} before, {_indexed_pull_lever(url)} now)')
+
+    def run_cold():
+        _clear_link_caches()
+        for url in urls:
+            _indexed_pull_lever(url)
+
+    results = {
+        'regex chain': timeit.timeit(lambda: [_legacy_pull_lever(url) for url in urls], number=args.number),
+        'indexed, new links': timeit.timeit(run_cold, number=args.number),
+        'indexed, seen links': timeit.timeit(lambda: [_indexed_pull_lever(url) for url in urls], number=args.number),
+    }
+    print(f'{len(urls)} links, {args.number} times each')
+    for name, total in results.items():
+        print(f'{name:<22} {total / (args.number * len(urls)) * 1e6:>8.2f} µs per link')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+# coding=utf-8
+
+"""Measure the time taken to name each file of a large gallery with FileNameFormatter
+
+The formatter is compared with the approach it replaced, which searched for and substituted every key in the scheme
+with uncompiled regular expressions, for every folder in the scheme and for every resource. The length limit for paths
+is fixed for both, so that only the naming itself is timed. Run it from the root of the repository with:
+
+    python -m devscripts.benchmarks.file_name_formatting
+"""
+
+import argparse
+import re
+import tempfile
+import timeit
+from datetime import datetime
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+
+import praw.models
+
+from bdfr.file_name_formatter import FileNameFormatter
+from bdfr.resource import Resource
+
+
+def _make_gallery(image_count: int) -> list[Resource]:
+    submission = MagicMock()
+    submission.__class__ = praw.models.Submission
+    submission.title = 'A gallery with a title of a typical length for a post \\u2019 with an escape'
+    submission.subreddit.display_name = 'EarthPorn'
+    submission.author.name = 'test_user'
+    submission.id = 'abc123'
+    submission.score = 1000
+    submission.link_flair_text = 'OC'
+    submission.created_utc = datetime(2021, 4, 21, 9, 30).timestamp()
+    return [Resource(submission, f'https://i.redd.it/image{i}.jpg') for i in range(image_count)]
+
+
+def _legacy_format_name(formatter: FileNameFormatter, submission: praw.models.Submission, format_string: str) -> str:
+    attributes = formatter._generate_name_dict_from_submission(submission)
+    result = format_string
+    for key in attributes.keys():
+        if re.search(fr'(?i).*{{{key}}}.*', result):
+            key_value = str(attributes.get(key, 'unknown'))
+            key_value = FileNameFormatter._convert_unicode_escapes(key_value)
+            key_value = key_value.replace('\\', '\\\\')
+            result = re.sub(fr'(?i){{{key}}}', key_value, result)
+    return result.replace('/', '')
+
+
+def _legacy_format_resource_paths(
+        formatter: FileNameFormatter,
+        resources: list[Resource],
+        destination_directory: Path,
+) -> list[tuple[Path, Resource]]:
+    out = []
+    for i, res in enumerate(resources, start=1):
+        subfolder = Path(
+            destination_directory,
+            *[_legacy_format_name(formatter, res.source_submission, part) for part in formatter.directory_format_string],
+        )
+        file_name = _legacy_format_name(formatter, res.source_submission, formatter.file_format_string)
+        out.append((formatter._limit_file_name_length(file_name, f'_{i}{res.extension}', subfolder), res))
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--images', type=int, default=100, help='number of images in the gallery')
+    parser.add_argument('--number', type=int, default=50, help='times to name the whole gallery')
+    parser.add_argument('--file-scheme', default='{REDDITOR}_{TITLE}_{POSTID}')
+    parser.add_argument('--folder-scheme', default='{SUBREDDIT}/{DATE}')
+    args = parser.parse_args()
+
+    resources = _make_gallery(args.images)
+    formatter = FileNameFormatter(args.file_scheme, args.folder_scheme, 'ISO')
+    approaches = {
+        'legacy': lambda directory: _legacy_format_resource_paths(formatter, resources, directory),
+        'formatter': lambda directory: formatter.format_resource_paths(resources, directory),
+    }
+
+    with tempfile.TemporaryDirectory() as directory, \
+            patch.object(FileNameFormatter, 'find_max_path_length', return_value=4096):
+        directory = Path(directory)
+        expected = approaches['legacy'](directory)
+        if approaches['formatter'](directory) != expected:
+            raise RuntimeError('The formatter named the files differently from the legacy approach')
+        print(f'{"approach":<10} {"per path":>12} {"per gallery":>14}')
+        for name, approach in approaches.items():
+            total = timeit.timeit(lambda: approach(directory), number=args.number)
+            per_gallery = total / args.number * 1000
+            per_path = per_gallery / args.images * 1000
+            print(f'{name:<10} {per_path:>9.1f} us {per_gallery:>11.2f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+# coding=utf-8
+
+"""Compare the time taken to pull links out of site pages with BeautifulSoup and with bdfr.html_extractor
+
+Pages saved from the sites can be given with --pages, as a directory holding erome.html, gfycat.html and imgur.html.
+Otherwise pages with the same structure and a typical size are generated. BeautifulSoup is only needed to run this
+benchmark, and the lxml parser is included if it is installed. Run it from the root of the repository with:
+
+    python -m devscripts.benchmarks.html_extraction
+"""
+
+import argparse
+import json
+import timeit
+from pathlib import Path
+from typing import Callable
+
+from bdfr.html_extractor import find_tag, find_tags
+
+_FILLER = '<div class="row"><a href="/user/test">test</a><span class="meta">1 day ago</span><p>Lorem ipsum</p></div>\n'
+
+
+def _generate_pages() -> dict[str, str]:
+    filler = _FILLER * 1500
+    erome = ''.join(
+        f'<div class="img"><img class="img-front lasyload" data-src="https://s1.erome.com/{i}.jpg"></div>'
+        f'<video><source src="https://v1.erome.com/{i}.mp4" type="video/mp4"></video>'
+        for i in range(20)
+    )
+    ld_json = json.dumps({'video': {'contentUrl': 'https://giant.gfycat.com/Test.mp4'}})
+    imgur_config = json.dumps({'image': {'hash': 'test', 'ext': '.png'}, 'group': {}})
+    return {
+        'erome': f'<html><head></head><body>{filler}{erome}{filler}</body></html>',
+        'gfycat': f'<html><head><script data-react-helmet="true" type="application/ld+json">{ld_json}</script>'
+                  f'</head><body>{filler}</body></html>',
+        'imgur': f'<html><head></head><body>{filler}<script type="text/javascript">(function(widgetFactory) '
+                 f'{{ widgetFactory.mergeConfig(\'gallery\', {imgur_config}); }})</script>{filler}</body></html>',
+    }
+
+
+def _soup_extractors(parser: str) -> dict[str, Callable[[str], object]]:
+    import bs4
+
+    def erome(page: str):
+        soup = bs4.BeautifulSoup(page, parser)
+        return [im.get('data-src') for im in soup.find_all('img', attrs={'class': 'lasyload'})] + \
+            [vid.get('src') for vid in soup.find_all('source')]
+
+    def gfycat(page: str):
+        soup = bs4.BeautifulSoup(page, parser)
+        return soup.find('script', attrs={'data-react-helmet': 'true', 'type': 'application/ld+json'}).contents[0]
+
+    def imgur(page: str):
+        soup = bs4.BeautifulSoup(page, parser)
+        return [script.string for script in soup.find_all('script', attrs={'type': 'text/javascript'})]
+
+    return {'erome': erome, 'gfycat': gfycat, 'imgur': imgur}
+
+
+def _extractor_extractors() -> dict[str, Callable[[str], object]]:
+    return {
+        'erome': lambda page: [tag.attrs.get('src') or tag.attrs.get('data-src')
+                               for tag in find_tags(page, ('img', 'source'))],
+        'gfycat': lambda page: find_tag(
+            page, 'script', {'data-react-helmet': 'true', 'type': 'application/ld+json'}, text=True).text,
+        'imgur': lambda page: [s.text for s in find_tags(page, 'script', {'type': 'text/javascript'}, text=True)],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--pages', type=Path, help='directory of saved pages')
+    parser.add_argument('--number', type=int, default=20, help='times to parse each page')
+    args = parser.parse_args()
+
+    if args.pages:
+        pages = {site: Path(args.pages, f'{site}.html').read_text() for site in ('erome', 'gfycat', 'imgur')}
+    else:
+        pages = _generate_pages()
+
+    approaches = {}
+    try:
+        import bs4
+        approaches['bs4 html.parser'] = _soup_extractors('html.parser')
+        try:
+            import lxml  # noqa: F401
+            approaches['bs4 lxml'] = _soup_extractors('lxml')
+        except ImportError:
+            pass
+    except ImportError:
+        print('BeautifulSoup is not installed, so only bdfr.html_extractor is timed')
+    approaches['html_extractor'] = _extractor_extractors()
+
+    print(f'{"site":<8} {"size":>9} ' + ' '.join(f'{name:>16}' for name in approaches))
+    for site, page in pages.items():
+        times = [
+            timeit.timeit(lambda: extractors[site](page), number=args.number) / args.number * 1000
+            for extractors in approaches.values()
+        ]
+        print(f'{site:<8} {len(page):>9} ' + ' '.join(f'{time:>13.2f} ms' for time in times))
+
+
+if __name__ == '__main__':
+    main()
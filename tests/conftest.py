@@ -2,7 +2,10 @@
 # coding=utf-8
 
 import configparser
+import re
 import socket
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from pathlib import Path
 
 import praw
@@ -38,3 +41,63 @@ def authenticated_reddit_instance():
         token_manager=token_manager,
     )
     return reddit_instance
+
+
+class _LocalHTTPHandler(BaseHTTPRequestHandler):
+    """Responds with the requested path as the body, or an error for paths starting with /missing
+
+    Paths starting with /unavailable always fail with a 503 error, and paths starting with /flaky fail with a 503 error on
+    the first request and succeed afterwards. Paths starting with
+    /ranged are padded to 17 bytes with zeroes and support Range requests, with the ETag "test".
+    """
+    requested_paths = set()
+
+    def do_GET(self):
+        if self.path.startswith('/missing'):
+            self.send_response(404)
+            self.end_headers()
+        elif self.path.startswith('/unavailable'):
+            self.send_response(503)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+        elif self.path.startswith('/flaky') and self.path not in self.requested_paths:
+            self.requested_paths.add(self.path)
+            self.send_response(503)
+            self.send_header('Retry-After', '0')
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+        elif self.path.startswith('/ranged'):
+            self._send_ranged(self.path.encode('utf-8').rjust(17, b'0'))
+        else:
+            body = self.path.encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    def _send_ranged(self, body: bytes):
+        requested_range = re.match(r'bytes=(\d+)-', self.headers.get('Range', ''))
+        if requested_range and self.headers.get('If-Range', '"test"') == '"test"':
+            start = int(requested_range.group(1))
+            self.send_response(206)
+            self.send_header('Content-Range', f'bytes {start}-{len(body) - 1}/{len(body)}')
+            body = body[start:]
+        else:
+            self.send_response(200)
+        self.send_header('Accept-Ranges', 'bytes')
+        self.send_header('ETag', '"test"')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture(scope='session')
+def local_http_server() -> str:
+    server = ThreadingHTTPServer(('127.0.0.1', 0), _LocalHTTPHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{server.server_address[1]}'
+    server.shutdown()
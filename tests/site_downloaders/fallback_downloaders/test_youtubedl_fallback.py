@@ -1,22 +1,63 @@
 #!/usr/bin/env python3
 
-from unittest.mock import MagicMock
+from pathlib import Path
+from unittest.mock import MagicMock, patch
 
 import pytest
+import youtube_dl
 
+from bdfr.exceptions import NotADownloadableLinkError
 from bdfr.resource import Resource
 from bdfr.site_downloaders.fallback_downloaders.youtubedl_fallback import YoutubeDlFallback
+from bdfr.video_resource import VideoResource
 
 
-@pytest.mark.online
 @pytest.mark.parametrize(('test_url', 'expected'), (
     ('https://www.reddit.com/r/specializedtools/comments/n2nw5m/bamboo_splitter/', True),
     ('https://www.youtube.com/watch?v=P19nvJOmqCc', True),
+    ('https://v.redd.it/9z1dnk3xr5k61', True),
+    ('https://streamable.com/dt46y', True),
     ('https://www.example.com/test', False),
+    ('random.com', False),
 ))
 def test_can_handle_link(test_url: str, expected: bool):
-    result = YoutubeDlFallback.can_handle_link(test_url)
+    with patch.object(youtube_dl.YoutubeDL, 'extract_info') as mock_extract:
+        result = YoutubeDlFallback.can_handle_link(test_url)
     assert result == expected
+    mock_extract.assert_not_called()
+
+
+@pytest.mark.parametrize(('test_url', 'expected'), (
+    ('https://v.redd.it/9z1dnk3xr5k61', 'Reddit'),
+    ('https://streamable.com/dt46y', 'Streamable'),
+    ('https://vimeo.com/channels/31259/53576664', 'Vimeo'),
+))
+def test_find_extractor(test_url: str, expected: str):
+    assert YoutubeDlFallback.find_extractor(test_url).ie_key() == expected
+
+
+def test_find_resources_extracts_once():
+    test_submission = MagicMock()
+    test_submission.url = 'https://streamable.com/dt46y'
+
+    def fake_extract(self, url: str, download: bool = True, ie_key: str = None):
+        return {'id': 'dt46y', 'title': 'test', 'url': 'https://example.com/dt46y.mp4', 'ext': 'mp4'}
+
+    with patch.object(youtube_dl.YoutubeDL, 'extract_info', autospec=True, side_effect=fake_extract) as mock_extract:
+        resources = YoutubeDlFallback(test_submission).find_resources()
+    mock_extract.assert_called_once()
+    assert mock_extract.call_args.kwargs['ie_key'] == 'Streamable'
+    assert mock_extract.call_args.kwargs['download'] is False
+    assert isinstance(resources[0], VideoResource)
+    assert resources[0].extension == '.mp4'
+    assert resources[0].content is None
+
+
+def test_find_resources_unsupported():
+    test_submission = MagicMock()
+    test_submission.url = 'https://www.example.com/test'
+    with pytest.raises(NotADownloadableLinkError):
+        YoutubeDlFallback(test_submission).find_resources()
 
 
 @pytest.mark.online
@@ -27,11 +68,12 @@ def test_can_handle_link(test_url: str, expected: bool):
     ('https://www.reddit.com/r/specializedtools/comments/n2nw5m/bamboo_splitter/', '21968d3d92161ea5e0abdcaf6311b06c'),
     ('https://v.redd.it/9z1dnk3xr5k61', '351a2b57e888df5ccbc508056511f38d'),
 ))
-def test_find_resources(test_url: str, expected_hash: str):
+def test_find_resources(test_url: str, expected_hash: str, tmp_path: Path):
     test_submission = MagicMock()
     test_submission.url = test_url
     downloader = YoutubeDlFallback(test_submission)
     resources = downloader.find_resources()
     assert len(resources) == 1
     assert isinstance(resources[0], Resource)
+    resources[0].download_to_file(tmp_path / 'test.part', 120)
     assert resources[0].hash.hexdigest() == expected_hash
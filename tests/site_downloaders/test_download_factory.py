@@ -1,11 +1,14 @@
 #!/usr/bin/env python3
 # coding=utf-8
 
+from typing import Optional
+
 import praw
 import pytest
 
 from bdfr.exceptions import NotADownloadableLinkError
-from bdfr.site_downloaders.base_downloader import BaseDownloader
+from bdfr.site_authenticator import SiteAuthenticator
+from bdfr.site_downloaders.base_downloader import BaseDownloader, UrlRule
 from bdfr.site_downloaders.direct import Direct
 from bdfr.site_downloaders.download_factory import DownloadFactory
 from bdfr.site_downloaders.erome import Erome
@@ -52,6 +55,52 @@ def test_factory_lever_good(test_submission_url: str, expected_class: BaseDownlo
     assert result is expected_class
 
 
+@pytest.mark.parametrize(('test_submission_url', 'expected_class'), (
+    ('https://www.reddit.com/r/TwoXChromosomes/comments/lu29zn/i_refuse/', SelfPost),
+    ('https://old.reddit.com/r/TwoXChromosomes/comments/lu29zn/i_refuse/', SelfPost),
+    ('https://www.reddit.com/gallery/lu93m7', Gallery),
+    ('https://i.imgur.com/bZx1SJQ.jpg', Direct),
+    ('https://i.imgur.com/BuzvZwb.gifv', Imgur),
+    ('https://imgur.com/BuzvZwb.GIFV', Imgur),
+    ('https://i.imgur.com/BuzvZwb', Imgur),
+    ('https://imgur.com/a/MkxAzeg', Imgur),
+    ('https://gfycat.com/concretecheerfulfinwhale', Gfycat),
+    ('https://thumbs.gfycat.com/ConcreteCheerfulFinwhale-size_restricted.gif', Direct),
+    ('https://www.erome.com/a/NWGw0F09', Erome),
+    ('https://redgifs.com/watch/courageousimpeccablecanvasback', Redgifs),
+    ('https://www.gifdeliverynetwork.com/repulsivefinishedandalusianhorse', Redgifs),
+    ('https://youtu.be/DevfjHOhuFc', Youtube),
+    ('https://m.youtube.com/watch?v=kr-FeojxzUM', Youtube),
+    ('https://i.redd.it/affyv0axd5k61', Direct),
+    ('https://www.pornhub.com/view_video.php?viewkey=ph5a2ee0461a8d0', PornHub),
+    ('https://IMGUR.com:443/a/MkxAzeg', Imgur),
+))
+def test_factory_lever_rules(test_submission_url: str, expected_class: BaseDownloader):
+    result = DownloadFactory.pull_lever(test_submission_url)
+    assert result is expected_class
+
+
+def test_factory_lever_registered_downloader(monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(BaseDownloader, 'registry', list(BaseDownloader.registry))
+
+    class TestDownloader(BaseDownloader):
+        url_rules = (
+            UrlRule(('example.com',), r'media/'),
+            UrlRule(('example.com',), r'.*\.png$', priority=2),
+        )
+
+        def find_resources(self, authenticator: Optional[SiteAuthenticator] = None) -> list:
+            return []
+
+    assert DownloadFactory.pull_lever('https://www.example.com/media/test') is TestDownloader
+    assert DownloadFactory.pull_lever('https://cdn.example.com/media/test') is TestDownloader
+    assert DownloadFactory.pull_lever('https://example.com/test.png') is TestDownloader
+    assert DownloadFactory.pull_lever('https://example.com/test.jpg') is Direct
+    assert DownloadFactory.pull_lever('https://example.org/test.png') is Direct
+    monkeypatch.undo()
+    assert DownloadFactory.pull_lever('https://example.com/test.png') is Direct
+
+
 @pytest.mark.parametrize('test_url', (
     'random.com',
     'bad',
@@ -70,6 +119,7 @@ def test_factory_lever_bad(test_url: str):
     ('www.test.com/test.png?test_value=random', 'test.com/test.png'),
     ('https://youtube.com/watch?v=Gv8Wz74FjVA', 'youtube.com/watch'),
     ('https://i.imgur.com/BuzvZwb.gifv', 'i.imgur.com/BuzvZwb.gifv'),
+    ('https://www.imgur.com/a/wwwtest', 'imgur.com/a/wwwtest'),
 ))
 def test_sanitise_url(test_url: str, expected: str):
     result = DownloadFactory.sanitise_url(test_url)
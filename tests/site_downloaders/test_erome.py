@@ -1,13 +1,23 @@
 #!/usr/bin/env python3
 # coding=utf-8
 
-from unittest.mock import MagicMock
+from unittest.mock import MagicMock, patch
 
 import pytest
 
 from bdfr.site_downloaders.erome import Erome
 
 
+def test_get_link_from_page():
+    test_page = '''<div class="media-group">
+    <img class="img-front lasyload" data-src="https://s1.erome.com/1.jpg">
+    <img class="img-back" src="https://s1.erome.com/thumb.jpg">
+    <video><source src="https://v1.erome.com/2.mp4" type="video/mp4"></video>
+    </div>'''
+    with patch.object(Erome, 'retrieve_url', return_value=MagicMock(text=test_page)):
+        results = Erome._get_links('https://www.erome.com/a/test')
+    assert results == {'https://s1.erome.com/1.jpg', 'https://v1.erome.com/2.mp4'}
+
 @pytest.mark.online
 @pytest.mark.parametrize(('test_url', 'expected_urls'), (
     ('https://www.erome.com/a/vqtPuLXh', (
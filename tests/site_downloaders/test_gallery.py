@@ -1,12 +1,71 @@
 #!/usr/bin/env python3
 # coding=utf-8
 
+from unittest.mock import MagicMock, patch
+
 import praw
 import pytest
 
+from bdfr.exceptions import SiteDownloaderError
 from bdfr.site_downloaders.gallery import Gallery
 
 
+def _metadata(mime_type: str, status: str = 'valid') -> dict:
+    return {'status': status, 'e': 'Image', 'm': mime_type, 's': {'u': 'https://preview.redd.it/test.jpg'}}
+
+
+@pytest.mark.parametrize(('test_metadata', 'expected'), (
+    (
+        {'a': _metadata('image/jpg'), 'b': _metadata('image/png')},
+        ['https://i.redd.it/a.jpg', 'https://i.redd.it/b.png'],
+    ),
+    (
+        {'b': _metadata('image/gif'), 'a': _metadata('image/jpeg')},
+        ['https://i.redd.it/a.jpeg', 'https://i.redd.it/b.gif'],
+    ),
+))
+def test_gallery_get_links_from_metadata(test_metadata: dict, expected: list[str]):
+    with patch('bdfr.site_downloaders.gallery.SessionManager.get_session') as mock_session:
+        results = Gallery._get_links([{'media_id': 'a'}, {'media_id': 'b'}], test_metadata)
+    assert results == expected
+    mock_session.assert_not_called()
+
+
+@pytest.mark.parametrize('test_metadata', (
+    None,
+    {},
+    {'b': _metadata('image/png', 'unprocessed')},
+    {'b': {'status': 'valid'}},
+))
+def test_gallery_get_links_probe_fallback(test_metadata: dict):
+    mock_session = MagicMock()
+    mock_session.head.side_effect = lambda url: MagicMock(status_code=200 if url.endswith('b.png') else 404)
+    test_metadata = dict(test_metadata or {}, a=_metadata('image/jpg'), c=_metadata('image/jpg', 'failed'))
+    with patch('bdfr.site_downloaders.gallery.SessionManager.get_session', return_value=mock_session):
+        results = Gallery._get_links([{'media_id': 'a'}, {'media_id': 'b'}, {'media_id': 'c'}], test_metadata)
+    assert results == ['https://i.redd.it/a.jpg', 'https://i.redd.it/b.png']
+    probed = {call.args[0] for call in mock_session.head.call_args_list}
+    assert 'https://i.redd.it/b.png' in probed
+    assert not any('/a.' in url for url in probed)
+
+
+def test_gallery_find_resources_crosspost():
+    test_submission = MagicMock(spec=['id', 'crosspost_parent_list'])
+    test_submission.crosspost_parent_list = [{
+        'gallery_data': {'items': [{'media_id': 'a'}]},
+        'media_metadata': {'a': _metadata('image/png')},
+    }]
+    results = Gallery(test_submission).find_resources()
+    assert [res.url for res in results] == ['https://i.redd.it/a.png']
+
+
+def test_gallery_find_resources_no_data():
+    test_submission = MagicMock(spec=['id', 'crosspost_parent_list'])
+    test_submission.crosspost_parent_list = []
+    with pytest.raises(SiteDownloaderError):
+        Gallery(test_submission).find_resources()
+
+
 @pytest.mark.online
 @pytest.mark.parametrize(('test_ids', 'expected'), (
     ([
@@ -1,14 +1,34 @@
 #!/usr/bin/env python3
 # coding=utf-8
 
-from unittest.mock import Mock
+from unittest.mock import MagicMock, Mock, patch
 
 import pytest
 
 from bdfr.resource import Resource
+from bdfr.exceptions import SiteDownloaderError
 from bdfr.site_downloaders.gfycat import Gfycat
 
 
+@pytest.mark.parametrize(('test_page', 'expected'), (
+    (
+        '<head><script type="application/ld+json" data-react-helmet="true">'
+        '{"video": {"contentUrl": "https://giant.gfycat.com/Test.mp4"}}</script></head>',
+        'https://giant.gfycat.com/Test.mp4',
+    ),
+    ('<head><script type="application/ld+json">{}</script></head>', None),
+    ('<head><script type="application/ld+json" data-react-helmet="true">{</script></head>', None),
+))
+def test_get_link_from_page(test_page: str, expected: str):
+    response = MagicMock(text=test_page, url='https://gfycat.com/test')
+    with patch.object(Gfycat, 'retrieve_url', return_value=response):
+        if expected:
+            assert Gfycat._get_link('https://gfycat.com/test') == expected
+        else:
+            with pytest.raises(SiteDownloaderError):
+                Gfycat._get_link('https://gfycat.com/test')
+
+
 @pytest.mark.online
 @pytest.mark.parametrize(('test_url', 'expected_url'), (
     ('https://gfycat.com/definitivecaninecrayfish', 'https://giant.gfycat.com/DefinitiveCanineCrayfish.mp4'),
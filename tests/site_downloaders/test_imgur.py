@@ -1,15 +1,159 @@
 #!/usr/bin/env python3
 # coding=utf-8
 
-from unittest.mock import Mock
+from pathlib import Path
+from unittest.mock import MagicMock, Mock, patch
 
 import pytest
 
 from bdfr.exceptions import SiteDownloaderError
+from bdfr.metadata_cache import MetadataCache
 from bdfr.resource import Resource
 from bdfr.site_downloaders.imgur import Imgur
 
 
+@pytest.fixture()
+def metadata_cache(tmp_path: Path) -> MetadataCache:
+    cache = MetadataCache(Path(tmp_path, 'metadata_cache.sqlite'))
+    MetadataCache.install(cache)
+    yield cache
+    MetadataCache.install(None)
+    cache.close()
+
+
+def _api_response(data: dict) -> MagicMock:
+    response = MagicMock()
+    response.json.return_value = {'data': data, 'success': True, 'status': 200}
+    return response
+
+
+@pytest.mark.parametrize(('test_url', 'expected'), (
+    ('https://imgur.com/a/xWZsDDP', ('album', 'xWZsDDP')),
+    ('https://m.imgur.com/a/py3RW0j', ('album', 'py3RW0j')),
+    ('https://imgur.com/a/some-album-title-xWZsDDP', ('album', 'xWZsDDP')),
+    ('https://imgur.com/gallery/IjJJdlC', ('gallery', 'IjJJdlC')),
+    ('https://www.imgur.com/gallery/IjJJdlC', ('gallery', 'IjJJdlC')),
+    ('https://imgur.com/t/funny/IjJJdlC', ('gallery', 'IjJJdlC')),
+    ('https://i.imgur.com/dLk3FGY.gifv', ('image', 'dLk3FGY')),
+    ('https://imgur.com/BuzvZwb', ('image', 'BuzvZwb')),
+    ('https://imgur.com/r/pics/BuzvZwb?', ('image', 'BuzvZwb')),
+))
+def test_parse_link(test_url: str, expected: tuple[str, str]):
+    assert Imgur._parse_link(test_url) == expected
+
+
+def test_parse_link_bad():
+    with pytest.raises(SiteDownloaderError):
+        Imgur._parse_link('https://www.example.com/test.png')
+
+
+@pytest.mark.parametrize(('test_url', 'expected'), (
+    ('https://i.imgur.com/dLk3FGY.gifv', 'https://i.imgur.com/dLk3FGY.mp4'),
+    ('https://imgur.com/BuzvZwb.gifv', 'https://i.imgur.com/BuzvZwb.mp4'),
+    ('https://i.imgur.com/BuzvZwb.PNG', 'https://i.imgur.com/BuzvZwb.png'),
+    ('https://imgur.com/a/xWZsDDP', None),
+    ('https://imgur.com/gallery/IjJJdlC', None),
+    ('https://www.example.com/test', None),
+))
+def test_get_direct_link_from_url(test_url: str, expected: str):
+    with patch('bdfr.site_downloaders.imgur.SessionManager.get_session') as mock_session:
+        assert Imgur._get_direct_link(test_url) == expected
+    mock_session.assert_not_called()
+
+
+@pytest.mark.parametrize(('test_status', 'test_content_type', 'expected'), (
+    (200, 'image/png', 'https://i.imgur.com/BuzvZwb.png'),
+    (200, 'image/jpeg; charset=binary', 'https://i.imgur.com/BuzvZwb.jpg'),
+    (200, 'image/gif', 'https://i.imgur.com/BuzvZwb.mp4'),
+    (200, 'text/html', None),
+    (302, 'text/html', None),
+))
+def test_get_direct_link_probe(test_status: int, test_content_type: str, expected: str):
+    mock_session = MagicMock()
+    mock_session.head.return_value = MagicMock(status_code=test_status, headers={'Content-Type': test_content_type})
+    with patch('bdfr.site_downloaders.imgur.SessionManager.get_session', return_value=mock_session):
+        assert Imgur._get_direct_link('https://imgur.com/BuzvZwb') == expected
+    mock_session.head.assert_called_once_with('https://i.imgur.com/BuzvZwb.jpg', allow_redirects=False)
+
+
+def test_get_direct_link_probe_cached(metadata_cache: MetadataCache):
+    mock_session = MagicMock()
+    mock_session.head.return_value = MagicMock(status_code=200, headers={'Content-Type': 'image/png'})
+    with patch('bdfr.site_downloaders.imgur.SessionManager.get_session', return_value=mock_session):
+        assert Imgur._get_direct_link('https://imgur.com/BuzvZwb') == 'https://i.imgur.com/BuzvZwb.png'
+        assert Imgur._get_direct_link('https://imgur.com/r/pics/BuzvZwb') == 'https://i.imgur.com/BuzvZwb.png'
+    mock_session.head.assert_called_once()
+
+
+def test_find_resources_direct_skips_page():
+    test_submission = MagicMock()
+    test_submission.url = 'https://i.imgur.com/dLk3FGY.gifv'
+    with patch.object(Imgur, 'retrieve_url') as mock_retrieve:
+        results = Imgur(test_submission).find_resources()
+    assert [res.url for res in results] == ['https://i.imgur.com/dLk3FGY.mp4']
+    mock_retrieve.assert_not_called()
+
+
+def test_get_data_from_page():
+    test_page = """<html><body><script type="text/javascript">var other = 1;</script>
+    <script type="text/javascript">(function(widgetFactory) {
+        widgetFactory.mergeConfig('gallery', {
+            image : {"hash": "test", "ext": ".png"},
+            group : {}
+        });
+    })</script></body></html>"""
+    with patch.object(Imgur, 'retrieve_url', return_value=MagicMock(text=test_page)):
+        assert Imgur._get_data('https://imgur.com/test') == {'hash': 'test', 'ext': '.png'}
+
+
+@pytest.mark.parametrize(('test_data', 'expected'), (
+    (
+        {'id': 'a', 'link': 'https://i.imgur.com/a.png', 'animated': False},
+        ['https://i.imgur.com/a.png'],
+    ),
+    (
+        {'id': 'a', 'link': 'https://i.imgur.com/a.gif', 'mp4': 'https://i.imgur.com/a.mp4', 'animated': True},
+        ['https://i.imgur.com/a.mp4'],
+    ),
+    (
+        {'id': 'album', 'is_album': True, 'images': [
+            {'id': 'a', 'link': 'https://i.imgur.com/a.jpg'},
+            {'id': 'b', 'link': 'https://i.imgur.com/b.png'},
+        ]},
+        ['https://i.imgur.com/a.jpg', 'https://i.imgur.com/b.png'],
+    ),
+))
+@pytest.mark.parametrize('test_url', ('https://imgur.com/gallery/test', 'https://www.imgur.com/gallery/test'))
+def test_find_resources_api(test_url: str, test_data: dict, expected: list[str]):
+    authenticator = MagicMock()
+    authenticator.imgur_authentication = 'test_client_id'
+    test_submission = MagicMock()
+    test_submission.url = test_url
+    with patch.object(Imgur, 'retrieve_url', return_value=_api_response(test_data)) as mock_retrieve:
+        results = Imgur(test_submission).find_resources(authenticator)
+    assert [res.url for res in results] == expected
+    mock_retrieve.assert_called_once_with(
+        'https://api.imgur.com/3/gallery/test',
+        headers={'Authorization': 'Client-ID test_client_id'},
+    )
+
+
+@pytest.mark.parametrize('test_data', ({'images': []}, 'test', None))
+def test_find_resources_api_bad_response(test_data):
+    with patch.object(Imgur, 'retrieve_url', return_value=_api_response(test_data)):
+        with pytest.raises(SiteDownloaderError):
+            Imgur._get_api_images('https://imgur.com/a/test', 'test_client_id')
+
+
+def test_get_api_images_cached(metadata_cache: MetadataCache):
+    test_data = {'id': 'test', 'images': [{'id': 'a', 'link': 'https://i.imgur.com/a.jpg'}]}
+    with patch.object(Imgur, 'retrieve_url', return_value=_api_response(test_data)) as mock_retrieve:
+        first = Imgur._get_api_images('https://imgur.com/a/test', 'test_client_id')
+        second = Imgur._get_api_images('https://imgur.com/a/title-test', 'test_client_id')
+    assert first == second == [{'id': 'a', 'link': 'https://i.imgur.com/a.jpg', 'mp4': None, 'animated': None}]
+    mock_retrieve.assert_called_once()
+
+
 @pytest.mark.online
 @pytest.mark.parametrize(('test_url', 'expected_gen_dict', 'expected_image_dict'), (
     (
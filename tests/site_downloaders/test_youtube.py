@@ -1,6 +1,7 @@
 #!/usr/bin/env python3
 # coding=utf-8
 
+from pathlib import Path
 from unittest.mock import MagicMock
 
 import pytest
@@ -16,14 +17,14 @@ from bdfr.site_downloaders.youtube import Youtube
     ('https://www.youtube.com/watch?v=uSm2VDgRIUs', 'f70b704b4b78b9bb5cd032bfc26e4971'),
     ('https://www.youtube.com/watch?v=GcI7nxQj7HA', '2bfdbf434ed284623e46f3bf52c36166'),
 ))
-def test_find_resources_good(test_url: str, expected_hash: str):
+def test_find_resources_good(test_url: str, expected_hash: str, tmp_path: Path):
     test_submission = MagicMock()
     test_submission.url = test_url
     downloader = Youtube(test_submission)
     resources = downloader.find_resources()
     assert len(resources) == 1
     assert isinstance(resources[0], Resource)
-    resources[0].download(120)
+    resources[0].download_to_file(tmp_path / 'test.part', 120)
     assert resources[0].hash.hexdigest() == expected_hash
 
 
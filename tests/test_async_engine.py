@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+# coding=utf-8
+
+import hashlib
+import json
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from bdfr.exceptions import BulkDownloaderException
+from bdfr.resource import PartialDownload, Resource
+from bdfr.video_resource import VideoResource
+
+aiohttp = pytest.importorskip('aiohttp')
+
+from bdfr.async_engine import AsyncDownloadEngine  # noqa: E402
+
+
+@pytest.fixture()
+def engine() -> AsyncDownloadEngine:
+    engine = AsyncDownloadEngine(10)
+    yield engine
+    engine.close()
+
+
+@pytest.mark.parametrize('test_path', (
+    '/test.png',
+    '/another/test.mp4',
+))
+def test_engine_download(test_path: str, local_http_server: str, engine: AsyncDownloadEngine):
+    test_resource = Resource(MagicMock(), local_http_server + test_path)
+    engine.submit(engine.download(test_resource, 120)).result()
+    assert test_resource.content == test_path.encode('utf-8')
+    assert test_resource.hash.hexdigest() == hashlib.md5(test_path.encode('utf-8')).hexdigest()
+
+
+def test_engine_download_many(local_http_server: str, engine: AsyncDownloadEngine):
+    test_resources = [Resource(MagicMock(), f'{local_http_server}/{i}.png') for i in range(50)]
+    futures = [engine.submit(engine.download(res, 120)) for res in test_resources]
+    [future.result() for future in futures]
+    assert all([res.content == f'/{i}.png'.encode('utf-8') for i, res in enumerate(test_resources)])
+
+
+def test_engine_download_unrecoverable(local_http_server: str, engine: AsyncDownloadEngine):
+    test_resource = Resource(MagicMock(), local_http_server + '/missing.png')
+    with pytest.raises(BulkDownloaderException):
+        engine.submit(engine.download(test_resource, 120)).result()
+
+
+def test_engine_skips_existing_content(engine: AsyncDownloadEngine):
+    test_resource = Resource(MagicMock(), 'https://www.example.com/test.txt')
+    test_resource.content = b'test'
+    engine.submit(engine.download(test_resource, 120)).result()
+    assert test_resource.hash.hexdigest() == hashlib.md5(b'test').hexdigest()
+
+
+def test_engine_download_to_file(local_http_server: str, engine: AsyncDownloadEngine, tmp_path: Path):
+    test_resource = Resource(MagicMock(), local_http_server + '/test.png')
+    test_path = Path(tmp_path, 'test.tmp')
+    engine.submit(engine.download_to_file(test_resource, test_path, 120)).result()
+    assert test_path.read_bytes() == b'/test.png'
+    assert test_resource.download_path == test_path
+    assert test_resource.content is None
+    assert test_resource.hash.hexdigest() == hashlib.md5(b'/test.png').hexdigest()
+
+
+def test_engine_download_video_to_file(engine: AsyncDownloadEngine, tmp_path: Path):
+    test_resource = VideoResource(MagicMock(), {'ext': 'mp4'}, {})
+    test_path = Path(tmp_path, 'test.tmp')
+    with patch.object(VideoResource, 'download_to_file') as mock_download:
+        engine.submit(engine.download_to_file(test_resource, test_path, 120)).result()
+    mock_download.assert_called_once_with(test_path, 120)
+
+
+def test_engine_download_to_file_resumes(local_http_server: str, engine: AsyncDownloadEngine, tmp_path: Path):
+    test_url = local_http_server + '/ranged/async.png'
+    test_path = Path(tmp_path, 'test.png.part')
+    test_path.write_bytes(b'X' * 8)
+    PartialDownload.get_metadata_path(test_path).write_text(json.dumps({'url': test_url, 'etag': '"test"'}))
+    test_resource = Resource(MagicMock(), test_url)
+    engine.submit(engine.download_to_file(test_resource, test_path, 120)).result()
+    expected = b'X' * 8 + b'/ranged/async.png'.rjust(17, b'0')[8:]
+    assert test_path.read_bytes() == expected
+    assert test_resource.hash.hexdigest() == hashlib.md5(expected).hexdigest()
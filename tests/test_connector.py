@@ -1,6 +1,7 @@
 #!/usr/bin/env python3
 # coding=utf-8
 
+import configparser
 from pathlib import Path
 from typing import Iterator
 from unittest.mock import MagicMock
@@ -12,8 +13,10 @@ import pytest
 from bdfr.configuration import Configuration
 from bdfr.connector import RedditConnector, RedditTypes
 from bdfr.download_filter import DownloadFilter
+from bdfr.duplicate_finder import DEFAULT_HASH_WORKERS
 from bdfr.exceptions import BulkDownloaderException
 from bdfr.file_name_formatter import FileNameFormatter
+from bdfr.resource import Resource
 from bdfr.site_authenticator import SiteAuthenticator
 
 
@@ -45,6 +48,111 @@ def assert_all_results_are_submissions(result_limit: int, results: list[Iterator
     return results
 
 
+@pytest.mark.parametrize(('test_workers', 'test_engine', 'test_config', 'expected'), (
+    (1, 'thread', {}, (1, 1, 1, 4)),
+    (1, 'asyncio', {}, (1, 100, 1, 4)),
+    (1, 'asyncio', {'fetch_workers': '300'}, (1, 300, 1, 4)),
+    (8, 'thread', {}, (8, 8, 1, 32)),
+    (8, 'thread', {'fetch_workers': '20', 'queue_size': '5'}, (8, 20, 1, 5)),
+    (1, 'thread', {'resolve_workers': '2', 'write_workers': '3'}, (2, 1, 3, 4)),
+))
+def test_read_config_pipeline_options(
+        test_workers: int,
+        test_engine: str,
+        test_config: dict,
+        expected: tuple[int, int, int, int],
+        downloader_mock: MagicMock,
+        tmp_path: Path,
+):
+    downloader_mock.args.workers = test_workers
+    downloader_mock.args.engine = test_engine
+    downloader_mock.cfg_parser = configparser.ConfigParser()
+    downloader_mock.cfg_parser.read_dict({'DEFAULT': test_config})
+    downloader_mock.config_location = Path(tmp_path, 'test_config.cfg')
+    RedditConnector.read_config(downloader_mock)
+    results = (
+        downloader_mock.args.resolve_workers,
+        downloader_mock.args.fetch_workers,
+        downloader_mock.args.write_workers,
+        downloader_mock.args.queue_size,
+    )
+    assert results == expected
+
+
+@pytest.mark.parametrize(('test_config', 'expected'), (
+    ({}, DEFAULT_HASH_WORKERS),
+    ({'hash_workers': '64'}, 64),
+))
+def test_read_config_hash_workers(test_config: dict, expected: int, downloader_mock: MagicMock, tmp_path: Path):
+    downloader_mock.args.workers = 1
+    downloader_mock.cfg_parser = configparser.ConfigParser()
+    downloader_mock.cfg_parser.read_dict({'DEFAULT': test_config})
+    downloader_mock.config_location = Path(tmp_path, 'test_config.cfg')
+    RedditConnector.read_config(downloader_mock)
+    assert downloader_mock.args.hash_workers == expected
+
+
+@pytest.mark.parametrize(('test_config', 'expected'), (
+    ({}, 2),
+    ({'video_workers': '0'}, 0),
+    ({'video_workers': '4'}, 4),
+))
+def test_read_config_video_workers(test_config: dict, expected: int, downloader_mock: MagicMock, tmp_path: Path):
+    downloader_mock.args.workers = 1
+    downloader_mock.cfg_parser = configparser.ConfigParser()
+    downloader_mock.cfg_parser.read_dict({'DEFAULT': test_config})
+    downloader_mock.config_location = Path(tmp_path, 'test_config.cfg')
+    RedditConnector.read_config(downloader_mock)
+    assert downloader_mock.args.video_workers == expected
+
+
+@pytest.mark.parametrize(('test_config', 'expected'), (
+    ({}, 'md5'),
+    ({'hash_algorithm': 'sha256'}, 'sha256'),
+    ({'hash_algorithm': ' BLAKE2B '}, 'blake2b'),
+))
+def test_read_config_hash_algorithm(
+        test_config: dict,
+        expected: str,
+        downloader_mock: MagicMock,
+        tmp_path: Path,
+        monkeypatch: pytest.MonkeyPatch,
+):
+    monkeypatch.setattr(Resource, 'hash_algorithm', 'md5')
+    downloader_mock.args.workers = 1
+    downloader_mock.cfg_parser = configparser.ConfigParser()
+    downloader_mock.cfg_parser.read_dict({'DEFAULT': test_config})
+    downloader_mock.config_location = Path(tmp_path, 'test_config.cfg')
+    RedditConnector.read_config(downloader_mock)
+    assert downloader_mock.args.hash_algorithm == expected
+    assert Resource.hash_algorithm == expected
+
+
+def test_read_config_hash_algorithm_bad(downloader_mock: MagicMock, tmp_path: Path):
+    downloader_mock.args.workers = 1
+    downloader_mock.cfg_parser = configparser.ConfigParser()
+    downloader_mock.cfg_parser.read_dict({'DEFAULT': {'hash_algorithm': 'crc32'}})
+    downloader_mock.config_location = Path(tmp_path, 'test_config.cfg')
+    with pytest.raises(BulkDownloaderException):
+        RedditConnector.read_config(downloader_mock)
+
+
+@pytest.mark.parametrize(('test_config', 'expected'), (
+    ({}, (20, 10, None)),
+    ({'pool_maxsize': '50', 'user_agent': 'test agent'}, (20, 50, 'test agent')),
+    ({'pool_connections': '5', 'blocked_cookie_domains': '.example.com, .test.com'}, (5, 10, None)),
+))
+def test_create_session_manager(test_config: dict, expected: tuple, downloader_mock: MagicMock):
+    downloader_mock.args.fetch_workers = 4
+    downloader_mock.args.resolve_workers = 4
+    downloader_mock.cfg_parser = configparser.ConfigParser()
+    downloader_mock.cfg_parser.read_dict({'DEFAULT': test_config})
+    result = RedditConnector.create_session_manager(downloader_mock)
+    assert (result.pool_connections, result.pool_maxsize, result.user_agent) == expected
+    if 'blocked_cookie_domains' in test_config:
+        assert result.session.cookies._policy.blocked_domains() == ('.example.com', '.test.com')
+
+
 def test_determine_directories(tmp_path: Path, downloader_mock: MagicMock):
     downloader_mock.args.directory = tmp_path / 'test'
     downloader_mock.config_directories.user_config_dir = tmp_path
@@ -125,9 +233,17 @@ def test_create_file_name_formatter_bad(test_file_scheme: str, test_folder_schem
         RedditConnector.create_file_name_formatter(downloader_mock)
 
 
-def test_create_authenticator(downloader_mock: MagicMock):
+@pytest.mark.parametrize(('test_config', 'expected'), (
+    ({}, None),
+    ({'imgur_client_id': ''}, None),
+    ({'imgur_client_id': 'test_id'}, 'test_id'),
+))
+def test_create_authenticator(test_config: dict, expected: str, downloader_mock: MagicMock):
+    downloader_mock.cfg_parser = configparser.ConfigParser()
+    downloader_mock.cfg_parser.read_dict({'DEFAULT': test_config})
     result = RedditConnector.create_authenticator(downloader_mock)
     assert isinstance(result, SiteAuthenticator)
+    assert result.imgur_authentication == expected
 
 
 @pytest.mark.online
@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+# coding=utf-8
+
+from pathlib import Path
+from unittest.mock import MagicMock
+
+import threading
+import time
+
+import pytest
+
+from bdfr.download_pipeline import DownloadPipeline, WriteResult
+from bdfr.exceptions import RetryDeferred
+from bdfr.host_scheduler import HostLimit, HostScheduler
+from bdfr.video_resource import VideoResource
+
+
+def make_submissions(test_ids: tuple[str]) -> list[MagicMock]:
+    out = []
+    for test_id in test_ids:
+        m = MagicMock()
+        m.id = test_id
+        out.append(m)
+    return out
+
+
+def make_pipeline(resource_count: int = 1, **kwargs) -> DownloadPipeline:
+    def resolve(submission: MagicMock) -> tuple[str, list[tuple[Path, MagicMock]]]:
+        return 'Test', [
+            (Path(f'{submission.id}_{i}'), MagicMock(url=f'https://example.com/{submission.id}_{i}'))
+            for i in range(resource_count)
+        ]
+
+    return DownloadPipeline(
+        MagicMock(return_value=True),
+        MagicMock(side_effect=resolve),
+        MagicMock(return_value=True),
+        MagicMock(return_value=WriteResult.WRITTEN),
+        **kwargs,
+    )
+
+
+@pytest.mark.parametrize(('test_ids', 'test_workers', 'expected_len'), (
+    (('aaaaaa',), 1, 1),
+    (('aaaaaa', 'bbbbbb', 'cccccc'), 2, 3),
+    (('aaaaaa', 'bbbbbb', 'aaaaaa'), 4, 2),
+    (tuple(f'{i:06}' for i in range(50)), 8, 50),
+))
+def test_pipeline_resolves_each_submission_once(test_ids: tuple[str], test_workers: int, expected_len: int):
+    test_pipeline = make_pipeline(resolve_workers=test_workers, fetch_workers=test_workers, queue_size=2)
+    test_pipeline.run([make_submissions(test_ids)])
+    assert test_pipeline.resolve_function.call_count == expected_len
+    assert test_pipeline.fetch_function.call_count == expected_len
+    assert test_pipeline.write_function.call_count == expected_len
+
+
+@pytest.mark.parametrize(('test_resource_count', 'test_workers'), (
+    (1, 1),
+    (4, 2),
+    (10, 8),
+))
+def test_pipeline_writes_every_resource(test_resource_count: int, test_workers: int):
+    test_pipeline = make_pipeline(test_resource_count, fetch_workers=test_workers, write_workers=2, queue_size=1)
+    test_pipeline.run([make_submissions(('aaaaaa', 'bbbbbb'))])
+    written = set([call.args[1] for call in test_pipeline.write_function.call_args_list])
+    assert len(written) == 2 * test_resource_count
+
+
+def test_pipeline_failed_fetch_skips_write():
+    test_pipeline = make_pipeline(3)
+    test_pipeline.fetch_function.return_value = False
+    test_pipeline.run([make_submissions(('aaaaaa',))])
+    assert test_pipeline.fetch_function.call_count == 1
+    assert test_pipeline.write_function.call_count == 0
+
+
+def test_pipeline_check_filters_submissions():
+    test_pipeline = make_pipeline()
+    test_pipeline.check_function.side_effect = lambda sub: sub.id != 'bbbbbb'
+    test_pipeline.run([make_submissions(('aaaaaa', 'bbbbbb', 'cccccc'))])
+    assert test_pipeline.resolve_function.call_count == 2
+
+
+def test_pipeline_submission_hook():
+    test_hook = MagicMock()
+    test_pipeline = make_pipeline(submission_hook=test_hook)
+    test_pipeline.check_function.return_value = False
+    test_pipeline.run([make_submissions(('aaaaaa', 'bbbbbb'))])
+    assert test_hook.call_count == 2
+    assert test_pipeline.resolve_function.call_count == 0
+
+
+def test_pipeline_completion_hook():
+    test_hook = MagicMock()
+    test_pipeline = make_pipeline(2, completion_hook=test_hook)
+    test_pipeline.fetch_function.side_effect = lambda sub, *_: sub.id != 'bbbbbb'
+    test_pipeline.resolve_function.side_effect = [
+        ('Test', [(Path('a'), MagicMock(url='https://example.com/a'))]),
+        ('Test', [(Path('b'), MagicMock(url='https://example.com/b'))]),
+        None,
+    ]
+    test_pipeline.run([make_submissions(('aaaaaa', 'bbbbbb', 'cccccc'))])
+    results = {call.args[0].id: (call.args[1], call.args[2]) for call in test_hook.call_args_list}
+    assert results == {'aaaaaa': ('Test', True), 'bbbbbb': ('Test', False), 'cccccc': (None, False)}
+
+
+@pytest.mark.parametrize(('test_result', 'expected_success'), (
+    (WriteResult.WRITTEN, True),
+    (WriteResult.DUPLICATE, True),
+    (WriteResult.FAILED, False),
+))
+def test_pipeline_write_result(test_result: WriteResult, expected_success: bool):
+    test_hook = MagicMock()
+    test_pipeline = make_pipeline(3, completion_hook=test_hook)
+    # Only the first resource of each submission has the result being tested
+    test_pipeline.write_function.side_effect = \
+        lambda sub, destination, res: test_result if str(destination).endswith('_0') else WriteResult.WRITTEN
+    test_pipeline.run([make_submissions(('aaaaaa', 'bbbbbb'))])
+    results = {call.args[0].id: call.args[2] for call in test_hook.call_args_list}
+    assert results == {'aaaaaa': expected_success, 'bbbbbb': expected_success}
+
+
+def test_pipeline_worker_exception_does_not_stop():
+    test_pipeline = make_pipeline(fetch_workers=2)
+    test_pipeline.fetch_function.side_effect = Exception
+    test_pipeline.run([make_submissions(('aaaaaa', 'bbbbbb'))])
+    assert test_pipeline.fetch_function.call_count == 2
+    assert test_pipeline.write_function.call_count == 0
+
+
+@pytest.mark.parametrize(('test_limit', 'test_workers'), (
+    (1, 4),
+    (2, 8),
+))
+def test_pipeline_host_limit(test_limit: int, test_workers: int):
+    active = []
+    peak = []
+    lock = threading.Lock()
+
+    def fetch(*_) -> bool:
+        with lock:
+            active.append(1)
+            peak.append(len(active))
+        time.sleep(0.01)
+        with lock:
+            active.pop()
+        return True
+
+    test_scheduler = HostScheduler({'example.com': HostLimit(test_limit)})
+    test_pipeline = make_pipeline(4, fetch_workers=test_workers, host_scheduler=test_scheduler)
+    test_pipeline.fetch_function.side_effect = fetch
+    test_pipeline.run([make_submissions(('aaaaaa', 'bbbbbb'))])
+    assert test_pipeline.write_function.call_count == 8
+    assert max(peak) <= test_limit
+
+
+def test_pipeline_interleaves_hosts():
+    finished = []
+
+    def resolve(submission: MagicMock) -> tuple[str, list[tuple[Path, MagicMock]]]:
+        return 'Test', [(Path(submission.id), MagicMock(url=f'https://{submission.id[0]}.com/{submission.id}'))]
+
+    def fetch(submission: MagicMock, *_) -> bool:
+        if submission.id.startswith('s'):
+            time.sleep(0.05)
+        finished.append(submission.id)
+        return True
+
+    test_scheduler = HostScheduler({'s.com': HostLimit(1), 'f.com': HostLimit(4)})
+    test_pipeline = make_pipeline(fetch_workers=4, host_scheduler=test_scheduler, queue_size=20)
+    test_pipeline.resolve_function.side_effect = resolve
+    test_pipeline.fetch_function.side_effect = fetch
+    test_ids = [f's{i:05}' for i in range(5)] + [f'f{i:05}' for i in range(10)]
+    test_pipeline.run([make_submissions(test_ids)])
+    assert len(finished) == 15
+    # The slow host is limited to one connection, so the fast host's resources should not wait behind it
+    assert all(sub_id.startswith('s') for sub_id in finished[-4:])
+
+
+@pytest.mark.parametrize(('test_resource_count', 'test_workers'), (
+    (1, 1),
+    (5, 2),
+))
+def test_pipeline_requeues_deferred_fetch(test_resource_count: int, test_workers: int):
+    deferred = set()
+
+    def fetch(_, __, destination: Path, ___) -> bool:
+        if destination not in deferred:
+            deferred.add(destination)
+            raise RetryDeferred('test', 0.01)
+        return True
+
+    test_pipeline = make_pipeline(test_resource_count, fetch_workers=test_workers, queue_size=1)
+    test_pipeline.fetch_function.side_effect = fetch
+    test_pipeline.run([make_submissions(('aaaaaa', 'bbbbbb'))])
+    assert test_pipeline.fetch_function.call_count == 4 * test_resource_count
+    assert test_pipeline.write_function.call_count == 2 * test_resource_count
+
+
+@pytest.mark.parametrize(('test_ids', 'test_fetch_workers'), (
+    (('aaaaaa',), 1),
+    (tuple(f'{i:06}' for i in range(50)), 20),
+))
+def test_pipeline_async_fetch(test_ids: tuple[str], test_fetch_workers: int):
+    pytest.importorskip('aiohttp')
+    from bdfr.async_engine import AsyncDownloadEngine
+    test_engine = AsyncDownloadEngine()
+    fetched = []
+
+    async def fetch(submission: MagicMock, _, __, ___) -> bool:
+        fetched.append(submission.id)
+        return submission.id != test_ids[0]
+
+    test_pipeline = make_pipeline(fetch_workers=test_fetch_workers, fetch_engine=test_engine)
+    test_pipeline.fetch_function = fetch
+    try:
+        test_pipeline.run([make_submissions(test_ids)])
+    finally:
+        test_engine.close()
+    assert sorted(fetched) == sorted(test_ids)
+    assert test_pipeline.write_function.call_count == len(test_ids) - 1
+
+
+def test_pipeline_async_fetch_submit_error():
+    test_engine = MagicMock()
+    test_engine.submit.side_effect = Exception
+    test_pipeline = make_pipeline(fetch_workers=1, fetch_engine=test_engine, queue_size=1)
+    test_pipeline.fetch_function = MagicMock()
+    test_pipeline.run([make_submissions(('aaaaaa', 'bbbbbb', 'cccccc'))])
+    assert test_engine.submit.call_count == 3
+    assert test_pipeline.write_function.call_count == 0
+
+
+def test_pipeline_video_lane():
+    images_written = threading.Event()
+    image_count = 5
+
+    def resolve(submission: MagicMock) -> tuple[str, list[tuple[Path, MagicMock]]]:
+        if submission.id == 'video':
+            submission.url = 'https://www.youtube.com/watch?v=test'
+            return 'Youtube', [(Path('video'), VideoResource(submission, {'ext': 'mp4'}, {}))]
+        return 'Test', [(Path(submission.id), MagicMock(url=f'https://example.com/{submission.id}'))]
+
+    def write(submission: MagicMock, *_) -> WriteResult:
+        if len([call for call in test_pipeline.write_function.call_args_list if call.args[0].id != 'video']) == \
+                image_count:
+            images_written.set()
+        return WriteResult.WRITTEN
+
+    def fetch_video(*_) -> bool:
+        # The video is only finished once every image has been written, which needs the fetch worker to be free
+        return images_written.wait(5)
+
+    test_pipeline = make_pipeline(fetch_workers=1, video_fetch_function=MagicMock(side_effect=fetch_video))
+    test_pipeline.resolve_function.side_effect = resolve
+    test_pipeline.write_function.side_effect = write
+    test_pipeline.run([make_submissions(('video',) + tuple(f'{i:06}' for i in range(image_count)))])
+    assert images_written.is_set()
+    assert test_pipeline.video_fetch_function.call_count == 1
+    assert test_pipeline.fetch_function.call_count == image_count
+    assert test_pipeline.write_function.call_count == image_count + 1
@@ -3,7 +3,11 @@
 
 import os
 import re
+import threading
+import weakref
+from functools import partial
 from pathlib import Path
+from typing import Optional
 from unittest.mock import MagicMock, patch
 
 import praw.models
@@ -12,7 +16,13 @@ import pytest
 from bdfr.__main__ import setup_logging
 from bdfr.configuration import Configuration
 from bdfr.connector import RedditConnector
+from bdfr.download_pipeline import DownloadPipeline, WriteResult
 from bdfr.downloader import RedditDownloader
+from bdfr.duplicate_finder import DuplicateFinder
+from bdfr.exceptions import NotADownloadableLinkError, RetryDeferred
+from bdfr.file_system_index import FileSystemIndex
+from bdfr.resource import PartialDownload, Resource
+from bdfr.state_database import StateDatabase
 
 
 @pytest.fixture()
@@ -29,6 +39,26 @@ def downloader_mock(args: Configuration):
     downloader_mock._sanitise_subreddit_name = RedditConnector.sanitise_subreddit_name
     downloader_mock._split_args_input = RedditConnector.split_args_input
     downloader_mock.master_hash_list = {}
+    downloader_mock.hash_lock = threading.Lock()
+    downloader_mock.pending_hashes = {}
+    downloader_mock.pending_destinations = set()
+    downloader_mock.partial_files = weakref.WeakValueDictionary()
+    downloader_mock.state_database = None
+    downloader_mock.hash_cache = None
+    downloader_mock.duplicate_finder = None
+    downloader_mock.file_system_index = FileSystemIndex()
+    downloader_mock.downloaded_post_ids = set()
+    for stage in (
+            '_check_submission',
+            '_resolve_submission',
+            '_fetch_resource',
+            '_write_resource',
+            '_record_submission',
+            '_record_resource',
+            '_get_partial_file',
+            '_reuse_stored_file',
+    ):
+        setattr(downloader_mock, stage, partial(getattr(RedditDownloader, stage), downloader_mock))
     return downloader_mock
 
 
@@ -63,6 +93,84 @@ def test_excluded_ids(
     assert mock_function.call_count == expected_len
 
 
+@pytest.mark.parametrize(('test_skip_existing_ids', 'expected'), (
+    (True, {'aaaaaa', 'bbbbbb'}),
+    (False, set()),
+))
+def test_scan_downloaded_post_ids(
+        test_skip_existing_ids: bool,
+        expected: set[str],
+        downloader_mock: MagicMock,
+        tmp_path: Path,
+):
+    downloader_mock.args.skip_existing_ids = test_skip_existing_ids
+    downloader_mock.download_directory = tmp_path
+    downloader_mock.args.file_scheme = '{REDDITOR}_{TITLE}_{POSTID}'
+    downloader_mock.args.folder_scheme = '{SUBREDDIT}'
+    downloader_mock.file_name_formatter = RedditConnector.create_file_name_formatter(downloader_mock)
+    Path(tmp_path, 'test').mkdir()
+    for file_name in (
+            'person_title_aaaaaa.png',
+            'person_title_bbbbbb_1.jpg',
+            'person_title_cccccc.mp4.part',
+            'person_title_dddddd.json',
+            'unrelated.txt',
+    ):
+        Path(tmp_path, 'test', file_name).touch()
+    results = RedditDownloader.scan_downloaded_post_ids(downloader_mock)
+    assert results == expected
+
+
+def test_scan_downloaded_post_ids_without_post_id(downloader_mock: MagicMock, tmp_path: Path):
+    downloader_mock.args.skip_existing_ids = True
+    downloader_mock.download_directory = tmp_path
+    downloader_mock.args.file_scheme = '{REDDITOR}_{TITLE}'
+    downloader_mock.args.folder_scheme = ''
+    downloader_mock.file_name_formatter = RedditConnector.create_file_name_formatter(downloader_mock)
+    Path(tmp_path, 'person_title_aaaaaa.png').touch()
+    with patch('os.walk') as mock_walk:
+        assert RedditDownloader.scan_downloaded_post_ids(downloader_mock) == set()
+    mock_walk.assert_not_called()
+
+
+@pytest.mark.parametrize(('test_state_database', 'test_outcome', 'test_file_missing', 'expected'), (
+    (False, None, False, False),
+    (True, None, False, False),
+    (True, 'downloaded', False, False),
+    (True, 'downloaded', True, True),
+    (True, 'failed', False, True),
+))
+def test_check_submission_downloaded_post_id(
+        test_state_database: bool,
+        test_outcome: Optional[str],
+        test_file_missing: bool,
+        expected: bool,
+        downloader_mock: MagicMock,
+        tmp_path: Path,
+):
+    downloader_mock.excluded_submission_ids = set()
+    downloader_mock.args.skip_subreddit = set()
+    downloader_mock.download_filter.check_url.return_value = True
+    downloader_mock.downloaded_post_ids = {'aaaaaa'}
+    if test_state_database:
+        downloader_mock.state_database = StateDatabase(Path(tmp_path, 'state.sqlite'))
+        if test_file_missing:
+            downloader_mock.state_database.record_resource(
+                'aaaaaa', 'https://example.com/test.png', 'hash', Path(tmp_path, 'missing.png'))
+        if test_outcome:
+            downloader_mock.state_database.record_submission('aaaaaa', test_outcome, 'Direct')
+    test_submission = _make_test_submission()
+    test_submission.__class__ = praw.models.Submission
+    try:
+        with patch('bdfr.site_downloaders.download_factory.DownloadFactory.pull_lever') as mock_function:
+            mock_function.side_effect = NotADownloadableLinkError('test')
+            RedditDownloader._download_submission(downloader_mock, test_submission)
+    finally:
+        if downloader_mock.state_database:
+            downloader_mock.state_database.close()
+    assert mock_function.called == expected
+
+
 @pytest.mark.online
 @pytest.mark.reddit
 @pytest.mark.parametrize('test_submission_id', (
@@ -122,11 +230,6 @@ def test_file_creation_date(
         assert file_stats.st_mtime == test_creation_date
 
 
-def test_search_existing_files():
-    results = RedditDownloader.scan_existing_files(Path('.'))
-    assert len(results.keys()) != 0
-
-
 @pytest.mark.online
 @pytest.mark.reddit
 @pytest.mark.parametrize(('test_submission_id', 'test_hash'), (
@@ -200,3 +303,376 @@ def test_download_submission(
     RedditDownloader._download_submission(downloader_mock, submission)
     folder_contents = list(tmp_path.iterdir())
     assert len(folder_contents) == expected_files_len
+
+
+def _make_test_submission() -> MagicMock:
+    test_submission = MagicMock()
+    test_submission.id = 'aaaaaa'
+    test_submission.created_utc = 1621204841.0
+    return test_submission
+
+
+def test_download_submission_state_database(downloader_mock: MagicMock, local_http_server: str, tmp_path: Path):
+    downloader_mock.state_database = StateDatabase(Path(tmp_path, 'state.sqlite'))
+    downloader_mock.excluded_submission_ids = []
+    downloader_mock.args.skip_subreddit = []
+    test_submission = _make_test_submission()
+    test_submission.__class__ = praw.models.Submission
+    destination = Path(tmp_path, 'test.png')
+    downloader_mock._resolve_submission = MagicMock(
+        return_value=('Direct', [(destination, Resource(test_submission, local_http_server + '/test.png'))]))
+    RedditDownloader._download_submission(downloader_mock, test_submission)
+    assert destination.exists()
+    assert downloader_mock.state_database.is_complete('aaaaaa')
+    assert not RedditDownloader._check_submission(downloader_mock, test_submission)
+    destination.unlink()
+    assert RedditDownloader._check_submission(downloader_mock, test_submission)
+    downloader_mock.state_database.close()
+
+
+def test_download_submission_state_database_failure(
+        downloader_mock: MagicMock,
+        local_http_server: str,
+        tmp_path: Path,
+):
+    downloader_mock.state_database = StateDatabase(Path(tmp_path, 'state.sqlite'))
+    downloader_mock.excluded_submission_ids = []
+    downloader_mock.args.skip_subreddit = []
+    test_submission = _make_test_submission()
+    test_submission.__class__ = praw.models.Submission
+    destination = Path(tmp_path, 'test.png')
+    downloader_mock._resolve_submission = MagicMock(
+        return_value=('Direct', [(destination, Resource(test_submission, local_http_server + '/missing.png'))]))
+    RedditDownloader._download_submission(downloader_mock, test_submission)
+    assert not downloader_mock.state_database.is_complete('aaaaaa')
+    downloader_mock.state_database.close()
+
+
+@pytest.mark.parametrize(('test_no_dupes', 'test_hard_links'), (
+    (True, False),
+    (False, True),
+))
+@pytest.mark.parametrize('test_pipeline', (False, True))
+def test_download_submission_duplicate_recorded_complete(
+        test_no_dupes: bool,
+        test_hard_links: bool,
+        test_pipeline: bool,
+        downloader_mock: MagicMock,
+        local_http_server: str,
+        tmp_path: Path,
+):
+    downloader_mock.args.no_dupes = test_no_dupes
+    downloader_mock.args.make_hard_links = test_hard_links
+    downloader_mock.args.hash_algorithm = 'md5'
+    downloader_mock.state_database = StateDatabase(Path(tmp_path, 'state.sqlite'))
+    downloader_mock.excluded_submission_ids = []
+    downloader_mock.args.skip_subreddit = []
+    test_submissions = []
+    for test_id in ('aaaaaa', 'bbbbbb'):
+        test_submission = _make_test_submission()
+        test_submission.id = test_id
+        test_submission.__class__ = praw.models.Submission
+        test_submissions.append(test_submission)
+
+    def resolve(submission: MagicMock) -> tuple[str, list[tuple[Path, Resource]]]:
+        test_resource = Resource(submission, local_http_server + '/test.png')
+        return 'Direct', [(Path(tmp_path, f'{submission.id}.png'), test_resource)]
+
+    downloader_mock._resolve_submission = MagicMock(side_effect=resolve)
+    try:
+        if test_pipeline:
+            DownloadPipeline(
+                downloader_mock._check_submission,
+                downloader_mock._resolve_submission,
+                downloader_mock._fetch_resource,
+                downloader_mock._write_resource,
+                completion_hook=downloader_mock._record_submission,
+            ).run([test_submissions])
+        else:
+            for test_submission in test_submissions:
+                RedditDownloader._download_submission(downloader_mock, test_submission)
+        # The duplicate was skipped or linked as asked, so neither submission is downloaded again
+        for test_submission in test_submissions:
+            assert downloader_mock.state_database.is_complete(test_submission.id)
+            assert not RedditDownloader._check_submission(downloader_mock, test_submission)
+    finally:
+        downloader_mock.state_database.close()
+    assert len(list(tmp_path.glob('*.png'))) == (2 if test_hard_links else 1)
+
+
+@pytest.mark.parametrize('test_path', (
+    '/test.png',
+    '/another/test.mp4',
+))
+def test_fetch_and_write_resource_streamed(
+        test_path: str,
+        downloader_mock: MagicMock,
+        local_http_server: str,
+        tmp_path: Path,
+):
+    test_submission = _make_test_submission()
+    test_resource = Resource(test_submission, local_http_server + test_path)
+    destination = Path(tmp_path, 'sub', 'test' + test_resource.extension)
+    assert RedditDownloader._fetch_resource(downloader_mock, test_submission, 'Direct', destination, test_resource)
+    assert RedditDownloader._write_resource(downloader_mock, test_submission, destination, test_resource) \
+        is WriteResult.WRITTEN
+    assert destination.read_bytes() == test_path.encode('utf-8')
+    assert test_resource.download_path is None
+    assert list(Path(tmp_path, 'sub').iterdir()) == [destination]
+    assert downloader_mock.master_hash_list[test_resource.hash.hexdigest()] == destination
+
+
+def test_get_partial_file_reserved(downloader_mock: MagicMock, tmp_path: Path):
+    test_submission = _make_test_submission()
+    destination = Path(tmp_path, 'sub', 'test.png')
+    first = Resource(test_submission, 'https://example.com/first.png')
+    second = Resource(test_submission, 'https://example.com/second.png')
+    first_partial = RedditDownloader._get_partial_file(downloader_mock, destination, first)
+    second_partial = RedditDownloader._get_partial_file(downloader_mock, destination, second)
+    assert first_partial == Path(tmp_path, 'sub', 'test.png.part')
+    assert second_partial == Path(tmp_path, 'sub', 'test.png.1.part')
+    assert first.download_path == first_partial
+    assert RedditDownloader._get_partial_file(downloader_mock, destination, first) == first_partial
+    # Once the first resource is done with its partial file, it can be given out again
+    first.discard_download()
+    third = Resource(test_submission, 'https://example.com/third.png')
+    assert RedditDownloader._get_partial_file(downloader_mock, destination, third) == first_partial
+
+
+def test_fetch_resource_same_destination(downloader_mock: MagicMock, local_http_server: str, tmp_path: Path):
+    test_submission = _make_test_submission()
+    destination = Path(tmp_path, 'sub', 'test.png')
+    test_resources = [
+        Resource(test_submission, local_http_server + test_path) for test_path in ('/test.png', '/other/test.png')]
+    for test_resource in test_resources:
+        assert RedditDownloader._fetch_resource(
+            downloader_mock, test_submission, 'Direct', destination, test_resource)
+    assert test_resources[0].download_path.read_bytes() == b'/test.png'
+    assert test_resources[1].download_path.read_bytes() == b'/other/test.png'
+    for test_resource in test_resources:
+        assert RedditDownloader._write_resource(downloader_mock, test_submission, destination, test_resource) \
+            is WriteResult.WRITTEN
+    assert destination.read_bytes() == b'/test.png'
+    assert list(Path(tmp_path, 'sub').iterdir()) == [destination]
+
+
+def test_fetch_resource_failure_removes_temporary_file(
+        downloader_mock: MagicMock,
+        local_http_server: str,
+        tmp_path: Path,
+):
+    test_submission = _make_test_submission()
+    test_resource = Resource(test_submission, local_http_server + '/missing.png')
+    destination = Path(tmp_path, 'sub', 'test.png')
+    assert not RedditDownloader._fetch_resource(
+        downloader_mock, test_submission, 'Direct', destination, test_resource)
+    assert list(Path(tmp_path, 'sub').iterdir()) == []
+
+
+@pytest.mark.parametrize(('test_path', 'test_metadata', 'expected_kept'), (
+    ('/unavailable/test.png', True, True),
+    ('/unavailable/test.png', False, False),
+    ('/missing/test.png', True, False),
+))
+def test_fetch_resource_failure_keeps_resumable_file(
+        test_path: str,
+        test_metadata: bool,
+        expected_kept: bool,
+        downloader_mock: MagicMock,
+        local_http_server: str,
+        tmp_path: Path,
+):
+    downloader_mock.args.max_wait_time = 0
+    test_submission = _make_test_submission()
+    test_resource = Resource(test_submission, local_http_server + test_path)
+    destination = Path(tmp_path, 'sub', 'test.png')
+    partial_file = Path(tmp_path, 'sub', 'test.png.part')
+    partial_file.parent.mkdir()
+    partial_file.write_bytes(b'test')
+    if test_metadata:
+        PartialDownload.get_metadata_path(partial_file).write_text('{}')
+    assert not RedditDownloader._fetch_resource(downloader_mock, test_submission, 'Direct', destination, test_resource)
+    assert partial_file.exists() == expected_kept
+
+
+def test_fetch_resource_deferred_reuses_temporary_file(
+        downloader_mock: MagicMock,
+        local_http_server: str,
+        tmp_path: Path,
+):
+    test_submission = _make_test_submission()
+    test_resource = Resource(test_submission, local_http_server + '/flaky/deferred_fetch.png')
+    destination = Path(tmp_path, 'sub', 'test.png')
+    with pytest.raises(RetryDeferred):
+        RedditDownloader._fetch_resource(downloader_mock, test_submission, 'Direct', destination, test_resource, True)
+    temporary_file = test_resource.download_path
+    assert RedditDownloader._fetch_resource(
+        downloader_mock, test_submission, 'Direct', destination, test_resource, True)
+    assert test_resource.download_path == temporary_file
+    assert list(Path(tmp_path, 'sub').iterdir()) == [temporary_file]
+
+
+@pytest.mark.parametrize(('test_no_dupes', 'test_hard_links', 'expected_written', 'expected_linked'), (
+    (False, False, True, False),
+    (True, False, False, False),
+    (False, True, False, True),
+))
+def test_fetch_resource_reuses_stored_file(
+        test_no_dupes: bool,
+        test_hard_links: bool,
+        expected_written: bool,
+        expected_linked: bool,
+        downloader_mock: MagicMock,
+        local_http_server: str,
+        tmp_path: Path,
+):
+    downloader_mock.args.hash_algorithm = 'md5'
+    downloader_mock.state_database = StateDatabase(Path(tmp_path, 'state.sqlite'))
+    test_submission = _make_test_submission()
+    first_destination = Path(tmp_path, 'first', 'test.png')
+    test_resource = Resource(test_submission, local_http_server + '/test.png')
+    assert RedditDownloader._fetch_resource(
+        downloader_mock, test_submission, 'Direct', first_destination, test_resource)
+    assert RedditDownloader._write_resource(downloader_mock, test_submission, first_destination, test_resource) \
+        is WriteResult.WRITTEN
+    expected_hash = test_resource.hash.hexdigest()
+
+    # A later run starts without the hashes of the files already written
+    downloader_mock.master_hash_list = {}
+    downloader_mock.args.no_dupes = test_no_dupes
+    downloader_mock.args.make_hard_links = test_hard_links
+    destination = Path(tmp_path, 'second', 'test.png')
+    test_resource = Resource(test_submission, local_http_server + '/test.png')
+    try:
+        with patch.object(Resource, '_fetch_to_file') as mock_fetch:
+            assert RedditDownloader._fetch_resource(
+                downloader_mock, test_submission, 'Direct', destination, test_resource)
+            RedditDownloader._write_resource(downloader_mock, test_submission, destination, test_resource)
+    finally:
+        downloader_mock.state_database.close()
+    mock_fetch.assert_not_called()
+    assert test_resource.hash.hexdigest() == expected_hash
+    assert destination.exists() == (expected_written or expected_linked)
+    if destination.exists():
+        assert destination.read_bytes() == first_destination.read_bytes()
+        assert destination.samefile(first_destination) == expected_linked
+    assert not Path(tmp_path, 'second', 'test.png.part').exists()
+
+
+def test_fetch_resource_stored_file_changed(downloader_mock: MagicMock, local_http_server: str, tmp_path: Path):
+    downloader_mock.args.hash_algorithm = 'md5'
+    downloader_mock.state_database = StateDatabase(Path(tmp_path, 'state.sqlite'))
+    test_submission = _make_test_submission()
+    stored_path = Path(tmp_path, 'stored.png')
+    stored_path.write_bytes(b'changed')
+    downloader_mock.state_database.record_file(local_http_server + '/test.png', 'hash', 'md5', stored_path, 4)
+    test_resource = Resource(test_submission, local_http_server + '/test.png')
+    destination = Path(tmp_path, 'sub', 'test.png')
+    try:
+        assert RedditDownloader._fetch_resource(downloader_mock, test_submission, 'Direct', destination, test_resource)
+    finally:
+        downloader_mock.state_database.close()
+    assert test_resource.hash.hexdigest() != 'hash'
+    assert test_resource.download_path.read_bytes() != b'changed'
+
+
+@patch('bdfr.downloader.os.replace')
+def test_write_resource_failure_removes_temporary_file(
+        mock_replace: MagicMock,
+        downloader_mock: MagicMock,
+        local_http_server: str,
+        tmp_path: Path,
+):
+    mock_replace.side_effect = OSError
+    test_submission = _make_test_submission()
+    test_resource = Resource(test_submission, local_http_server + '/test.png')
+    destination = Path(tmp_path, 'sub', 'test.png')
+    assert RedditDownloader._fetch_resource(downloader_mock, test_submission, 'Direct', destination, test_resource)
+    assert RedditDownloader._write_resource(downloader_mock, test_submission, destination, test_resource) \
+        is WriteResult.FAILED
+    assert list(Path(tmp_path, 'sub').iterdir()) == []
+
+
+def test_write_resource_duplicate_removes_temporary_file(
+        downloader_mock: MagicMock,
+        local_http_server: str,
+        tmp_path: Path,
+):
+    downloader_mock.args.no_dupes = True
+    test_submission = _make_test_submission()
+    test_resource = Resource(test_submission, local_http_server + '/test.png')
+    destination = Path(tmp_path, 'sub', 'test.png')
+    assert RedditDownloader._fetch_resource(downloader_mock, test_submission, 'Direct', destination, test_resource)
+    downloader_mock.master_hash_list[test_resource.hash.hexdigest()] = Path(tmp_path, 'other.png')
+    assert RedditDownloader._write_resource(downloader_mock, test_submission, destination, test_resource) \
+        is WriteResult.DUPLICATE
+    assert list(Path(tmp_path, 'sub').iterdir()) == []
+
+
+def test_write_resource_existing_duplicate_found(
+        downloader_mock: MagicMock,
+        local_http_server: str,
+        tmp_path: Path,
+):
+    downloader_mock.args.no_dupes = True
+    existing = Path(tmp_path, 'existing', 'test.png')
+    existing.parent.mkdir()
+    existing.write_text('/existing_duplicate.png')
+    downloader_mock.duplicate_finder = DuplicateFinder(workers=2)
+    downloader_mock.master_hash_list = downloader_mock.duplicate_finder.scan(Path(tmp_path, 'existing'))
+    downloader_mock._find_existing_duplicate = partial(RedditDownloader._find_existing_duplicate, downloader_mock)
+    test_submission = _make_test_submission()
+    test_resource = Resource(test_submission, local_http_server + '/existing_duplicate.png')
+    destination = Path(tmp_path, 'sub', 'test.png')
+    assert RedditDownloader._fetch_resource(downloader_mock, test_submission, 'Direct', destination, test_resource)
+    assert RedditDownloader._write_resource(downloader_mock, test_submission, destination, test_resource) \
+        is WriteResult.DUPLICATE
+    assert downloader_mock.master_hash_list == {test_resource.hash.hexdigest(): existing.resolve()}
+    assert list(Path(tmp_path, 'sub').iterdir()) == []
+
+
+@pytest.mark.parametrize(('test_no_dupes', 'expected_files'), (
+    (True, 1),
+    (False, 20),
+))
+def test_write_resource_concurrently(
+        test_no_dupes: bool,
+        expected_files: int,
+        downloader_mock: MagicMock,
+        tmp_path: Path,
+):
+    downloader_mock.args.no_dupes = test_no_dupes
+    test_submission = _make_test_submission()
+    test_resources = []
+    for i in range(20):
+        test_resource = Resource(test_submission, f'https://www.example.com/{i}.png')
+        test_resource.content = b'test'
+        test_resource.create_hash()
+        test_resources.append((Path(tmp_path, f'{i}.png'), test_resource))
+    threads = [threading.Thread(
+        target=RedditDownloader._write_resource,
+        args=(downloader_mock, test_submission, destination, res),
+    ) for destination, res in test_resources]
+    [thread.start() for thread in threads]
+    [thread.join() for thread in threads]
+    assert len(list(tmp_path.iterdir())) == expected_files
+    assert downloader_mock.pending_hashes == {}
+    assert downloader_mock.pending_destinations == set()
+
+
+def test_write_resource_recorded_in_index(downloader_mock: MagicMock, tmp_path: Path):
+    test_submission = _make_test_submission()
+    test_resource = Resource(test_submission, 'https://www.example.com/test.png')
+    test_resource.content = b'test'
+    test_resource.create_hash()
+    destination = Path(tmp_path, 'sub', 'test.png')
+    assert not downloader_mock.file_system_index.exists(destination)
+    assert RedditDownloader._write_resource(downloader_mock, test_submission, destination, test_resource) \
+        is WriteResult.WRITTEN
+    assert downloader_mock.file_system_index.exists(destination)
+    # The same file from another submission is found without asking the file system
+    with patch('pathlib.Path.exists') as mock_exists:
+        test_resource.content = b'test'
+        assert RedditDownloader._write_resource(downloader_mock, test_submission, destination, test_resource) \
+            is WriteResult.WRITTEN
+    mock_exists.assert_not_called()
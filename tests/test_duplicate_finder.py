@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+# coding=utf-8
+
+import hashlib
+import logging
+import os
+import threading
+from pathlib import Path
+from typing import Iterator
+from unittest.mock import patch
+
+import pytest
+
+from bdfr.duplicate_finder import DuplicateFinder
+from bdfr.hash_cache import HashCache
+
+
+def _write_files(directory: Path, files: dict[str, bytes]):
+    for name, content in files.items():
+        test_file = Path(directory, name)
+        test_file.parent.mkdir(parents=True, exist_ok=True)
+        test_file.write_bytes(content)
+
+
+@pytest.fixture()
+def hash_cache(tmp_path: Path) -> HashCache:
+    cache = HashCache(Path(tmp_path, 'hash_cache.sqlite'))
+    yield cache
+    cache.close()
+
+
+def test_scan_same_size_duplicates(tmp_path: Path):
+    _write_files(tmp_path, {'a': b'test', 'sub/b': b'test', 'c': b'other content'})
+    results = DuplicateFinder(workers=2).scan(tmp_path)
+    assert list(results.keys()) == [hashlib.md5(b'test').hexdigest()]
+    assert results[hashlib.md5(b'test').hexdigest()] in (Path(tmp_path, 'a'), Path(tmp_path, 'sub', 'b'))
+
+
+def test_scan_unique_sizes_not_hashed(tmp_path: Path):
+    _write_files(tmp_path, {'a': b'a', 'b': b'bb', 'c': b'ccc'})
+    with patch('bdfr.duplicate_finder.hash_file') as mock_hash:
+        results = DuplicateFinder(workers=2).scan(tmp_path)
+    assert results == {}
+    mock_hash.assert_not_called()
+
+
+def test_scan_different_fingerprints_not_hashed(tmp_path: Path):
+    _write_files(tmp_path, {'a': b'aaaaxxxx', 'b': b'bbbbxxxx', 'c': b'aaaaxxxx'})
+    results = DuplicateFinder(edge_size=2, workers=2).scan(tmp_path)
+    assert list(results.keys()) == [hashlib.md5(b'aaaaxxxx').hexdigest()]
+
+
+def test_scan_hashes_while_listing(tmp_path: Path):
+    _write_files(tmp_path, {'a': b'test', 'b': b'test'})
+    hashing_started = threading.Event()
+
+    def iterate_files(directory: Path) -> Iterator[tuple[Path, os.stat_result]]:
+        for name in ('a', 'b'):
+            yield Path(directory, name), Path(directory, name).stat()
+        # The rest of the listing waits until the files already found are being hashed
+        assert hashing_started.wait(5)
+
+    def hash_file(file_path: Path, algorithm: str) -> str:
+        hashing_started.set()
+        return hashlib.md5(file_path.read_bytes()).hexdigest()
+
+    with patch.object(DuplicateFinder, '_iterate_files', side_effect=iterate_files), \
+            patch('bdfr.duplicate_finder.hash_file', side_effect=hash_file):
+        results = DuplicateFinder(workers=2).scan(tmp_path)
+    assert list(results.keys()) == [hashlib.md5(b'test').hexdigest()]
+
+
+def test_scan_large_group_started_once(tmp_path: Path):
+    _write_files(tmp_path, {str(i): b'test' for i in range(10)})
+    with patch.object(DuplicateFinder, '_start_reading', autospec=True,
+                      side_effect=DuplicateFinder._start_reading) as mock_start:
+        DuplicateFinder(workers=2).scan(tmp_path)
+    assert sorted(call.args[1].name for call in mock_start.call_args_list) == [str(i) for i in range(10)]
+
+
+def test_scan_skips_partial_files(tmp_path: Path):
+    _write_files(tmp_path, {
+        'a': b'test',
+        'b.part': b'test',
+        'b.part.json': b'test',
+        'c.mp4.part.ytdl': b'test',
+    })
+    assert DuplicateFinder(workers=2).scan(tmp_path) == {}
+
+
+def test_iterate_files(tmp_path: Path):
+    _write_files(tmp_path, {
+        'a': b'a',
+        'sub/b': b'bb',
+        'sub/deeper/c': b'ccc',
+        'sub/d.part': b'd',
+        'sub/e.part.ytdl': b'e',
+    })
+    Path(tmp_path, 'empty').mkdir()
+    os.symlink(Path(tmp_path, 'sub'), Path(tmp_path, 'link'))
+    results = {file: file_stat.st_size for file, file_stat in DuplicateFinder._iterate_files(tmp_path)}
+    assert results == {Path(tmp_path, 'a'): 1, Path(tmp_path, 'sub', 'b'): 2, Path(tmp_path, 'sub', 'deeper', 'c'): 3}
+
+
+def test_scan_reports_progress(tmp_path: Path, caplog: pytest.LogCaptureFixture):
+    _write_files(tmp_path, {str(i): b'test' for i in range(5)})
+    caplog.set_level(logging.DEBUG)
+    with patch('bdfr.duplicate_finder._ProgressCounter.interval', 0):
+        DuplicateFinder(workers=2).scan(tmp_path)
+    assert 'Scanned 5 files' in caplog.text
+    assert 'Hashed 5 of 5 files' in caplog.text
+
+
+def test_scan_cached(hash_cache: HashCache, tmp_path: Path):
+    test_directory = Path(tmp_path, 'files')
+    _write_files(test_directory, {'a': b'a', 'b': b'b', 'c': b'c'})
+    results = DuplicateFinder(hash_cache=hash_cache, workers=2).scan(test_directory)
+    assert set(results.keys()) == {hashlib.md5(name).hexdigest() for name in (b'a', b'b', b'c')}
+
+    # A cached hash is used as long as the file is unchanged, which a false hash makes visible
+    unchanged = Path(test_directory, 'a')
+    hash_cache.store([(unchanged, unchanged.stat(), 'cached')], 'md5')
+    Path(test_directory, 'b').write_text('x')
+    Path(test_directory, 'c').unlink()
+    results = DuplicateFinder(hash_cache=hash_cache, workers=2).scan(test_directory)
+    assert results == {'cached': unchanged, hashlib.md5(b'x').hexdigest(): Path(test_directory, 'b')}
+    assert set(hash_cache.load(test_directory).keys()) == {str(unchanged), str(Path(test_directory, 'b'))}
+
+
+def test_scan_cached_other_algorithm(hash_cache: HashCache, tmp_path: Path):
+    _write_files(tmp_path, {'a': b'a', 'b': b'b'})
+    test_file = Path(tmp_path, 'a')
+    hash_cache.store([(test_file, test_file.stat(), 'cached')], 'md5')
+    results = DuplicateFinder('sha256', hash_cache, workers=2).scan(tmp_path)
+    assert results[hashlib.sha256(b'a').hexdigest()] == test_file
+
+
+@pytest.mark.parametrize('test_pass_path', (True, False))
+def test_find_new_file(test_pass_path: bool, tmp_path: Path):
+    existing = Path(tmp_path, 'existing')
+    _write_files(existing, {'a': b'aaaaxxxx', 'b': b'bbbbxxxx', 'c': b'ccc'})
+    duplicate_finder = DuplicateFinder(edge_size=2, workers=2)
+    assert duplicate_finder.scan(existing) == {}
+    new_file = Path(tmp_path, 'new')
+    new_file.write_bytes(b'bbbbxxxx')
+    file_hash = hashlib.md5(b'bbbbxxxx').hexdigest()
+    result = duplicate_finder.find(8, file_hash, new_file if test_pass_path else None)
+    assert result == Path(existing, 'b').resolve()
+    assert duplicate_finder.find(3, hashlib.md5(b'ddd').hexdigest()) is None
+    assert duplicate_finder.find(4, hashlib.md5(b'dddd').hexdigest()) is None
+
+
+def test_find_skips_different_fingerprints(tmp_path: Path):
+    existing = Path(tmp_path, 'existing')
+    _write_files(existing, {'a': b'aaaaxxxx'})
+    duplicate_finder = DuplicateFinder(edge_size=2, workers=2)
+    duplicate_finder.scan(existing)
+    new_file = Path(tmp_path, 'new')
+    new_file.write_bytes(b'bbbbxxxx')
+    with patch('bdfr.duplicate_finder.hash_file') as mock_hash:
+        assert duplicate_finder.find(8, hashlib.md5(b'bbbbxxxx').hexdigest(), new_file) is None
+    mock_hash.assert_not_called()
@@ -178,6 +178,64 @@ def test_format_multiple_resources():
     assert results == expected
 
 
+def test_format_resource_paths_names_submission_once(submission: MagicMock, tmp_path: Path):
+    test_resources = [Resource(submission, f'https://example.com/{i}.png') for i in range(100)]
+    test_formatter = FileNameFormatter('{TITLE}_{POSTID}', '{SUBREDDIT}/{REDDITOR}', 'ISO')
+    with unittest.mock.patch.object(
+            FileNameFormatter,
+            '_generate_name_dict_from_submission',
+            autospec=True,
+            side_effect=FileNameFormatter._generate_name_dict_from_submission,
+    ) as mock_generate:
+        results = test_formatter.format_resource_paths(test_resources, tmp_path)
+    assert mock_generate.call_count == 1
+    assert [result[0].name for result in results] == [f'name_12345_{i}.png' for i in range(1, 101)]
+    assert all([do_test_path_equality(result[0].parent, 'randomreddit/person') for result in results])
+
+
+@pytest.mark.parametrize(('test_format_string', 'expected'), (
+    ('{POSTID}', ('', 'postid', '')),
+    ('{REDDITOR}_{title}_test', ('', 'redditor', '_', 'title', '_test')),
+    ('test_{UNKNOWN}', ('test_{UNKNOWN}',)),
+))
+def test_compile_scheme(test_format_string: str, expected: tuple[str, ...]):
+    assert FileNameFormatter._compile_scheme(test_format_string) == expected
+
+
+@pytest.mark.parametrize(('test_format_string', 'test_file_name', 'expected'), (
+    ('{REDDITOR}_{TITLE}_{POSTID}', 'person_a title_with_underscores_abc123.png', 'abc123'),
+    ('{REDDITOR}_{TITLE}_{POSTID}', 'person_title_abc123_2.jpg', 'abc123'),
+    ('{POSTID}', 'abc123.mp4', 'abc123'),
+    ('download_{POSTID}', 'download_abc123.png', 'abc123'),
+    ('download_{POSTID}', 'other_abc123.png', None),
+    ('{POSTID}_{TITLE}', 'abc123_title shortened to fit.png', 'abc123'),
+    ('{POSTID}_{TITLE}', 'abc123.png', None),
+    ('{POSTID}', 'abc123.png.part', None),
+    ('{POSTID}', 'ABC123.png', None),
+    ('{REDDITOR}_{TITLE}', 'person_title.png', None),
+))
+def test_find_post_id(test_format_string: str, test_file_name: str, expected: Optional[str]):
+    test_formatter = FileNameFormatter(test_format_string, '', 'ISO')
+    assert test_formatter.includes_post_id == ('POSTID' in test_format_string)
+    assert test_formatter.find_post_id(test_file_name) == expected
+
+
+def test_find_post_id_from_formatted_path(submission: MagicMock, tmp_path: Path):
+    submission.title = 'a/title with: odd characters' + 'x' * 300
+    submission.id = 'abc123'
+    test_formatter = FileNameFormatter('{REDDITOR}_{TITLE}_{POSTID}', '{SUBREDDIT}', 'ISO')
+    test_resources = [Resource(submission, f'https://example.com/{i}.png', '.png') for i in range(2)]
+    for destination, _ in test_formatter.format_resource_paths(test_resources, tmp_path):
+        assert test_formatter.find_post_id(destination.name) == 'abc123'
+
+
+def test_format_name_values_not_substituted(submission: MagicMock):
+    submission.title = '{POSTID}'
+    test_formatter = FileNameFormatter('{TITLE}_{POSTID}', '', 'ISO')
+    result = test_formatter._format_name(submission, '{TITLE}_{POSTID}')
+    assert do_test_string_equality(result, '{POSTID}_12345')
+
+
 @pytest.mark.parametrize(('test_filename', 'test_ending'), (
     ('A' * 300, '.png'),
     ('A' * 300, '_1.png'),
@@ -374,6 +432,31 @@ def test_get_max_path_length():
     assert result in (4096, 260, 1024)
 
 
+def test_find_max_path_length_cached(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(FileNameFormatter, '_max_path_lengths', {})
+    FileNameFormatter._find_device.cache_clear()
+    with unittest.mock.patch('os.pathconf', return_value=1024) as mock_pathconf:
+        results = [FileNameFormatter.find_max_path_length(Path(tmp_path, f'test_{i}', 'test')) for i in range(5)]
+    assert results == [1024] * 5
+    mock_pathconf.assert_called_once_with(str(tmp_path), 'PC_PATH_MAX')
+
+
+@pytest.mark.parametrize(('test_filename', 'test_ending', 'expected'), (
+    ('😍' * 100, '.png', '😍' * 62 + '.png'),
+    ('a' + '😍' * 100, '.png', 'a' + '😍' * 62 + '.png'),
+    ('aa' + '’' * 100, '_1.png', 'aa' + '’' * 82 + '_1.png'),
+))
+def test_limit_file_name_length_whole_characters(test_filename: str, test_ending: str, expected: str, tmp_path: Path):
+    result = FileNameFormatter._limit_file_name_length(test_filename, test_ending, tmp_path)
+    assert result.name == expected
+
+
+def test_limit_file_name_length_long_root(tmp_path: Path):
+    with unittest.mock.patch('bdfr.file_name_formatter.FileNameFormatter.find_max_path_length', return_value=10):
+        result = FileNameFormatter._limit_file_name_length('test', '.png', tmp_path)
+    assert result.name == '.png'
+
+
 def test_windows_max_path(tmp_path: Path):
     with unittest.mock.patch('platform.system', return_value='Windows'):
         with unittest.mock.patch('bdfr.file_name_formatter.FileNameFormatter.find_max_path_length', return_value=260):
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+# coding=utf-8
+
+import threading
+from pathlib import Path
+from unittest.mock import patch
+
+from bdfr.file_system_index import FileSystemIndex
+
+
+def test_exists(tmp_path: Path):
+    Path(tmp_path, 'test.png').write_bytes(b'test')
+    test_index = FileSystemIndex()
+    assert test_index.exists(Path(tmp_path, 'test.png'))
+    assert not test_index.exists(Path(tmp_path, 'missing.png'))
+    assert not test_index.exists(Path(tmp_path, 'missing', 'test.png'))
+
+
+def test_exists_lists_folder_once(tmp_path: Path):
+    for i in range(10):
+        Path(tmp_path, f'{i}.png').write_bytes(b'test')
+    test_index = FileSystemIndex()
+    with patch('os.listdir', wraps=__import__('os').listdir) as mock_listdir:
+        results = [test_index.exists(Path(tmp_path, f'{i}.png')) for i in range(20)]
+    assert results == [True] * 10 + [False] * 10
+    mock_listdir.assert_called_once_with(tmp_path)
+
+
+def test_add(tmp_path: Path):
+    test_index = FileSystemIndex()
+    test_path = Path(tmp_path, 'test.png')
+    assert not test_index.exists(test_path)
+    test_path.write_bytes(b'test')
+    # Files are only seen once they are recorded, as the folder has already been listed
+    assert not test_index.exists(test_path)
+    test_index.add(test_path)
+    assert test_index.exists(test_path)
+
+
+def test_add_before_listing(tmp_path: Path):
+    test_index = FileSystemIndex()
+    test_path = Path(tmp_path, 'test.png')
+    test_path.write_bytes(b'test')
+    test_index.add(test_path)
+    assert test_index.exists(test_path)
+    assert not test_index.exists(Path(tmp_path, 'other.png'))
+
+
+def test_make_directory(tmp_path: Path):
+    test_index = FileSystemIndex()
+    test_directory = Path(tmp_path, 'one', 'two')
+    test_index.make_directory(test_directory)
+    assert test_directory.is_dir()
+    with patch.object(Path, 'mkdir') as mock_mkdir:
+        for _ in range(5):
+            test_index.make_directory(test_directory)
+        test_index.make_directory(test_directory.parent)
+    mock_mkdir.assert_not_called()
+
+
+def test_exists_concurrently(tmp_path: Path):
+    Path(tmp_path, 'test.png').write_bytes(b'test')
+    test_index = FileSystemIndex()
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(test_index.exists(Path(tmp_path, 'test.png'))))
+        for _ in range(20)
+    ]
+    [thread.start() for thread in threads]
+    [thread.join() for thread in threads]
+    assert results == [True] * 20
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+# coding=utf-8
+
+from pathlib import Path
+
+import pytest
+
+from bdfr.hash_cache import HashCache
+
+
+@pytest.fixture()
+def hash_cache(tmp_path: Path) -> HashCache:
+    cache = HashCache(Path(tmp_path, 'cache', 'hash_cache.sqlite'))
+    yield cache
+    cache.close()
+
+
+def test_store_and_load(hash_cache: HashCache, tmp_path: Path):
+    test_file = Path(tmp_path, 'files', 'test.png')
+    test_file.parent.mkdir()
+    test_file.write_bytes(b'test')
+    hash_cache.store([(test_file, test_file.stat(), 'test_hash')], 'md5')
+    results = hash_cache.load(Path(tmp_path, 'files'))
+    assert HashCache.get_valid_hash(results[str(test_file)], test_file.stat(), 'md5') == 'test_hash'
+
+
+def test_changed_file_invalid(hash_cache: HashCache, tmp_path: Path):
+    test_file = Path(tmp_path, 'test.png')
+    test_file.write_bytes(b'test')
+    hash_cache.store([(test_file, test_file.stat(), 'test_hash')], 'md5')
+    test_file.write_bytes(b'changed')
+    results = hash_cache.load(tmp_path)
+    assert HashCache.get_valid_hash(results[str(test_file)], test_file.stat(), 'md5') is None
+
+
+def test_other_algorithm_invalid(hash_cache: HashCache, tmp_path: Path):
+    test_file = Path(tmp_path, 'test.png')
+    test_file.write_bytes(b'test')
+    hash_cache.store([(test_file, test_file.stat(), 'test_hash')], 'md5')
+    results = hash_cache.load(tmp_path)
+    assert HashCache.get_valid_hash(results[str(test_file)], test_file.stat(), 'sha256') is None
+
+
+@pytest.mark.parametrize(('test_directory', 'expected'), (
+    ('files', {'files/a.png', 'files/sub/b.png'}),
+    ('files/sub', {'files/sub/b.png'}),
+    ('fil', set()),
+))
+def test_load_only_directory(test_directory: str, expected: set[str], hash_cache: HashCache, tmp_path: Path):
+    for name in ('files/a.png', 'files/sub/b.png', 'files2/c.png', 'other.png'):
+        test_file = Path(tmp_path, name)
+        test_file.parent.mkdir(parents=True, exist_ok=True)
+        test_file.touch()
+        hash_cache.store([(test_file, test_file.stat(), name)], 'md5')
+    results = hash_cache.load(Path(tmp_path, test_directory))
+    assert set(results.keys()) == {str(Path(tmp_path, name)) for name in expected}
+
+
+def test_prune(hash_cache: HashCache, tmp_path: Path):
+    test_file = Path(tmp_path, 'test.png')
+    test_file.touch()
+    hash_cache.store([(test_file, test_file.stat(), 'test_hash')], 'md5')
+    hash_cache.prune([str(test_file)])
+    assert hash_cache.load(tmp_path) == {}
@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+# coding=utf-8
+
+import hashlib
+from pathlib import Path
+
+import pytest
+
+from bdfr.exceptions import BulkDownloaderException
+from bdfr.hashing import FinishedHash, fingerprint_file, get_hash_function, hash_file
+
+
+@pytest.mark.parametrize('test_algorithm', ('md5', 'sha1', 'sha256', 'blake2b'))
+def test_hash_file(test_algorithm: str, tmp_path: Path):
+    test_file = Path(tmp_path, 'test')
+    test_file.write_bytes(b'test' * 1000)
+    assert hash_file(test_file, test_algorithm) == hashlib.new(test_algorithm, b'test' * 1000).hexdigest()
+
+
+@pytest.mark.parametrize(('test_content', 'expected'), (
+    (b'abcdefgh', b'abcdefgh'),
+    (b'abcdefghij', b'abcdghij'),
+    (b'abcdef', b'abcdef'),
+))
+def test_fingerprint_file(test_content: bytes, expected: bytes, tmp_path: Path):
+    test_file = Path(tmp_path, 'test')
+    test_file.write_bytes(test_content)
+    assert fingerprint_file(test_file, 'md5', 4) == hashlib.md5(expected).hexdigest()
+
+
+def test_get_hash_function_unknown():
+    with pytest.raises(BulkDownloaderException):
+        get_hash_function('crc32')
+
+
+def test_finished_hash():
+    test_hash = hashlib.sha256(b'test')
+    result = FinishedHash.from_hash(test_hash)
+    assert result.name == 'sha256'
+    assert result.digest() == test_hash.digest()
+    assert result.hexdigest() == test_hash.hexdigest()
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+# coding=utf-8
+
+import math
+import threading
+import time
+
+import pytest
+
+from bdfr.exceptions import BulkDownloaderException
+from bdfr.host_scheduler import DEFAULT_HOST_LIMITS, DEFAULT_LIMIT, HostLimit, HostScheduler
+
+
+@pytest.mark.parametrize(('test_url', 'expected'), (
+    ('https://i.imgur.com/test.jpg', 'imgur.com'),
+    ('https://www.imgur.com/a/test', 'imgur.com'),
+    ('https://i.redd.it/test.png', 'redd.it'),
+    ('https://thumbs2.redgifs.com/test.mp4', 'redgifs.com'),
+    ('https://www.example.com/test.png', 'example.com'),
+    ('https://cdn.example.com/test.png', 'cdn.example.com'),
+))
+def test_host_key(test_url: str, expected: str):
+    test_scheduler = HostScheduler()
+    assert test_scheduler.host_key(test_url) == expected
+
+
+def test_connection_limit():
+    test_scheduler = HostScheduler({'example.com': HostLimit(2)})
+    assert test_scheduler.try_reserve('example.com') == 0
+    assert test_scheduler.try_reserve('example.com') == 0
+    assert test_scheduler.try_reserve('example.com') == math.inf
+    test_scheduler.release('example.com')
+    assert test_scheduler.try_reserve('example.com') == 0
+
+
+def test_rate_limit():
+    test_scheduler = HostScheduler({'example.com': HostLimit(10, 20, 2)})
+    assert test_scheduler.try_reserve('example.com') == 0
+    assert test_scheduler.try_reserve('example.com') == 0
+    delay = test_scheduler.try_reserve('example.com')
+    assert 0 < delay <= 0.05
+    time.sleep(delay)
+    assert test_scheduler.try_reserve('example.com') == 0
+
+
+def test_default_limit_per_host():
+    test_scheduler = HostScheduler({}, HostLimit(1))
+    assert test_scheduler.try_reserve('example.com') == 0
+    assert test_scheduler.try_reserve('test.com') == 0
+    assert test_scheduler.try_reserve('example.com') == math.inf
+
+
+def test_slot_waits_for_release():
+    test_scheduler = HostScheduler({'example.com': HostLimit(1)})
+    acquired = threading.Event()
+
+    def hold():
+        with test_scheduler.slot('https://example.com/test'):
+            acquired.set()
+
+    test_scheduler.try_reserve('example.com')
+    test_thread = threading.Thread(target=hold)
+    test_thread.start()
+    assert not acquired.wait(0.05)
+    test_scheduler.release('example.com')
+    test_thread.join(1)
+    assert acquired.is_set()
+    assert test_scheduler.try_reserve('example.com') == 0
+
+
+def test_slot_reentrant_when_held():
+    test_scheduler = HostScheduler({'example.com': HostLimit(1)})
+    test_scheduler.try_reserve('example.com')
+    with test_scheduler.held('example.com'):
+        with test_scheduler.slot('https://i.example.com/test'):
+            pass
+    assert test_scheduler.try_reserve('example.com') == 0
+
+
+@pytest.mark.parametrize(('test_string', 'expected_limits', 'expected_default'), (
+    ('', {}, DEFAULT_LIMIT),
+    ('example.com:2:1', {'example.com': HostLimit(2, 1)}, DEFAULT_LIMIT),
+    ('www.example.com:2, *:8:0', {'example.com': HostLimit(2)}, HostLimit(8)),
+    ('imgur.com:1:0.5', {'imgur.com': HostLimit(1, 0.5)}, DEFAULT_LIMIT),
+))
+def test_parse_limits(test_string: str, expected_limits: dict, expected_default: HostLimit):
+    limits, default_limit = HostScheduler.parse_limits(test_string)
+    assert limits == {**DEFAULT_HOST_LIMITS, **expected_limits}
+    assert default_limit == expected_default
+
+
+@pytest.mark.parametrize('test_string', (
+    'example.com',
+    'example.com:two',
+    'example.com:0:1',
+    'example.com:2:-1',
+))
+def test_parse_limits_bad(test_string: str):
+    with pytest.raises(BulkDownloaderException):
+        HostScheduler.parse_limits(test_string)
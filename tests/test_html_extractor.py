@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+# coding=utf-8
+
+import pytest
+
+from bdfr.html_extractor import HTMLTag, find_tag, find_tags
+
+_TEST_PAGE = '''<html><head>
+<script type="application/ld+json" data-react-helmet="true">{"video": {"contentUrl": "a &amp; b"}}</script>
+<script type="text/javascript">var test = "<div>";</script>
+</head><body>
+<img class="img-front lasyload" data-src="https://www.example.com/1.jpg">
+<img class="lasyload-not" data-src="https://www.example.com/2.jpg"/>
+<IMG CLASS="lasyload" data-src="https://www.example.com/3.jpg" />
+<video><source src="https://www.example.com/1.mp4" type="video/mp4"></video>
+</body></html>'''
+
+
+@pytest.mark.parametrize(('test_names', 'test_attrs', 'expected'), (
+    ('img', None, ['1.jpg', '2.jpg', '3.jpg']),
+    ('img', {'class': 'lasyload'}, ['1.jpg', '3.jpg']),
+    ('img', {'class': 'img-front'}, ['1.jpg']),
+    (('img', 'source'), {'class': 'lasyload'}, ['1.jpg', '3.jpg']),
+    (('source', 'img'), None, ['1.jpg', '2.jpg', '3.jpg', '1.mp4']),
+    ('source', {'type': 'video/mp4'}, ['1.mp4']),
+    ('a', None, []),
+))
+def test_find_tags(test_names, test_attrs: dict, expected: list[str]):
+    results = find_tags(_TEST_PAGE, test_names, test_attrs)
+    urls = [(tag.attrs.get('data-src') or tag.attrs.get('src')).rsplit('/', 1)[-1] for tag in results]
+    assert urls == expected
+    assert all(tag.text is None for tag in results)
+
+
+def test_find_tags_text():
+    results = find_tags(_TEST_PAGE, 'script', text=True)
+    assert [tag.text for tag in results] == [
+        '{"video": {"contentUrl": "a &amp; b"}}',
+        'var test = "<div>";',
+    ]
+
+
+def test_find_tag():
+    result = find_tag(_TEST_PAGE, 'script', {'type': 'application/ld+json', 'data-react-helmet': 'true'}, text=True)
+    assert result == HTMLTag(
+        'script',
+        {'type': 'application/ld+json', 'data-react-helmet': 'true'},
+        '{"video": {"contentUrl": "a &amp; b"}}',
+    )
+    assert find_tag(_TEST_PAGE, 'script', {'type': 'text/css'}) is None
+
+
+def test_find_tags_limit():
+    assert len(find_tags(_TEST_PAGE, 'img', limit=2)) == 2
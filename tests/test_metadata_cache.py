@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+# coding=utf-8
+
+from pathlib import Path
+
+import pytest
+
+from bdfr.metadata_cache import MetadataCache
+
+
+@pytest.fixture()
+def metadata_cache(tmp_path: Path) -> MetadataCache:
+    cache = MetadataCache(Path(tmp_path, 'cache', 'metadata_cache.sqlite'))
+    yield cache
+    cache.close()
+
+
+def test_store_and_get(metadata_cache: MetadataCache):
+    metadata_cache.store('imgur', 'album/test', {'images': [{'link': 'https://i.imgur.com/test.png'}]})
+    assert metadata_cache.get('imgur', 'album/test') == {'images': [{'link': 'https://i.imgur.com/test.png'}]}
+    assert metadata_cache.get('imgur', 'image/test') is None
+    assert metadata_cache.get('gfycat', 'album/test') is None
+
+
+def test_expired(metadata_cache: MetadataCache):
+    metadata_cache.store('imgur', 'image/test', {'images': []})
+    metadata_cache.max_age = -1
+    assert metadata_cache.get('imgur', 'image/test') is None
+
+
+def test_persists(tmp_path: Path):
+    database_path = Path(tmp_path, 'metadata_cache.sqlite')
+    cache = MetadataCache(database_path)
+    cache.store('imgur', 'image/test', {'images': []})
+    cache.close()
+    cache = MetadataCache(database_path)
+    assert cache.get('imgur', 'image/test') == {'images': []}
+    cache.close()
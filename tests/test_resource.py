@@ -1,11 +1,15 @@
 #!/usr/bin/env python3
 # coding=utf-8
 
+import hashlib
+import json
+from pathlib import Path
 from unittest.mock import MagicMock
 
 import pytest
 
-from bdfr.resource import Resource
+from bdfr.exceptions import BulkDownloaderException, RetryDeferred
+from bdfr.resource import PartialDownload, Resource
 
 
 @pytest.mark.parametrize(('test_url', 'expected'), (
@@ -34,3 +38,114 @@ def test_download_online_resource(test_url: str, expected_hash: str):
     test_resource = Resource(MagicMock(), test_url)
     test_resource.download(120)
     assert test_resource.hash.hexdigest() == expected_hash
+
+
+@pytest.mark.parametrize('test_path', (
+    '/test.png',
+    '/another/test.mp4',
+))
+def test_download_to_file(test_path: str, local_http_server: str, tmp_path: Path):
+    test_resource = Resource(MagicMock(), local_http_server + test_path)
+    test_file = Path(tmp_path, 'test.tmp')
+    test_resource.download_to_file(test_file, 120)
+    assert test_file.read_bytes() == test_path.encode('utf-8')
+    assert test_resource.content is None
+    assert test_resource.download_path == test_file
+    assert test_resource.hash.hexdigest() == hashlib.md5(test_path.encode('utf-8')).hexdigest()
+
+
+def test_download_to_file_unrecoverable(local_http_server: str, tmp_path: Path):
+    test_resource = Resource(MagicMock(), local_http_server + '/missing.png')
+    with pytest.raises(BulkDownloaderException):
+        test_resource.download_to_file(Path(tmp_path, 'test.tmp'), 120)
+    test_resource.discard_download()
+    assert list(tmp_path.iterdir()) == []
+
+
+@pytest.mark.parametrize('test_path', (
+    '/flaky/test.png',
+    '/flaky/another/test.mp4',
+))
+def test_download_to_file_retries(test_path: str, local_http_server: str, tmp_path: Path):
+    test_resource = Resource(MagicMock(), local_http_server + test_path)
+    test_file = Path(tmp_path, 'test.tmp')
+    test_resource.download_to_file(test_file, 120)
+    assert test_file.read_bytes() == test_path.encode('utf-8')
+    assert test_resource.retry_state.attempt == 1
+
+
+def test_download_deferred(local_http_server: str):
+    test_resource = Resource(MagicMock(), local_http_server + '/flaky/deferred.png')
+    with pytest.raises(RetryDeferred) as exc_info:
+        test_resource.download(120, defer=True)
+    assert exc_info.value.delay == 0
+    test_resource.download(120, defer=True)
+    assert test_resource.content == b'/flaky/deferred.png'
+
+
+def test_discard_download(tmp_path: Path):
+    test_resource = Resource(MagicMock(), 'https://www.example.com/test.png')
+    test_resource.download_path = Path(tmp_path, 'test.tmp')
+    test_resource.download_path.touch()
+    test_resource.discard_download()
+    assert test_resource.download_path is None
+    assert not Path(tmp_path, 'test.tmp').exists()
+
+
+def test_download_to_file_replaces_stale_partial(local_http_server: str, tmp_path: Path):
+    test_file = Path(tmp_path, 'test.png.part')
+    test_file.write_bytes(b'0' * 1000)
+    test_resource = Resource(MagicMock(), local_http_server + '/test.png')
+    test_resource.download_to_file(test_file, 120)
+    assert test_file.read_bytes() == b'/test.png'
+
+
+@pytest.mark.parametrize(('test_metadata', 'test_offset', 'expected_resumed'), (
+    ({'etag': '"test"', 'length': 17}, 8, True),
+    ({'etag': '"test"', 'length': 17}, 0, False),
+    ({'etag': '"changed"', 'length': 17}, 8, False),
+    ({'etag': None, 'length': 17}, 8, True),
+    ({'etag': None, 'length': 20}, 8, False),
+))
+def test_download_to_file_resumes(
+        test_metadata: dict,
+        test_offset: int,
+        expected_resumed: bool,
+        local_http_server: str,
+        tmp_path: Path,
+):
+    test_url = local_http_server + '/ranged/test.png'
+    test_file = Path(tmp_path, 'test.png.part')
+    # Resumed downloads keep what is on disk, so a marker shows whether the start of the file was downloaded again
+    test_file.write_bytes(b'X' * test_offset)
+    PartialDownload.get_metadata_path(test_file).write_text(json.dumps({**test_metadata, 'url': test_url}))
+    test_resource = Resource(MagicMock(), test_url)
+    test_resource.download_to_file(test_file, 10)
+    expected = b'/ranged/test.png'.rjust(17, b'0')
+    if expected_resumed:
+        expected = b'X' * test_offset + expected[test_offset:]
+    assert test_file.read_bytes() == expected
+    assert test_resource.hash.hexdigest() == hashlib.md5(expected).hexdigest()
+    assert not PartialDownload.get_metadata_path(test_file).exists()
+
+
+def test_download_to_file_writes_metadata(local_http_server: str, tmp_path: Path):
+    test_url = local_http_server + '/ranged/metadata.png'
+    test_file = Path(tmp_path, 'test.png.part')
+    test_partial = PartialDownload(test_file, test_url)
+    test_partial.request_headers()
+    file, _ = test_partial.open(200, {'Accept-Ranges': 'bytes', 'ETag': '"test"', 'Content-Length': '100'})
+    file.close()
+    metadata = json.loads(PartialDownload.get_metadata_path(test_file).read_text())
+    assert metadata == {'url': test_url, 'etag': '"test"', 'last_modified': None, 'length': 100}
+
+
+@pytest.mark.parametrize('test_keep_partial', (True, False))
+def test_discard_download_keep_partial(test_keep_partial: bool, tmp_path: Path):
+    test_resource = Resource(MagicMock(), 'https://www.example.com/test.png')
+    test_resource.download_path = Path(tmp_path, 'test.png.part')
+    test_resource.download_path.touch()
+    PartialDownload.get_metadata_path(test_resource.download_path).touch()
+    test_resource.discard_download(keep_partial=test_keep_partial)
+    assert Path(tmp_path, 'test.png.part').exists() == test_keep_partial
+    assert Path(tmp_path, 'test.png.part.json').exists() == test_keep_partial
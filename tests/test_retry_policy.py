@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+# coding=utf-8
+
+import asyncio
+from email.utils import format_datetime
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+from unittest.mock import MagicMock
+
+import pytest
+
+from bdfr.exceptions import BulkDownloaderException, RetryableError, RetryDeferred
+from bdfr.retry_policy import RetryPolicy, check_retryable_status, parse_retry_after
+
+
+@pytest.mark.parametrize(('test_value', 'expected'), (
+    (None, None),
+    ('', None),
+    ('0', 0),
+    ('120', 120),
+    ('not a date', None),
+    (format_datetime(datetime(2000, 1, 1, tzinfo=timezone.utc), usegmt=True), 0),
+))
+def test_parse_retry_after(test_value: Optional[str], expected: Optional[float]):
+    assert parse_retry_after(test_value) == expected
+
+
+def test_parse_retry_after_future_date():
+    test_value = format_datetime(datetime.now(timezone.utc) + timedelta(seconds=60), usegmt=True)
+    assert 50 < parse_retry_after(test_value) <= 60
+
+
+@pytest.mark.parametrize(('test_status', 'expected'), (
+    (200, False),
+    (404, False),
+    (408, True),
+    (429, True),
+    (503, True),
+))
+def test_check_retryable_status(test_status: int, expected: bool):
+    if expected:
+        with pytest.raises(RetryableError):
+            check_retryable_status(test_status, {}, 'https://example.com')
+    else:
+        check_retryable_status(test_status, {}, 'https://example.com')
+
+
+@pytest.mark.parametrize(('test_attempt', 'expected_max'), (
+    (0, 1),
+    (3, 8),
+    (10, 60),
+))
+def test_backoff(test_attempt: int, expected_max: float):
+    test_policy = RetryPolicy()
+    results = [test_policy.backoff(test_attempt) for _ in range(100)]
+    assert all(0 <= r <= expected_max for r in results)
+
+
+@pytest.mark.parametrize(('test_retry_after', 'expected'), (
+    (None, True),
+    (5, True),
+    (20, False),
+))
+def test_next_delay_deadline(test_retry_after: Optional[float], expected: bool):
+    test_state = RetryPolicy(base_delay=0.01, deadline=10).start()
+    result = test_state.next_delay(test_retry_after)
+    assert (result is not None) == expected
+
+
+def test_call_retries_until_success():
+    test_function = MagicMock(side_effect=[RetryableError('test'), RetryableError('test'), 'result'])
+    result = RetryPolicy(base_delay=0.001).call(test_function, 'test')
+    assert result == 'result'
+    assert test_function.call_count == 3
+
+
+def test_call_gives_up_at_deadline():
+    test_function = MagicMock(side_effect=RetryableError('test', retry_after=0.02))
+    with pytest.raises(RetryableError):
+        RetryPolicy(deadline=0.05).call(test_function, 'test')
+    assert 2 <= test_function.call_count <= 4
+
+
+def test_call_does_not_retry_other_errors():
+    test_function = MagicMock(side_effect=BulkDownloaderException)
+    with pytest.raises(BulkDownloaderException):
+        RetryPolicy().call(test_function, 'test')
+    assert test_function.call_count == 1
+
+
+def test_call_deferred():
+    test_function = MagicMock(side_effect=[RetryableError('test', retry_after=3), 'result'])
+    test_state = RetryPolicy().start()
+    with pytest.raises(RetryDeferred) as exc_info:
+        test_state.call(test_function, 'test', defer=True)
+    assert exc_info.value.delay == 3
+    assert test_state.call(test_function, 'test', defer=True) == 'result'
+
+
+def test_call_async():
+    calls = []
+
+    async def test_function() -> str:
+        calls.append(1)
+        if len(calls) < 3:
+            raise RetryableError('test')
+        return 'result'
+
+    result = asyncio.run(RetryPolicy(base_delay=0.001).call_async(test_function, 'test'))
+    assert result == 'result'
+    assert len(calls) == 3
@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+# coding=utf-8
+
+import pytest
+
+from bdfr.session_manager import SessionManager
+
+
+@pytest.fixture()
+def restore_session():
+    original = SessionManager._installed
+    yield
+    SessionManager._installed = original
+
+
+def test_get_session_is_shared(restore_session):
+    SessionManager._installed = None
+    assert SessionManager.get_session() is SessionManager.get_session()
+
+
+@pytest.mark.parametrize(('test_pool_maxsize', 'test_user_agent'), (
+    (10, None),
+    (50, 'test agent'),
+))
+def test_install_session_manager(test_pool_maxsize: int, test_user_agent: str, restore_session):
+    test_manager = SessionManager(pool_maxsize=test_pool_maxsize, user_agent=test_user_agent)
+    SessionManager.install(test_manager)
+    session = SessionManager.get_session()
+    assert session is test_manager.session
+    assert session.get_adapter('https://i.redd.it/test.png')._pool_maxsize == test_pool_maxsize
+    assert SessionManager.get_user_agent() == test_user_agent
+    if test_user_agent:
+        assert session.headers['User-Agent'] == test_user_agent
+
+
+def test_blocked_cookie_domains():
+    test_manager = SessionManager(blocked_cookie_domains=('.example.com',))
+    assert test_manager.session.cookies._policy.is_blocked('www.example.com')
+    assert not test_manager.session.cookies._policy.is_blocked('www.reddit.com')
+
+
+def test_shared_session_reused(local_http_server: str, restore_session):
+    SessionManager.install(SessionManager())
+    session = SessionManager.get_session()
+    session.get(local_http_server + '/first')
+    session.get(local_http_server + '/second')
+    assert len(session.get_adapter(local_http_server).poolmanager.pools) == 1
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+# coding=utf-8
+
+from pathlib import Path
+
+import pytest
+
+from bdfr.state_database import StateDatabase, StoredFile
+
+
+@pytest.fixture()
+def state_database(tmp_path: Path) -> StateDatabase:
+    database = StateDatabase(Path(tmp_path, 'state.sqlite'))
+    yield database
+    database.close()
+
+
+@pytest.mark.parametrize(('test_outcome', 'expected'), (
+    ('downloaded', True),
+    ('failed', False),
+))
+def test_is_complete(test_outcome: str, expected: bool, state_database: StateDatabase):
+    state_database.record_submission('aaaaaa', test_outcome, 'Direct')
+    assert state_database.is_complete('aaaaaa') == expected
+    assert not state_database.is_complete('bbbbbb')
+
+
+def test_is_recorded(state_database: StateDatabase):
+    state_database.record_submission('aaaaaa', 'failed', 'Direct')
+    state_database.record_submission('bbbbbb', 'downloaded', 'Direct')
+    assert state_database.is_recorded('aaaaaa')
+    assert state_database.is_recorded('bbbbbb')
+    assert not state_database.is_recorded('cccccc')
+
+
+def test_find_file(state_database: StateDatabase, tmp_path: Path):
+    test_file = Path(tmp_path, 'test.png')
+    state_database.record_file('https://example.com/test.png', 'hash', 'md5', test_file, 4)
+    assert state_database.find_file('https://example.com/test.png', 'md5') == StoredFile('hash', test_file, 4)
+    assert state_database.find_file('https://example.com/test.png', 'sha256') is None
+    assert state_database.find_file('https://example.com/other.png', 'md5') is None
+    state_database.record_file('https://example.com/test.png', 'other', 'md5', test_file, 5)
+    assert state_database.find_file('https://example.com/test.png', 'md5') == StoredFile('other', test_file, 5)
+
+
+def test_is_complete_missing_file(state_database: StateDatabase, tmp_path: Path):
+    test_file = Path(tmp_path, 'test.png')
+    test_file.touch()
+    state_database.record_resource('aaaaaa', 'https://example.com/test.png', 'hash', test_file)
+    state_database.record_resource('aaaaaa', 'https://example.com/dupe.png', 'hash', None)
+    state_database.record_submission('aaaaaa', 'downloaded', 'Direct')
+    assert state_database.is_complete('aaaaaa')
+    test_file.unlink()
+    assert not state_database.is_complete('aaaaaa')
+
+
+def test_outcome_replaced(state_database: StateDatabase):
+    state_database.record_submission('aaaaaa', 'failed', 'Direct')
+    state_database.record_submission('aaaaaa', 'downloaded', 'Direct')
+    assert state_database.is_complete('aaaaaa')
+
+
+def test_state_persists(tmp_path: Path):
+    test_path = Path(tmp_path, 'sub', 'state.sqlite')
+    database = StateDatabase(test_path)
+    database.record_submission('aaaaaa', 'downloaded', 'Direct')
+    database.close()
+    database = StateDatabase(test_path)
+    assert database.is_complete('aaaaaa')
+    database.close()
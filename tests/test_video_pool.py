@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+# coding=utf-8
+
+import hashlib
+import os
+from pathlib import Path
+
+import pytest
+
+from bdfr.exceptions import SiteDownloaderError
+from bdfr.resource import Resource
+from bdfr.video_pool import VideoDownloader, VideoWorkerPool, _get_worker_downloader
+
+
+def make_info(url: str) -> dict:
+    return {'id': 'test', 'title': 'test', 'url': url, 'ext': 'mp4'}
+
+
+@pytest.fixture()
+def video_pool() -> VideoWorkerPool:
+    pool = VideoWorkerPool(1)
+    yield pool
+    pool.close()
+
+
+def test_downloader_download(local_http_server: str, tmp_path: Path):
+    test_downloader = VideoDownloader({})
+    for test_path in ('/test.mp4', '/another.mp4'):
+        file_path = tmp_path / f'{test_path[1:]}.part'
+        result = test_downloader.download(make_info(local_http_server + test_path), file_path)
+        assert file_path.read_bytes() == test_path.encode('utf-8')
+        assert result.hexdigest() == hashlib.md5(test_path.encode('utf-8')).hexdigest()
+
+
+def test_downloader_download_failure(local_http_server: str, tmp_path: Path):
+    test_downloader = VideoDownloader({})
+    with pytest.raises(SiteDownloaderError):
+        test_downloader.download(make_info(local_http_server + '/missing.mp4'), tmp_path / 'test.part')
+
+
+def test_get_worker_downloader_reused():
+    assert _get_worker_downloader({'format': 'best'}) is _get_worker_downloader({'format': 'best'})
+    assert _get_worker_downloader({'format': 'best'}) is not _get_worker_downloader({})
+
+
+def test_pool_download(local_http_server: str, tmp_path: Path, video_pool: VideoWorkerPool):
+    file_path = tmp_path / 'test.mp4.part'
+    result = video_pool.download(make_info(local_http_server + '/test.mp4'), {}, file_path)
+    assert file_path.read_bytes() == b'/test.mp4'
+    assert result.hexdigest() == hashlib.md5(b'/test.mp4').hexdigest()
+
+
+def test_pool_download_failure(local_http_server: str, tmp_path: Path, video_pool: VideoWorkerPool):
+    with pytest.raises(SiteDownloaderError):
+        video_pool.download(make_info(local_http_server + '/missing.mp4'), {}, tmp_path / 'test.part')
+
+
+def test_pool_hash_algorithm(local_http_server: str, tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(Resource, 'hash_algorithm', 'sha256')
+    test_pool = VideoWorkerPool(1)
+    try:
+        result = test_pool.download(make_info(local_http_server + '/test.mp4'), {}, tmp_path / 'test.part')
+    finally:
+        test_pool.close()
+    assert result.hexdigest() == hashlib.sha256(b'/test.mp4').hexdigest()
+
+
+def test_pool_recovers_from_crash(local_http_server: str, tmp_path: Path, video_pool: VideoWorkerPool):
+    with pytest.raises(SiteDownloaderError):
+        video_pool._run(os._exit, 1)
+    result = video_pool.download(make_info(local_http_server + '/test.mp4'), {}, tmp_path / 'test.part')
+    assert result.hexdigest() == hashlib.md5(b'/test.mp4').hexdigest()
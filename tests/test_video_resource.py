@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+# coding=utf-8
+
+import hashlib
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+
+import pytest
+import youtube_dl
+
+from bdfr.exceptions import NotADownloadableLinkError, SiteDownloaderError
+from bdfr.video_resource import VideoResource
+
+_test_info = {'id': 'test', 'title': 'test', 'url': 'https://example.com/test.mp4', 'ext': 'mp4'}
+
+
+@pytest.fixture()
+def test_submission() -> MagicMock:
+    submission = MagicMock()
+    submission.url = 'https://example.com/watch?v=test'
+    return submission
+
+
+def fake_download(self: youtube_dl.YoutubeDL, info: dict, download: bool = True):
+    # Writes the file in several blocks, reporting progress as youtube-dl does
+    file_path = self.prepare_filename(info)
+    with open(file_path, 'wb') as file:
+        for _ in range(3):
+            file.write(b'test' * 1000)
+            file.flush()
+            for hook in self._progress_hooks:
+                hook({'status': 'downloading', 'filename': file_path, 'tmpfilename': file_path})
+    for hook in self._progress_hooks:
+        hook({'status': 'finished', 'filename': file_path})
+    return info
+
+
+@pytest.mark.parametrize(('test_info', 'expected'), (
+    (_test_info, '.mp4'),
+    ({'_type': 'playlist', 'entries': [{**_test_info, 'ext': 'webm'}]}, '.webm'),
+))
+def test_video_resource_extension(test_info: dict, expected: str, test_submission: MagicMock):
+    test_resource = VideoResource(test_submission, test_info, {})
+    assert test_resource.extension == expected
+    assert test_resource.url == test_submission.url
+
+
+@pytest.mark.parametrize('test_info', (
+    {'_type': 'playlist', 'entries': []},
+    {'id': 'test'},
+))
+def test_video_resource_no_media(test_info: dict, test_submission: MagicMock):
+    with pytest.raises(NotADownloadableLinkError):
+        VideoResource(test_submission, test_info, {})
+
+
+@pytest.mark.parametrize('test_name', ('test.mp4.part', 'test 100%.mp4.part'))
+def test_download_to_file(test_name: str, test_submission: MagicMock, tmp_path: Path):
+    test_resource = VideoResource(test_submission, _test_info, {'format': 'best'})
+    file_path = tmp_path / test_name
+    with patch.object(youtube_dl.YoutubeDL, 'process_ie_result', autospec=True, side_effect=fake_download):
+        test_resource.download_to_file(file_path, 120)
+    assert test_resource.download_path == file_path
+    assert file_path.read_bytes() == b'test' * 3000
+    assert test_resource.hash.hexdigest() == hashlib.md5(b'test' * 3000).hexdigest()
+    assert list(tmp_path.iterdir()) == [file_path]
+
+
+@pytest.mark.parametrize('test_rewrite_blocks', (1, 5))
+def test_download_to_file_restarted(test_rewrite_blocks: int, test_submission: MagicMock, tmp_path: Path):
+    test_resource = VideoResource(test_submission, _test_info, {})
+    file_path = tmp_path / 'test.mp4.part'
+
+    def fake_restarted_download(self: youtube_dl.YoutubeDL, info: dict, download: bool = True):
+        # The download is started again from the beginning partway through, truncating what was written
+        work_path = self.prepare_filename(info)
+        with open(work_path, 'wb') as file:
+            for i in range(1, 4):
+                file.write(b'fail' * 1000)
+                file.flush()
+                for hook in self._progress_hooks:
+                    hook({'status': 'downloading', 'filename': work_path, 'downloaded_bytes': i * 4000})
+        with open(work_path, 'wb') as file:
+            # Enough may be written again before the first report to pass the point reached the first time
+            file.write(b'test' * 1000 * test_rewrite_blocks)
+            file.flush()
+            for hook in self._progress_hooks:
+                hook({'status': 'downloading', 'filename': work_path, 'downloaded_bytes': test_rewrite_blocks * 4000})
+        for hook in self._progress_hooks:
+            hook({'status': 'finished', 'filename': work_path})
+        return info
+
+    with patch.object(youtube_dl.YoutubeDL, 'process_ie_result', autospec=True, side_effect=fake_restarted_download):
+        test_resource.download_to_file(file_path, 120)
+    expected = b'test' * 1000 * test_rewrite_blocks
+    assert file_path.read_bytes() == expected
+    assert test_resource.hash.hexdigest() == hashlib.md5(expected).hexdigest()
+
+
+def test_download_to_file_merged(test_submission: MagicMock, tmp_path: Path):
+    test_resource = VideoResource(test_submission, _test_info, {})
+    file_path = tmp_path / 'test.mp4.part'
+
+    def fake_merged_download(self: youtube_dl.YoutubeDL, info: dict, download: bool = True):
+        # Separate streams are merged into a file with a different extension, which is not reported as progress
+        merged_path = tmp_path / 'test.mp4.part.mkv'
+        merged_path.write_bytes(b'merged')
+        for post_processor in self._pps:
+            post_processor.run({'filepath': str(merged_path)})
+        return info
+
+    with patch.object(youtube_dl.YoutubeDL, 'process_ie_result', autospec=True, side_effect=fake_merged_download):
+        test_resource.download_to_file(file_path, 120)
+    assert file_path.read_bytes() == b'merged'
+    assert test_resource.hash.hexdigest() == hashlib.md5(b'merged').hexdigest()
+    assert list(tmp_path.iterdir()) == [file_path]
+
+
+def test_download_to_file_failure(test_submission: MagicMock, tmp_path: Path):
+    test_resource = VideoResource(test_submission, _test_info, {})
+    file_path = tmp_path / 'test.mp4.part'
+    with patch.object(youtube_dl.YoutubeDL, 'process_ie_result', side_effect=youtube_dl.DownloadError('test')):
+        with pytest.raises(SiteDownloaderError):
+            test_resource.download_to_file(file_path, 120)
+    assert test_resource.download_path == file_path
+    test_resource.discard_download()
+    assert not file_path.exists()
+
+
+def test_download_into_memory(test_submission: MagicMock):
+    test_resource = VideoResource(test_submission, _test_info, {})
+    with patch.object(youtube_dl.YoutubeDL, 'process_ie_result', autospec=True, side_effect=fake_download):
+        test_resource.download(120)
+    assert test_resource.content == b'test' * 3000
+    assert test_resource.download_path is None
+    assert test_resource.hash.hexdigest() == hashlib.md5(b'test' * 3000).hexdigest()